@@ -0,0 +1,62 @@
+"""
+Compares the bencode decoder with the byte-at-a-time recursive decoder it replaced, on a synthetic .torrent file
+with many files and piece hashes and on a compact tracker response.
+
+    python3 -m benchmarks.bench_bencode [--size MiB] [--files N] [--repeat N]
+"""
+import argparse
+import os
+import time
+
+from benchmarks.legacy_bencode import _legacy_decode_dictionary
+from bencode import bencode
+
+
+def synthetic_torrent(size, files):
+    piece_length = 2 ** 18
+    pieces = os.urandom(20 * -(-size // piece_length))
+    info = {"name": b"bench", "piece length": piece_length, "pieces": pieces,
+            "files": [{"length": size // files, "path": [b"directory", f"file{i}".encode()]} for i in range(files)]}
+
+    return bencode.encode_dictionary({"announce": b"udp://tracker.example:6969", "info": info})
+
+
+def tracker_response(peers):
+    return bencode.encode_dictionary({"complete": peers, "incomplete": 0, "interval": 1800,
+                                      "peers": os.urandom(6 * peers)})
+
+
+def measure(decode, data, repeat):
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        decode(data)
+
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=16 * 1024, help="Size of the torrent content in MiB")
+    parser.add_argument("--files", type=int, default=5000, help="Number of files in the torrent")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of decodes per measurement")
+    args = parser.parse_args()
+
+    inputs = [
+        (".torrent", synthetic_torrent(args.size * 2 ** 20, args.files)),
+        ("tracker", tracker_response(200)),
+    ]
+
+    print(f"{'input':>10} {'bytes':>10} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}")
+
+    for name, data in inputs:
+        assert bencode.decode_dictionary(data)[0] == _legacy_decode_dictionary(data)[0]
+
+        legacy = measure(_legacy_decode_dictionary, data, args.repeat)
+        new = measure(bencode.decode_dictionary, data, args.repeat)
+
+        print(f"{name:>10} {len(data):>10} {1000 * legacy:>10.2f} {1000 * new:>10.2f} {legacy / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures loading the metadata of very large torrents: the time to load the .torrent data and the memory allocated on
+top of it that is still held afterwards, with the piece hashes kept as a view over the data or split into a bytes
+object per piece as they used to be. Times are inflated by tracemalloc, compare them relative to each other.
+
+    python3 -m benchmarks.bench_metadata [--pieces N ...]
+"""
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from bencode import bencode
+from torrent.TorrentInformation import TorrentInformation
+
+
+def synthetic_torrent(pieces):
+    info = {"name": b"bench", "piece length": 2 ** 18, "length": pieces * 2 ** 18, "pieces": os.urandom(20 * pieces)}
+    return bencode.encode_dictionary({"announce": b"udp://tracker.example:6969", "info": info})
+
+
+def split_pieces(data):
+    pieces = bencode.decode_dictionary(data)[0]["info"]["pieces"]
+    return [pieces[i:i + 20] for i in range(0, len(pieces), 20)]
+
+
+def measure(load, data):
+    """
+    :return: The time taken by load and the memory still allocated by what it returned, in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    result = load(data)
+    elapsed = time.perf_counter() - start
+
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del result
+    return elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", type=int, nargs="+", default=[100_000, 1_000_000, 4_000_000],
+                        help="Number of pieces of the synthetic torrents")
+    args = parser.parse_args()
+
+    print(f"{'pieces':>10} {'layout':>10} {'load ms':>10} {'MiB':>10}")
+
+    for pieces in args.pieces:
+        data = synthetic_torrent(pieces)
+
+        for name, load in (("split", split_pieces), ("buffer", TorrentInformation.from_bytes)):
+            elapsed, memory = measure(load, data)
+            print(f"{pieces:>10} {name:>10} {1000 * elapsed:>10.1f} {memory / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures the startup of a download of a synthetic torrent: the time to create the Torrent and the memory it holds
+afterwards, compared with laying out every piece and block up front as Torrent used to. The eager layout needs
+gigabytes of memory for the default size, so it runs on a smaller torrent and its figures are scaled up.
+
+    python3 -m benchmarks.bench_startup [--size GiB] [--piece-length KiB] [--legacy-size GiB]
+"""
+import argparse
+import dataclasses
+import gc
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from torrent.Torrent import Torrent
+from torrent.TorrentInformation import TorrentInformation
+
+
+@dataclasses.dataclass
+class LegacyBlockPiece:
+    piece_id: int
+    block_id: int
+    block_size: int
+    data: List
+    start_position: int
+
+
+@dataclasses.dataclass
+class LegacyPiece:
+    piece_id: int
+    hash: bytearray
+    blocks: List[LegacyBlockPiece]
+
+
+def legacy_divide_into_blocks(metadata):
+    """
+    The block planning Torrent did before starting, an object per piece and per block
+    """
+    pieces = []
+    total_file_left = metadata.total_length()
+    current_position = 0
+
+    for piece_id in range(metadata.piece_count()):
+        piece = LegacyPiece(piece_id=piece_id, hash=metadata.piece(piece_id), blocks=[])
+        piece_size = min(metadata.piece_length(), total_file_left)
+        total_file_left -= piece_size
+
+        blocks_size = 0
+        while blocks_size < piece_size:
+            block_size = min(2 ** 14, piece_size - blocks_size)
+            piece.blocks.append(LegacyBlockPiece(piece_id=piece_id, block_id=len(piece.blocks), block_size=block_size,
+                                                 data=b"", start_position=current_position))
+            blocks_size += block_size
+            current_position += block_size
+
+        pieces.append(piece)
+
+    return pieces
+
+
+def synthetic_torrent(size, piece_length):
+    pieces = b"\0" * 20 * -(-size // piece_length)
+    info = {"name": b"bench", "piece length": piece_length, "length": size, "pieces": pieces}
+    return TorrentInformation({"announce": b"udp://tracker.example:6969", "info": info})
+
+
+def measure(start, metadata):
+    """
+    :return: The time taken by start and the memory held by what it returned, in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+
+    begin = time.perf_counter()
+    result = start(metadata)
+    elapsed = time.perf_counter() - begin
+
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del result
+    return elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200, help="Size of the torrent in GiB")
+    parser.add_argument("--piece-length", type=int, default=256, help="Piece length in KiB")
+    parser.add_argument("--legacy-size", type=int, default=10, help="Size of the torrent for the eager layout, in GiB")
+    args = parser.parse_args()
+
+    piece_length = args.piece_length * 2 ** 10
+
+    with tempfile.TemporaryDirectory() as save_path:
+        lazy = measure(lambda metadata: Torrent(metadata, save_path, resume=False),
+                       synthetic_torrent(args.size * 2 ** 30, piece_length))
+
+    eager = measure(legacy_divide_into_blocks, synthetic_torrent(args.legacy_size * 2 ** 30, piece_length))
+    scale = args.size / args.legacy_size
+
+    print(f"{'layout':>8} {'GiB':>6} {'seconds':>9} {'MiB':>9}")
+    print(f"{'lazy':>8} {args.size:>6} {lazy[0]:>9.2f} {lazy[1] / 2 ** 20:>9.1f}")
+    print(f"{'eager':>8} {args.legacy_size:>6} {eager[0]:>9.2f} {eager[1] / 2 ** 20:>9.1f}")
+    print(f"{'eager':>8} {args.size:>6} {eager[0] * scale:>9.2f} {eager[1] * scale / 2 ** 20:>9.1f}  (scaled)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the storage backends writing every piece of a synthetic torrent in random order, for several piece sizes.
+
+    python3 -m benchmarks.bench_storage [--size MiB] [--files N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from torrent import Storage
+from torrent.TorrentInformation import TorrentInformation
+
+PIECE_SIZES = [2 ** 14, 2 ** 18, 2 ** 22]
+
+
+def synthetic_torrent(total_length, piece_length, files):
+    lengths = [total_length // files] * files
+    lengths[-1] += total_length - sum(lengths)
+
+    pieces = b"\0" * 20 * -(-total_length // piece_length)
+    info = {"name": b"bench", "piece length": piece_length, "pieces": pieces,
+            "files": [{"length": length, "path": [f"file{i}".encode()]} for i, length in enumerate(lengths)]}
+
+    return TorrentInformation({"info": info})
+
+
+def run(backend, metadata, save_path):
+    piece_length = metadata.piece_length()
+    total_length = metadata.total_length()
+
+    order = list(range(metadata.piece_count()))
+    random.shuffle(order)
+    payload = os.urandom(piece_length)
+
+    start = time.perf_counter()
+
+    storage = backend(metadata, save_path)
+    storage.open()
+
+    for index in order:
+        size = min(piece_length, total_length - index * piece_length)
+        storage.write_piece(index, payload[:size])
+
+    storage.close()
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="Size of the torrent in MiB")
+    parser.add_argument("--files", type=int, default=4, help="Number of files in the torrent")
+    args = parser.parse_args()
+
+    total_length = args.size * 2 ** 20
+
+    print(f"{'piece size':>12} {'backend':>8} {'seconds':>9} {'MiB/s':>9}")
+
+    for piece_length in PIECE_SIZES:
+        metadata = synthetic_torrent(total_length, piece_length, args.files)
+
+        for name, backend in Storage.BACKENDS.items():
+            with tempfile.TemporaryDirectory() as save_path:
+                elapsed = run(backend, metadata, save_path)
+
+            print(f"{piece_length:>12} {name:>8} {elapsed:>9.3f} {args.size / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Downloads a synthetic torrent from a swarm running on the loopback interface, through the real Session and Torrent
+download path. A child process runs a stand-in HTTP tracker and the seeders, which can be given a latency, a
+bandwidth and a choking pattern, so the figures are those of the client alone: throughput, time to the first verified
+piece, completion time and the peak resident memory of the benchmark process. With --fast, the seeders support the
+Fast Extension and reject the requests they drop when choking.
+
+    python3 -m benchmarks.bench_swarm [--size MiB] [--piece-length KiB] [--peers N] [--latency ms]
+                                      [--bandwidth KiB/s] [--choke-interval s] [--choke-duration s] [--fast]
+                                      [--engine threads|asyncio] [--runs N]
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import resource
+import socket
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bencode import bencode
+from torrent.RateLimit import RateLimiter, TokenBucket
+from torrent.Session import Session
+from torrent.Torrent import Torrent
+from torrent.TorrentInformation import TorrentInformation
+
+CHOKE = struct.pack(">IB", 1, 0)
+UNCHOKE = struct.pack(">IB", 1, 1)
+HAVE_ALL = struct.pack(">IB", 1, 14)
+
+
+class Seeder:
+    """
+    A peer having every piece, answering each request `latency` seconds after receiving it, at most at `bandwidth`
+    bytes per second per connection. With a choke interval, it chokes every connection for `choke_duration` seconds
+    every `choke_interval` seconds, dropping the requests it was given. A seeder supporting the Fast Extension
+    rejects them instead.
+    """
+
+    def __init__(self, data, piece_length, latency=0.0, bandwidth=None, choke_interval=None, choke_duration=1.0,
+                 fast=False):
+        self._data = data
+        self._piece_length = piece_length
+        self._piece_count = -(-len(data) // piece_length)
+
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._choke_interval = choke_interval
+        self._choke_duration = choke_duration
+        self._fast = fast
+
+        self._socket = socket.create_server(("127.0.0.1", 0))
+
+    @property
+    def port(self):
+        return self._socket.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            conn, _ = self._socket.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        # Responses by due time, then in the order they were queued
+        responses = []
+        order = itertools.count()
+        ready = threading.Condition()
+        state = {"choked": True, "closed": False}
+
+        sender = threading.Thread(target=self._send_loop, args=(conn, responses, ready, state), daemon=True)
+
+        try:
+            handshake = _receive(conn, 68)
+            reserved = bytes(7) + bytes([0x04 if self._fast else 0])
+            conn.sendall(handshake[:20] + reserved + handshake[28:48] + b"-BENCH-" + bytes(13))
+
+            if self._fast:
+                conn.sendall(HAVE_ALL)
+            else:
+                bitfield = bytearray(b"\xff" * (self._piece_count // 8))
+                if self._piece_count % 8:
+                    bitfield.append((0xFF << (8 - self._piece_count % 8)) & 0xFF)
+                conn.sendall(struct.pack(">IB", 1 + len(bitfield), 5) + bitfield)
+
+            sender.start()
+
+            while True:
+                length = struct.unpack(">I", _receive(conn, 4))[0]
+                if length == 0:
+                    continue
+
+                message = _receive(conn, length)
+
+                with ready:
+                    if message[0] == 2 and state["choked"]:
+                        state["choked"] = False
+                        heapq.heappush(responses, (time.monotonic(), next(order), UNCHOKE, None))
+
+                    elif message[0] == 6 and not state["choked"]:
+                        index, begin, size = struct.unpack(">III", message[1:13])
+                        position = index * self._piece_length + begin
+                        block = self._data[position:position + size]
+                        piece = struct.pack(">IBII", 9 + len(block), 7, index, begin) + block
+                        heapq.heappush(responses, (time.monotonic() + self._latency, next(order), piece, message[1:13]))
+
+                    elif message[0] == 6 and self._fast:
+                        heapq.heappush(responses, (time.monotonic(), next(order), _reject(message[1:13]), None))
+
+                    ready.notify()
+
+        except (OSError, EOFError):
+            pass
+
+        finally:
+            with ready:
+                state["closed"] = True
+                ready.notify()
+
+            conn.close()
+
+    def _send_loop(self, conn, responses, ready, state):
+        limiter = RateLimiter(TokenBucket(self._bandwidth, burst=2 ** 14)) if self._bandwidth else None
+        next_choke = time.monotonic() + self._choke_interval if self._choke_interval else None
+
+        try:
+            while True:
+                with ready:
+                    # Wait for the next response to be due, or for the next choke
+                    while True:
+                        if state["closed"]:
+                            return
+
+                        now = time.monotonic()
+                        deadlines = [responses[0][0]] if responses else []
+                        if next_choke is not None:
+                            deadlines.append(next_choke)
+
+                        if deadlines and min(deadlines) <= now:
+                            break
+
+                        ready.wait(min(deadlines) - now if deadlines else None)
+
+                    choking = next_choke is not None and now >= next_choke
+                    if choking:
+                        # Choked peers have to ask again for what they requested, they are told so with the Fast
+                        # Extension
+                        rejects = [_reject(request) for *_, request in responses if request and self._fast]
+                        responses.clear()
+                        state["choked"] = True
+                    else:
+                        message = heapq.heappop(responses)[2]
+
+                if choking:
+                    conn.sendall(CHOKE + b"".join(rejects))
+                    time.sleep(self._choke_duration)
+
+                    with ready:
+                        state["choked"] = False
+
+                    conn.sendall(UNCHOKE)
+                    next_choke = time.monotonic() + self._choke_interval
+                    continue
+
+                conn.sendall(message)
+
+                if limiter is not None:
+                    limiter.throttle(len(message))
+
+        except OSError:
+            pass
+
+
+def _reject(request):
+    return struct.pack(">IB", 13, 16) + request
+
+
+def _receive(conn, length):
+    data = bytearray()
+
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise EOFError
+
+        data += chunk
+
+    return bytes(data)
+
+
+def run_swarm(args, pipe):
+    """
+    Runs the tracker and the seeders until the benchmark ends, sending the torrent file back through the pipe
+    """
+    data = os.urandom(args.size * 2 ** 20)
+    piece_length = args.piece_length * 2 ** 10
+
+    seeders = [Seeder(data, piece_length, args.latency / 1000, args.bandwidth and args.bandwidth * 2 ** 10,
+                      args.choke_interval, args.choke_duration, args.fast) for _ in range(args.peers)]
+
+    peers = b"".join(socket.inet_aton("127.0.0.1") + struct.pack(">H", seeder.port) for seeder in seeders)
+    announce = bencode.encode_dictionary({"interval": 1800, "peers": peers})
+
+    class Tracker(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(announce)
+
+        def log_message(self, *_):
+            pass
+
+    tracker = ThreadingHTTPServer(("127.0.0.1", 0), Tracker)
+    threading.Thread(target=tracker.serve_forever, daemon=True).start()
+
+    for seeder in seeders:
+        seeder.start()
+
+    pieces = b"".join(hashlib.sha1(data[i:i + piece_length]).digest() for i in range(0, len(data), piece_length))
+    info = {"name": b"swarm.bin", "piece length": piece_length, "length": len(data), "pieces": pieces}
+    metadata = {"announce": f"http://127.0.0.1:{tracker.server_port}/announce".encode(), "info": info}
+
+    pipe.send(bencode.encode_dictionary(metadata))
+
+    # Serve until the benchmark closes its end
+    pipe.recv()
+
+
+def download(raw, engine):
+    """
+    :return: The time to the first verified piece and the completion time, in seconds
+    """
+    first_piece = []
+
+    def trace(event, **fields):
+        if event == "piece_verified" and not first_piece:
+            first_piece.append(time.perf_counter())
+
+    with tempfile.TemporaryDirectory() as save_path:
+        # Progress from the client is not part of the benchmark
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+
+        try:
+            session = Session()
+            torrent = Torrent(TorrentInformation.from_bytes(raw), save_path, resume=False)
+            torrent.set_trace(trace)
+            session.add_torrent(torrent)
+
+            start = time.perf_counter()
+            session.download(engine)
+            elapsed = time.perf_counter() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        if not torrent.is_complete():
+            raise RuntimeError("The download did not complete")
+
+    return first_piece[0] - start, elapsed
+
+
+def peak_rss():
+    """
+    :return: The peak resident memory of this process, in MiB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="Size of the torrent in MiB")
+    parser.add_argument("--piece-length", type=int, default=256, help="Piece length in KiB")
+    parser.add_argument("--peers", type=int, default=8, help="Number of seeders")
+    parser.add_argument("--latency", type=float, default=0, help="Delay before a seeder answers a request, in ms")
+    parser.add_argument("--bandwidth", type=int, default=None, help="Upload rate of each connection, in KiB/s")
+    parser.add_argument("--choke-interval", type=float, default=None, help="Seconds between two chokes of a peer")
+    parser.add_argument("--choke-duration", type=float, default=1.0, help="Seconds a choke lasts")
+    parser.add_argument("--fast", action="store_true", help="Seeders support the Fast Extension")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="Download engine")
+    parser.add_argument("--runs", type=int, default=3, help="Number of downloads, the median is reported")
+    args = parser.parse_args()
+
+    ours, theirs = multiprocessing.Pipe()
+    swarm = multiprocessing.Process(target=run_swarm, args=(args, theirs), daemon=True)
+    swarm.start()
+
+    try:
+        raw = ours.recv()
+        print(f"{'run':>4} {'MB/s':>9} {'first piece s':>14} {'total s':>9} {'peak RSS MiB':>13}")
+
+        results = []
+        for run in range(args.runs):
+            first_piece, elapsed = download(raw, args.engine)
+            results.append((first_piece, elapsed))
+
+            print(f"{run + 1:>4} {args.size * 2 ** 20 / elapsed / 1e6:>9.1f} {first_piece:>14.3f} {elapsed:>9.2f} "
+                  f"{peak_rss():>13.1f}")
+
+        first_piece = statistics.median(first for first, _ in results)
+        elapsed = statistics.median(total for _, total in results)
+        print(f"{'med':>4} {args.size * 2 ** 20 / elapsed / 1e6:>9.1f} {first_piece:>14.3f} {elapsed:>9.2f} "
+              f"{peak_rss():>13.1f}")
+
+    finally:
+        ours.send(None)
+        swarm.join(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+The recursive, byte-at-a-time decoder the bencode package used before its single-pass rewrite, kept unchanged as
+the baseline of benchmarks.bench_bencode
+"""
+from bencode import bencode
+
+
+def _legacy_decode_numeric_form(data: bytes, position=0):
+    beginning = position
+    value = 0
+
+    is_negative = False
+    if position < len(data) and _legacy_read_byte(data, position) == '-':
+        is_negative = True
+        position += 1
+
+    while position < len(data) and _legacy_read_byte(data, position).isdigit():
+        value = value * 10 + int(_legacy_read_byte(data, position))
+        position += 1
+
+    if is_negative:
+        value *= -1
+
+    return value, position - beginning
+
+
+def _legacy_read_byte(data, position):
+    return chr(data[position])
+
+
+def _legacy_decode_integer(data: bytes, position=0):
+    if len(data) == 0:
+        raise bencode.BencodeException("Decoding empty integer is undefined behaviour.")
+
+    if position > len(data):
+        raise bencode.BencodeException("Decoding pos word has no meaning.")
+
+    if _legacy_read_byte(data, position) != 'i':
+        raise bencode.BencodeException("Decoding integer with invalid format for integers.")
+
+    beginning = position
+    position += 1
+
+    integer, parsed_size = _legacy_decode_numeric_form(data, position)
+    position += parsed_size
+
+    if _legacy_read_byte(data, position) != 'e':
+        raise bencode.BencodeException(f"Couldn't find the end terminator in the string")
+
+    position += 1  # consume the end "e"
+
+    return integer, position - beginning
+
+
+def _legacy_decode_string(data: bytes, position=0):
+
+    beginning = position
+
+    strlen, read_chars = _legacy_decode_numeric_form(data, position)
+    position += read_chars
+    if _legacy_read_byte(data, position) != ":":
+        raise bencode.BencodeException("Missing colon makes it impossible to determine the size of the string.")
+
+    if strlen < 0:
+        raise bencode.BencodeException(f"Bencode format does not allow numbers inferior to zero as length.")
+
+    position += 1
+    return data[position:position + strlen], position + strlen - beginning
+
+
+def _legacy_decode_list(data: bytes, position=0):
+
+    if len(data) == 0:
+        raise bencode.BencodeException("Decoding empty integer is undefined behaviour")
+
+    if _legacy_read_byte(data, position) != 'l':
+        raise bencode.BencodeException("Decoding integer with invalid format for lists.")
+
+    beginning = position
+    position += 1  # consume the l
+
+    arr = []
+
+    while position < len(data):
+
+        if _legacy_read_byte(data, position) == "e":
+            break
+
+        if _legacy_read_byte(data, position) == "i":
+            integer, read_chars = _legacy_decode_integer(data, position)
+            arr.append(integer)
+            position += read_chars
+
+        elif _legacy_read_byte(data, position).isdigit():
+            string, read_chars = _legacy_decode_string(data, position)
+            arr.append(string)
+            position += read_chars
+
+        elif _legacy_read_byte(data, position) == "l":
+            lst, read_chars = _legacy_decode_list(data, position)
+            arr.append(lst)
+            position += read_chars
+
+        elif _legacy_read_byte(data, position) == "d":
+            d, read_chars = _legacy_decode_dictionary(data, position)
+            arr.append(d)
+            position += read_chars
+
+    if position >= len(data) or _legacy_read_byte(data, position) != "e":
+        raise bencode.BencodeException(f"Decoding list failed. Current list so far {arr}")
+
+    position += 1  # Consume last "e"
+
+    return arr, position - beginning
+
+
+def _legacy_decode_dictionary(data: bytes, position=0):
+    if len(data) == 0:
+        raise bencode.BencodeException("Decoding empty dictionary is undefined behaviour")
+
+    if _legacy_read_byte(data, position) != 'd':
+        raise bencode.BencodeException("Decoding integer with invalid format for lists.")
+
+    beginning = position
+    position += 1  # consume the d
+    dic = {}
+
+    while position < len(data):
+
+        read_byte = _legacy_read_byte(data, position)
+
+        if read_byte == "e":
+            break
+
+
+        key, read_chars = _legacy_decode_string(data, position)
+        position += read_chars
+
+        if _legacy_read_byte(data, position) == "i":
+            integer, read_chars = _legacy_decode_integer(data, position)
+            dic[key.decode()] = integer
+            position += read_chars
+
+        elif _legacy_read_byte(data, position).isdigit():
+            string, read_chars = _legacy_decode_string(data, position)
+            dic[key.decode()] = string
+            position += read_chars
+
+        elif _legacy_read_byte(data, position) == "l":
+            lst, read_chars = _legacy_decode_list(data, position)
+            dic[key.decode()] = lst
+            position += read_chars
+
+        elif _legacy_read_byte(data, position) == "d":
+            d, read_chars = _legacy_decode_dictionary(data, position)
+            dic[key.decode()] = d
+            position += read_chars
+
+        else:
+            raise bencode.BencodeException(f"Decoding dictionary failed. Current list so far {dic}")
+
+    if position >= len(data) or _legacy_read_byte(data, position) != "e":
+        raise bencode.BencodeException(f"Decoding dictionary failed. Current list so far {dic}")
+
+    position += 1  # Consume last "e"
+
+    return dic, position - beginning
+
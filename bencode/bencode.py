@@ -2,27 +2,262 @@ class BencodeException(Exception):
     pass
 
 
-def _decode_numeric_form(data: bytes, position=0):
-    beginning = position
-    value = 0
+_INTEGER = ord("i")
+_LIST = ord("l")
+_DICTIONARY = ord("d")
+_END = ord("e")
+_ZERO = ord("0")
+_NINE = ord("9")
+_DIGITS = frozenset(b"0123456789")
+_BYTES = (bytes, bytearray, memoryview)
+_DONE = object()
 
-    is_negative = False
-    if position < len(data) and _read_byte(data, position) == '-':
-        is_negative = True
-        position += 1
+# While encoding into a file, output is written out every time this much is buffered
+_FLUSH_SIZE = 2 ** 16
 
-    while position < len(data) and _read_byte(data, position).isdigit():
-        value = value * 10 + int(_read_byte(data, position))
-        position += 1
 
-    if is_negative:
-        value *= -1
+def _as_bytes(data):
+    """
+    The decoder slices and searches its input directly, so every other bytes-like object is copied once into bytes
+    """
+    return data if type(data) is bytes else bytes(data)
+
+
+def _decode_integer(data: bytes, position):
+    """
+    Decodes the integer starting at position, which holds the 'i'
+    :return: A tuple of the integer and the position right after it
+    """
+    try:
+        end = data.index(b"e", position + 1)
+    except ValueError:
+        raise BencodeException(f"Couldn't find the end terminator in the string")
+
+    digits = data[position + 1:end]
+    if not (digits.isdigit() or (digits[:1] == b"-" and digits[1:].isdigit())):
+        raise BencodeException(f"Invalid integer {digits}")
+
+    return int(digits), end + 1
+
+
+def _decode_string(data: bytes, position):
+    """
+    Decodes the string starting at position, which holds the first digit of its length
+    :return: A tuple of the string and the position right after it
+    """
+    try:
+        colon = data.index(b":", position)
+    except ValueError:
+        raise BencodeException("Missing colon makes it impossible to determine the size of the string.")
+
+    length = data[position:colon]
+    if not length.isdigit():
+        raise BencodeException(f"Invalid string length {length}")
+
+    start = colon + 1
+    end = start + int(length)
+
+    if end > len(data):
+        raise BencodeException(f"String of {int(length)} bytes goes past the end of the data")
+
+    return data[start:end], end
+
+
+def _decode(data: bytes, position, spans=None, view_threshold=None):
+    """
+    Decodes the value starting at position. Containers are kept on an explicit stack instead of recursing, so deeply
+    nested input cannot exhaust the interpreter stack. Strings, the most common values, are decoded inline
+    :param spans: A dictionary receiving the (start, end) span of every top-level value, by key or list index
+    :param view_threshold: Strings of at least this many bytes are returned as memoryviews over data
+    :return: A tuple of the value and the position right after it
+    """
+    size = len(data)
+    find = data.find
+    view = memoryview(data) if view_threshold is not None else None
+    start = position
+
+    # Containers being decoded, along with the key waiting for its value when the container is a dictionary
+    stack = []
+
+    while True:
+
+        if position >= size:
+            raise BencodeException("Unexpected end of data")
+
+        token = data[position]
+
+        if spans is not None and len(stack) == 1:
+            start = position
+
+        if _ZERO <= token <= _NINE:
+            colon = find(b":", position, position + 21)
+            length = data[position:colon]
+
+            if colon < 0 or not length.isdigit():
+                value, position = _decode_string(data, position)
+            else:
+                position = colon + 1 + int(length)
+                if position > size:
+                    raise BencodeException(f"String of {int(length)} bytes goes past the end of the data")
+                value = data[colon + 1:position]
+
+                if view is not None and position - colon > view_threshold:
+                    value = view[colon + 1:position]
+
+        elif token == _INTEGER:
+            value, position = _decode_integer(data, position)
+
+        elif token == _LIST:
+            stack.append([[], None])
+            position += 1
+            continue
+
+        elif token == _DICTIONARY:
+            stack.append([{}, None])
+            position += 1
+            continue
+
+        elif token == _END and stack:
+            value, key = stack.pop()
+            position += 1
+
+            if key is not None:
+                raise BencodeException(f"Dictionary key {key} has no value")
+
+        else:
+            raise BencodeException(f"Unexpected {chr(token)!r} at position {position}")
+
+        if not stack:
+            return value, position
+
+        # Store the value in the enclosing container
+        top = stack[-1]
+        container = top[0]
+
+        if type(container) is list:
+            if spans is not None and len(stack) == 1:
+                spans[len(container)] = (start, position)
+            container.append(value)
+
+        elif top[1] is None:
+            if type(value) is memoryview:
+                value = value.tobytes()
+            if type(value) is not bytes:
+                raise BencodeException("All keys in a dictionary must be strings")
+            top[1] = value.decode()
+
+        else:
+            if spans is not None and len(stack) == 1:
+                spans[top[1]] = (start, position)
+            container[top[1]] = value
+            top[1] = None
+
+
+def _sorted_items(dictionary):
+    """
+    :return: The keys and values of the dictionary, alternated, with the keys sorted by their raw bytes as the
+    specification requires
+    """
+    items = {}
+
+    for key, value in dictionary.items():
+        raw = key.encode() if type(key) is str else key
+
+        if type(raw) is not bytes:
+            raise BencodeException("All keys in a dictionary must be strings")
+
+        if raw in items:
+            raise BencodeException(f"Dictionary key {raw} appears twice")
+
+        items[raw] = value
+
+    return [item for key in sorted(items) for item in (key, items[key])]
+
+
+def _encode(value, out: bytearray, file=None):
+    """
+    Appends the canonical bencoded form of value to out in a single pass. Containers are walked with an explicit
+    stack of iterators, and when a file is given the output is handed to it in chunks as it is produced
+    """
+    stack = [iter((value,))]
+
+    while stack:
+        value = next(stack[-1], _DONE)
+
+        if value is _DONE:
+            stack.pop()
+            if stack:
+                out += b"e"
+            continue
 
-    return value, position - beginning
+        kind = type(value)
 
+        if kind is bytes or kind is str or kind in _BYTES:
+            if kind is str:
+                value = value.encode()
+            out += b"%d:" % len(value)
+            out += value
 
-def _read_byte(data, position):
-    return chr(data[position])
+        elif kind is int:
+            out += b"i%de" % value
+
+        elif kind is list or kind is tuple:
+            out += b"l"
+            stack.append(iter(value))
+
+        elif kind is dict:
+            out += b"d"
+            stack.append(iter(_sorted_items(value)))
+
+        else:
+            raise BencodeException(f"Cannot encode {kind.__name__}")
+
+        if file is not None and len(out) >= _FLUSH_SIZE:
+            file.write(out)
+            out.clear()
+
+
+def encode(value, file=None):
+    """
+    Encodes integers, strings (str as UTF-8, or bytes), lists and dictionaries in their canonical bencoded form
+    :param value: The value to be encoded
+    :param file: A file-like object the encoded value is written to, instead of being returned
+    :return: The encoded value, or None when it was written to file
+    """
+    out = bytearray()
+    _encode(value, out, file)
+
+    if file is None:
+        return bytes(out)
+
+    file.write(out)
+
+
+def decode(data: bytes, position=0):
+    """
+    Decodes any bencoded value
+    :param data: A bencoded value
+    :param position: The position in which the parser should start
+    :return: A tuple of the value in its pythonic form and the amount of characters read
+    """
+    data = _as_bytes(data)
+    value, end = _decode(data, position)
+    return value, end - position
+
+
+def decode_spans(data: bytes, view_threshold=None):
+    """
+    Decodes a bencoded value, reporting where each of its top-level values lies in the input. This lets a caller work
+    on the original bytes of a value, e.g. hash the info dictionary of a torrent without encoding it again
+    :param data: A bencoded value
+    :param view_threshold: Strings of at least this many bytes are returned as zero-copy memoryviews over data
+    :return: A tuple of the value and a dictionary with the (start, end) span of each top-level value, by key for
+    dictionaries and by index for lists
+    """
+    data = _as_bytes(data)
+    spans = {}
+    value, _ = _decode(data, 0, spans, view_threshold)
+    return value, spans
 
 
 def decode_integer(data: bytes, position=0):
@@ -35,25 +270,14 @@ def decode_integer(data: bytes, position=0):
     if len(data) == 0:
         raise BencodeException("Decoding empty integer is undefined behaviour.")
 
-    if position > len(data):
+    if position >= len(data):
         raise BencodeException("Decoding pos word has no meaning.")
 
-    if _read_byte(data, position) != 'i':
+    if data[position] != _INTEGER:
         raise BencodeException("Decoding integer with invalid format for integers.")
 
-    # Consume the 'i'
-    beginning = position
-    position += 1
-
-    integer, parsed_size = _decode_numeric_form(data, position)
-    position += parsed_size
-
-    if _read_byte(data, position) != 'e':
-        raise BencodeException(f"Couldn't find the end terminator in the string")
-
-    position += 1  # consume the end "e"
-
-    return integer, position - beginning
+    integer, end = _decode_integer(_as_bytes(data), position)
+    return integer, end - position
 
 
 def encode_integer(data: int):
@@ -62,7 +286,10 @@ def encode_integer(data: int):
     :param data: An integer in its decimal form
     :return: Bencoded Integer
     """
-    return str.encode('i' + str(data) + 'e')
+    if type(data) is not int:
+        raise BencodeException(f"Cannot encode {type(data).__name__} as an integer")
+
+    return b"i%de" % data
 
 
 def decode_string(data: bytes, position=0):
@@ -73,29 +300,25 @@ def decode_string(data: bytes, position=0):
     :return: A tuple of a string in its pythonic form and the amount of chars read
     """
 
-    beginning = position
-
-    # Read the first part of the schema
-    strlen, read_chars = _decode_numeric_form(data, position)
-    position += read_chars
-    if _read_byte(data, position) != ":":
-        raise BencodeException("Missing colon makes it impossible to determine the size of the string.")
-
-    if strlen < 0:
-        raise BencodeException(f"Bencode format does not allow numbers inferior to zero as length.")
+    if position >= len(data) or data[position] not in _DIGITS:
+        raise BencodeException("Decoding string with invalid format for strings.")
 
-    position += 1
-    return data[position:position + strlen], position + strlen - beginning
+    string, end = _decode_string(_as_bytes(data), position)
+    return string, end - position
 
 
-def encode_string(string: str):
+def encode_string(string):
     """
-    Converts a string in its "normal" form to a bencoded format
-    :param string: A valid string in its common representation
+    Converts a string in its "normal" form to a bencoded format. Text is encoded as UTF-8, bytes are kept as they are
+    :param string: A valid string in its common representation, or bytes
     :return: A bencoded formatted string
     """
-    value = str(len(string)) + ':' + string
-    return str.encode(value)
+    if type(string) is str:
+        string = string.encode()
+    elif type(string) not in _BYTES:
+        raise BencodeException(f"Cannot encode {type(string).__name__} as a string")
+
+    return b"%d:" % len(string) + string
 
 
 def decode_list(data: bytes, position=0):
@@ -109,45 +332,10 @@ def decode_list(data: bytes, position=0):
     if len(data) == 0:
         raise BencodeException("Decoding empty integer is undefined behaviour")
 
-    if _read_byte(data, position) != 'l':
+    if data[position] != _LIST:
         raise BencodeException("Decoding integer with invalid format for lists.")
 
-    beginning = position
-    position += 1  # consume the l
-
-    arr = []
-
-    while position < len(data):
-
-        if _read_byte(data, position) == "e":
-            break
-
-        if _read_byte(data, position) == "i":
-            integer, read_chars = decode_integer(data, position)
-            arr.append(integer)
-            position += read_chars
-
-        elif _read_byte(data, position).isdigit():
-            string, read_chars = decode_string(data, position)
-            arr.append(string)
-            position += read_chars
-
-        elif _read_byte(data, position) == "l":
-            lst, read_chars = decode_list(data, position)
-            arr.append(lst)
-            position += read_chars
-
-        elif _read_byte(data, position) == "d":
-            d, read_chars = decode_dictionary(data, position)
-            arr.append(d)
-            position += read_chars
-
-    if position >= len(data) or _read_byte(data, position) != "e":
-        raise BencodeException(f"Decoding list failed. Current list so far {arr}")
-
-    position += 1  # Consume last "e"
-
-    return arr, position - beginning
+    return decode(data, position)
 
 
 def encode_list(lst):
@@ -156,76 +344,20 @@ def encode_list(lst):
     :param lst: The list to be encoded
     :return: A String representing the passed list in bencode format
     """
-    #data = bytearray()
-    data = b'l'
+    if type(lst) is not list:
+        raise BencodeException(f"Cannot encode {type(lst).__name__} as a list")
 
-    for obj in lst:
-        if type(obj) is int:
-            data += encode_integer(obj)
-        elif type(obj) is list:
-            data += encode_list(obj)
-        elif type(obj) is str:
-            data += encode_string(obj)
-        elif type(obj) is dict:
-            data += encode_dictionary(obj)
-
-    data += b'e'
-    return data
+    return encode(lst)
 
 
 def decode_dictionary(data: bytes, position=0):
     if len(data) == 0:
         raise BencodeException("Decoding empty dictionary is undefined behaviour")
 
-    if _read_byte(data, position) != 'd':
+    if data[position] != _DICTIONARY:
         raise BencodeException("Decoding integer with invalid format for lists.")
 
-    beginning = position
-    position += 1  # consume the d
-    dic = {}
-
-    while position < len(data):
-
-        read_byte = _read_byte(data, position)
-
-        if read_byte == "e":
-            break
-
-        #if not (_read_byte(data, position).isdigit()):
-        #    raise BencodeException("All keys in a dictionary must be strings")
-
-        key, read_chars = decode_string(data, position)
-        position += read_chars
-
-        if _read_byte(data, position) == "i":
-            integer, read_chars = decode_integer(data, position)
-            dic[key.decode()] = integer
-            position += read_chars
-
-        elif _read_byte(data, position).isdigit():
-            string, read_chars = decode_string(data, position)
-            dic[key.decode()] = string
-            position += read_chars
-
-        elif _read_byte(data, position) == "l":
-            lst, read_chars = decode_list(data, position)
-            dic[key.decode()] = lst
-            position += read_chars
-
-        elif _read_byte(data, position) == "d":
-            d, read_chars = decode_dictionary(data, position)
-            dic[key.decode()] = d
-            position += read_chars
-
-        else:
-            raise BencodeException(f"Decoding dictionary failed. Current list so far {dic}")
-
-    if position >= len(data) or _read_byte(data, position) != "e":
-        raise BencodeException(f"Decoding dictionary failed. Current list so far {dic}")
-
-    position += 1  # Consume last "e"
-
-    return dic, position - beginning
+    return decode(data, position)
 
 
 def encode_dictionary(dictionary):
@@ -234,28 +366,7 @@ def encode_dictionary(dictionary):
     :param dictionary: The dictionary to be encoded
     :return: A String representing the passed dictionary in bencode format
     """
-    data = bytearray()
-    data += b'd'
-
-    for obj in dictionary:
-
-        data += encode_string(obj)
-
-        if type(dictionary[obj]) is int:
-            data += encode_integer(dictionary[obj])
-        elif type(dictionary[obj]) is list:
-            data += encode_list(dictionary[obj])
-        elif type(dictionary[obj]) is str:
-            data += encode_string(dictionary[obj])
-        elif type(dictionary[obj]) is dict:
-            data += encode_dictionary(dictionary[obj])
-        elif type(dictionary[obj]) is bytes:
-            res = bytearray()
-            res += str.encode(str(len(dictionary[obj])))
-            res += b':'
-            res += dictionary[obj]
-            data += res
-        else:
-            raise 'yelp'
-    data += b'e'
-    return data
+    if type(dictionary) is not dict:
+        raise BencodeException(f"Cannot encode {type(dictionary).__name__} as a dictionary")
+
+    return encode(dictionary)
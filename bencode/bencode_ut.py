@@ -1,3 +1,4 @@
+import io
 import unittest
 import bencode
 
@@ -30,6 +31,7 @@ class BencodeTest(unittest.TestCase):
     def test_encode_list(self):
         encoded = bencode.encode_list([42, "spam", ["moowlf"]])
         self.assertEqual(encoded, b"li42e4:spaml6:moowlfee")
+        self.assertIs(type(encoded), bytes)
 
     def test_empty_dictionary(self):
         with self.assertRaises(bencode.BencodeException) as cm:
@@ -89,6 +91,84 @@ class BencodeTest(unittest.TestCase):
         with self.assertRaises(bencode.BencodeException):
             bencode.decode_string(b"abc:data")
 
+    def test_decode_list_invalid_token(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.decode_list(b"lx")
+
+    def test_decode_string_past_end(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.decode_string(b"10:spam")
+
+    def test_decode_integer_whitespace(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.decode_integer(b"i 42e")
+
+    def test_decode_negative_integer(self):
+        self.assertEqual(bencode.decode_integer(b"i-42e"), (-42, 5))
+
+    def test_decode_position(self):
+        decoded_data, sz = bencode.decode_list(b"xxl4:spamei1e", 2)
+        self.assertEqual(decoded_data, [b"spam"])
+        self.assertEqual(sz, 8)
+
+    def test_decode_memoryview(self):
+        decoded_dict, sz = bencode.decode_dictionary(memoryview(b"d4:spaml1:aee"))
+        self.assertEqual(decoded_dict, {"spam": [b"a"]})
+        self.assertEqual(sz, 13)
+
+    def test_decode_deeply_nested(self):
+        depth = 100000
+        decoded_data, sz = bencode.decode(b"l" * depth + b"e" * depth)
+        self.assertEqual(sz, 2 * depth)
+
+        for _ in range(depth - 1):
+            decoded_data = decoded_data[0]
+        self.assertEqual(decoded_data, [])
+
+    def test_dictionary_key_without_value(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.decode_dictionary(b"d3:keye")
+
+    def test_decode_spans(self):
+        data = b"d4:infod4:name4:spame5:otherli1eee"
+        decoded_dict, spans = bencode.decode_spans(data)
+        self.assertEqual(decoded_dict, {"info": {"name": b"spam"}, "other": [1]})
+        self.assertEqual(spans, {"info": (7, 21), "other": (28, 33)})
+        self.assertEqual(data[7:21], b"d4:name4:spame")
+
+    def test_decode_views(self):
+        decoded_dict, _ = bencode.decode_spans(b"d1:a3:xyz1:b10:0123456789e", view_threshold=10)
+        self.assertEqual(decoded_dict["a"], b"xyz")
+        self.assertIsInstance(decoded_dict["b"], memoryview)
+        self.assertEqual(decoded_dict["b"], b"0123456789")
+
+    def test_encode_sorted_keys(self):
+        encoded = bencode.encode_dictionary({"spam": 1, "eggs": 2, b"ham": 3})
+        self.assertEqual(encoded, b"d4:eggsi2e3:hami3e4:spami1ee")
+
+    def test_encode_bytes(self):
+        encoded = bencode.encode_list([b"spam", bytearray(b"eggs"), memoryview(b"ham")])
+        self.assertEqual(encoded, b"l4:spam4:eggs3:hame")
+
+    def test_encode_unicode_string(self):
+        self.assertEqual(bencode.encode_string("caf\u00e9"), b"5:caf\xc3\xa9")
+
+    def test_encode_unknown_type(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.encode({"spam": 1.5})
+
+    def test_encode_duplicate_key(self):
+        with self.assertRaises(bencode.BencodeException):
+            bencode.encode({"spam": 1, b"spam": 2})
+
+    def test_encode_to_file(self):
+        value = {"info": {"pieces": b"\x01" * 200000, "files": [{"length": i, "path": [b"a", "b"]} for i in range(3)]}}
+        file = io.BytesIO()
+
+        self.assertIsNone(bencode.encode(value, file))
+        self.assertEqual(file.getvalue(), bencode.encode(value))
+        self.assertEqual(bencode.decode(file.getvalue())[0]["info"]["files"][2], {"length": 2, "path": [b"a", b"b"]})
+
 
 # Add tests for decode_list functionality once implemented
 
@@ -1,22 +1,22 @@
 
 import sys
-from bencode import bencode
 from torrent.TorrentInformation import TorrentInformation
 
 from torrent.Session import Session
 from torrent.Torrent import Torrent
+from torrent.Tracker import DEFAULT_PORT
 
-# Torrent file
-if len(sys.argv) != 2:
-    print("Usage: python smtorrent.py <path_to_torrent_file>")
+# Torrent files, downloaded together
+if len(sys.argv) < 2:
+    print("Usage: python smtorrent.py <path_to_torrent_file> [<path_to_torrent_file> ...]")
     sys.exit(1)
 
-filepath = sys.argv[1]
-current_session = Session()
+# Peers can connect to us and download what we already have
+current_session = Session(listen_port=DEFAULT_PORT)
 
-with open(filepath, 'rb') as f:
-    d = bencode.decode_dictionary(f.read())[0]
+for filepath in sys.argv[1:]:
+    with open(filepath, 'rb') as f:
+        current_session.add_torrent(Torrent(TorrentInformation.from_bytes(f.read())))
 
-    current_session.add_torrent(Torrent(TorrentInformation(d)))
-    current_session.download()
+current_session.download()
 
@@ -0,0 +1,370 @@
+import asyncio
+import functools
+
+from torrent import Connection, Messages
+from torrent.Network import Network
+from torrent.PeerProtocol import PeerProtocol, SNUB_TIMEOUT
+from torrent.TorrentException import TorrentException
+
+CONNECT_TIMEOUT = 10
+ANNOUNCE_RETRY = 30
+
+# Seconds an idle session waits for a message before looking for work again
+IDLE_TIMEOUT = 1
+
+# Most bytes read from a peer at once
+RECEIVE_SIZE = 2**16
+
+
+class AsyncPeerSession:
+    """
+    A long-lived connection to a single peer, driven by an asyncio task instead of a thread. Peers connecting to us
+    are served from the streams they connected on.
+    """
+
+    def __init__(self, engine, peer, pipeline_size=5, adaptive_pipeline=True, streams=None, handshake=None):
+        self._engine = engine
+        self._torrent = engine.torrent
+        self._peer = peer
+
+        # Inbound connections are accepted with the handshake of the peer already received
+        self._reader, self._writer = streams or (None, None)
+        self._handshake = handshake
+        self._protocol = PeerProtocol(self._torrent, peer, pipeline_size, adaptive_pipeline, streams is not None)
+        self._download, self._upload = self._torrent.peer_rate_limiters()
+
+        # Bytes received but not decoded yet, the beginning of a message
+        self._pending = b""
+
+        trace = self._torrent.trace
+        self._trace = functools.partial(trace, peer=peer) if trace is not None else None
+
+    @property
+    def peer(self):
+        return self._peer
+
+    async def run(self):
+        """
+        Keeps pulling work from the torrent and serving the requests of the peer until the torrent stops running, the
+        peer stops answering or the task is cancelled
+        """
+        receiving = None
+        failed = False
+
+        try:
+            reader = await self._connect()
+
+            while self._torrent.is_running() and not self._protocol.is_pointless():
+
+                # Everything to be sent this round goes out together
+                await self._send([self._protocol.build_requests(), *self._protocol.build_uploads()])
+
+                if self._protocol.waiting_for_blocks() and receiving is None:
+                    try:
+                        async with asyncio.timeout(SNUB_TIMEOUT):
+                            messages = await self._receive_messages(reader)
+                    except TimeoutError:
+                        self._protocol.timed_out()
+
+                else:
+                    # Without work, wait for either a message or pieces made available by other peers
+                    if receiving is None:
+                        receiving = asyncio.ensure_future(self._receive_messages(reader))
+
+                    if not self._protocol.waiting_for_blocks():
+                        await self._engine.wait_for_work(receiving)
+
+                        if not receiving.done():
+                            continue
+
+                    elif not (await asyncio.wait({receiving}, timeout=SNUB_TIMEOUT))[0]:
+                        self._protocol.timed_out()
+
+                    messages = await receiving
+                    receiving = None
+
+                for message in messages:
+                    for piece, buffer in self._protocol.handle_message(message):
+                        await self._engine.piece_downloaded(piece, buffer, self._peer)
+
+                # Pieces rejected or given up by this session may be downloaded by idle ones
+                if self._protocol.take_returned_work():
+                    self._engine.work_returned()
+
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, TorrentException) as e:
+            print(f"{self._peer['ip']} : {e}")
+            failed = True
+
+        finally:
+            if receiving is not None:
+                receiving.cancel()
+
+            # Someone else has to download the pieces we were working on
+            if self._protocol.has_work():
+                self._engine.work_returned()
+
+            self._protocol.close()
+
+            if self._writer is not None:
+                self._writer.close()
+
+            self._torrent.peers.release(self._peer, failed)
+
+    async def _connect(self):
+        peer_ip, peer_port = self._peer["ip"], self._peer["port"]
+        handshake = Connection.build_handshake(self._torrent.info_hash(), self._engine.own_peer_id)
+
+        if self._reader is not None:
+            # Answer the handshake of the peer
+            reader = self._reader
+            self._writer.write(handshake)
+            print(f"> Accepted {peer_ip}:{peer_port}")
+
+        else:
+            reader, self._writer = await asyncio.wait_for(asyncio.open_connection(peer_ip, peer_port),
+                                                          CONNECT_TIMEOUT)
+            Network.configure_socket(self._writer.get_extra_info("socket"))
+            print(f"> Connected to {peer_ip}:{peer_port}")
+
+            # Send Handshake and receive
+            self._writer.write(handshake)
+            self._handshake = await reader.readexactly(len(handshake))
+
+        reserved, info_hash, _ = Connection.parse_handshake(self._handshake)
+        if info_hash != self._torrent.info_hash():
+            raise TorrentException("Peer answered the handshake with a different info hash")
+
+        self._protocol.negotiate(reserved)
+
+        # Send our bitfield and interested
+        self._writer.write(self._protocol.build_greeting())
+        await self._writer.drain()
+
+        return reader
+
+    async def _receive_messages(self, reader):
+        """
+        Receives at least one message from the peer, decoding every complete message read at once in a single pass
+        :return: A list of message objects
+        """
+        data = self._pending
+
+        while True:
+            messages, start, needed = Messages.decode_messages(memoryview(data), 0, len(data),
+                                                               self._protocol.max_message_length)
+
+            if messages:
+                self._pending = data[start:]
+                return messages
+
+            chunk = await reader.read(max(RECEIVE_SIZE, needed - len(data)))
+            if not chunk:
+                raise ConnectionError("Peer closed the connection")
+
+            # Kept before anything else is awaited, the task may be cancelled there
+            data = self._pending = data + chunk
+
+            if self._trace is not None:
+                self._trace("recv", bytes=len(chunk))
+
+            delay = self._download.consume(len(chunk))
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def _send(self, buffers):
+        """
+        Writes the buffers of the messages to be sent, at once
+        """
+        size = sum(len(buffer) for buffer in buffers)
+        if not size:
+            return
+
+        self._writer.writelines(buffers)
+        await self._writer.drain()
+
+        if self._trace is not None:
+            self._trace("send", bytes=size)
+
+        delay = self._upload.consume(size)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AsyncEngine:
+    """
+    Downloads a torrent from a single event loop, then seeds it if the torrent is a seed. Tracker announces, peer
+    connections and the piece scheduling are all tasks, the number of connected peers is bounded by `max_peers`, the
+    best known peers being connected to first, and hashing and disk writes run in the default executor so they never
+    stall the loop.
+    """
+
+    def __init__(self, torrent, own_peer_id: str, max_peers=30, pipeline_size=5, adaptive_pipeline=True):
+        self._torrent = torrent
+        self._own_peer_id = own_peer_id
+
+        self._pipeline_size = pipeline_size
+        self._adaptive_pipeline = adaptive_pipeline
+
+        self._max_peers = max_peers
+        self._sessions = {}
+        self._peers_changed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._work_available = asyncio.Event()
+        self._loop = None
+
+    @property
+    def torrent(self):
+        return self._torrent
+
+    @property
+    def own_peer_id(self):
+        return self._own_peer_id
+
+    async def download(self):
+        """
+        Runs until the torrent stops running. Cancelling it cancels the tracker and every peer task
+        """
+        self._loop = asyncio.get_running_loop()
+        announcer = asyncio.create_task(self._announce())
+        connector = asyncio.create_task(self._connect_peers())
+
+        try:
+            if self._torrent.is_running():
+                await self._stopped.wait()
+
+        finally:
+            announcer.cancel()
+            connector.cancel()
+
+            tasks = list(self._sessions.values())
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(announcer, connector, *tasks, return_exceptions=True)
+
+    def stop(self):
+        """
+        Ends the download, may be called from any thread
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def accept(self, reader, writer, peer, handshake):
+        """
+        Serves a peer which connected to us, if a connection slot is free
+        :param handshake: The handshake of the peer, already received
+        :return: False if the peer was turned away
+        """
+        key = (peer["ip"], peer["port"])
+
+        if key in self._sessions or len(self._sessions) >= self._max_peers \
+                or not self._torrent.limits.connections.try_acquire(self._torrent):
+            return False
+
+        self._sessions[key] = asyncio.create_task(self._run_inbound_session(key, peer, (reader, writer), handshake))
+        return True
+
+    async def wait_for_work(self, receiving):
+        """
+        Waits until either the peer sent a message or pieces were put back in the picker. Slots released by other
+        torrents do not wake the session, so it looks for work again after a while
+        """
+        waiter = asyncio.ensure_future(self._work_available.wait())
+
+        try:
+            await asyncio.wait({receiving, waiter}, timeout=IDLE_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+    def work_returned(self):
+        """
+        Wakes up every session waiting for work, pieces were put back in the picker
+        """
+        self._work_available.set()
+        self._work_available = asyncio.Event()
+
+    async def piece_downloaded(self, piece, buffer, peer):
+        # Pieces waiting for the disk are bounded across the session
+        disk_queue = self._torrent.limits.disk_queue
+        await disk_queue.acquire_async(self._torrent)
+
+        # Verification runs on the torrent's verify workers, or on the default executor
+        try:
+            loop = asyncio.get_running_loop()
+            valid = await loop.run_in_executor(self._torrent.verifier, self._torrent.verify_piece, piece, buffer, peer)
+        finally:
+            disk_queue.release(self._torrent)
+
+        # Idle sessions may have something to do, the piece is back in the picker or other pieces can be joined
+        if not valid or self._torrent.in_endgame():
+            self.work_returned()
+
+        if not self._torrent.is_running():
+            self._stopped.set()
+
+    async def _announce(self):
+
+        while self._torrent.is_running():
+
+            try:
+                peers, interval = await asyncio.to_thread(self._torrent.announce, self._own_peer_id)
+            except (OSError, TorrentException) as e:
+                print(f"Peer request failed: {e}")
+                await asyncio.sleep(ANNOUNCE_RETRY)
+                continue
+
+            self._torrent.peers.add(peers)
+            self._peers_changed.set()
+
+            print(f"Peer request: Waiting for {interval}s")
+            await asyncio.sleep(interval)
+
+    async def _connect_peers(self):
+        """
+        Connects to the best known peers while there is room for more sessions. Seeds only serve the peers connecting
+        to them
+        """
+        while not self._torrent.is_complete():
+
+            peer = self._torrent.peers.take(timeout=0) if len(self._sessions) < self._max_peers else None
+
+            # Peers already being served by a session are not connected to twice
+            if peer is not None and (peer["ip"], peer["port"]) in self._sessions:
+                self._torrent.peers.release(peer)
+                peer = None
+
+            if peer is None:
+                # Peers failing earlier become available again after a while
+                self._peers_changed.clear()
+                try:
+                    await asyncio.wait_for(self._peers_changed.wait(), IDLE_TIMEOUT)
+                except TimeoutError:
+                    pass
+                continue
+
+            key = (peer["ip"], peer["port"])
+            self._sessions[key] = asyncio.create_task(self._run_session(key, peer))
+
+    async def _run_session(self, key, peer):
+        connections = self._torrent.limits.connections
+
+        try:
+            await connections.acquire_async(self._torrent)
+
+            try:
+                session = AsyncPeerSession(self, peer, self._pipeline_size, self._adaptive_pipeline)
+                await session.run()
+            finally:
+                connections.release(self._torrent)
+        finally:
+            del self._sessions[key]
+            self._peers_changed.set()
+
+    async def _run_inbound_session(self, key, peer, streams, handshake):
+        try:
+            session = AsyncPeerSession(self, peer, self._pipeline_size, self._adaptive_pipeline, streams, handshake)
+            await session.run()
+        finally:
+            self._torrent.limits.connections.release(self._torrent)
+            del self._sessions[key]
+            self._peers_changed.set()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from bencode import bencode
+
+from torrent.Listener import Listener
+from torrent.Session import Session
+from torrent.TestFixtures import generate_data, make_metadata, make_torrent
+from torrent.Torrent import Torrent
+
+PIECES = 8
+SEED_ID = "-SM0001-000000000001"
+PEER_ID = "-SM0001-000000000002"
+
+
+class TrackerStandIn(BaseHTTPRequestHandler):
+    peers = b""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(bencode.encode_dictionary({"interval": 1800, "peers": self.peers}))
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_data(PIECES)
+
+        server = HTTPServer(("127.0.0.1", 0), TrackerStandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.metadata = make_metadata(self.data, f"http://127.0.0.1:{server.server_port}/announce".encode())
+
+        # The seed is served by threads, from the connections the listener accepts
+        seed_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(seed_directory.cleanup)
+        seed = make_torrent(seed_directory.name, self.data, seed=True, metadata=self.metadata)
+
+        listener = Listener([seed], SEED_ID, 0, host="127.0.0.1")
+        listener.start()
+        seed.port = listener.port
+        TrackerStandIn.peers = bytes([127, 0, 0, 1]) + struct.pack(">H", listener.port)
+
+        seeding = threading.Thread(target=seed.download, args=(SEED_ID,), daemon=True)
+        seeding.start()
+        self.addCleanup(seeding.join, 5)
+        self.addCleanup(seed.stop)
+        self.addCleanup(listener.close)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    async def download(self, torrent):
+        await torrent.download_async(PEER_ID)
+
+        # Everything the engine started is done by the time it returns
+        self.leftover = asyncio.all_tasks() - {asyncio.current_task()}
+
+    def test_download_from_seed(self):
+        # Kept seeding once complete, so it only ends when stopped
+        torrent = Torrent(self.metadata, self.directory.name, resume=False, seed=True)
+
+        session = Session(max_connections=4)
+        session.add_torrent(torrent)
+
+        thread = threading.Thread(target=asyncio.run, args=(self.download(torrent),), daemon=True)
+        thread.start()
+
+        deadline = time.monotonic() + 10
+        while not torrent.is_complete() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertTrue(torrent.is_complete())
+        self.assertTrue(torrent.is_running())
+
+        torrent.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+        self.assertEqual(self.leftover, set())
+        self.assertEqual(session.limits.connections.in_use(), 0)
+        self.assertEqual(torrent.metrics()["peers_connected"], 0)
+
+        with open(os.path.join(self.directory.name, self.metadata.name()), "rb") as file:
+            self.assertEqual(file.read(), self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
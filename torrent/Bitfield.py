@@ -0,0 +1,66 @@
+class Bitfield:
+    """
+    A compact set of piece indexes, one bit per piece, laid out as in the bitfield message: the high bit of the first
+    byte is piece 0
+    """
+
+    def __init__(self, length, data=None):
+        self._length = length
+        self._bits = bytearray((length + 7) // 8) if data is None else bytearray(data)
+
+        if len(self._bits) != (length + 7) // 8:
+            raise ValueError(f"A bitfield for {length} pieces needs {(length + 7) // 8} bytes, got {len(self._bits)}")
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, index):
+        return bool(self._bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def __iter__(self):
+        """
+        Iterates over the indexes in the set
+        """
+        for byte_index, byte in enumerate(self._bits):
+            if not byte:
+                continue
+
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    yield (byte_index << 3) + bit
+
+    def complement(self):
+        """
+        :return: A new bitfield holding the indexes not in this one
+        """
+        spare = len(self._bits) * 8 - self._length
+        mask = (1 << (len(self._bits) * 8)) - (1 << spare)
+        inverted = int.from_bytes(self._bits, "big") ^ mask
+
+        return Bitfield(self._length, inverted.to_bytes(len(self._bits), "big"))
+
+    def add(self, index):
+        self._bits[index >> 3] |= 0x80 >> (index & 7)
+
+    def discard(self, index):
+        self._bits[index >> 3] &= ~(0x80 >> (index & 7)) & 0xFF
+
+    def count(self):
+        return bin(int.from_bytes(self._bits, "big")).count("1")
+
+    def is_complete(self):
+        return self.count() == self._length
+
+    def to_bytes(self):
+        return bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, length, data):
+        bitfield = cls(length, data)
+
+        # The spare bits at the end must be cleared
+        spare = len(bitfield._bits) * 8 - length
+        if spare and bitfield._bits[-1] & ((1 << spare) - 1):
+            raise ValueError("Bitfield has spare bits set")
+
+        return bitfield
@@ -0,0 +1,44 @@
+import unittest
+
+from torrent.Bitfield import Bitfield
+
+
+class BitfieldTest(unittest.TestCase):
+
+    def test_add_and_discard(self):
+        bitfield = Bitfield(10)
+        bitfield.add(0)
+        bitfield.add(9)
+        self.assertIn(0, bitfield)
+        self.assertIn(9, bitfield)
+        self.assertNotIn(1, bitfield)
+        self.assertEqual(bitfield.to_bytes(), b"\x80\x40")
+
+        bitfield.discard(0)
+        self.assertNotIn(0, bitfield)
+        self.assertEqual(bitfield.count(), 1)
+
+    def test_iterate(self):
+        bitfield = Bitfield.from_bytes(12, b"\xa0\x10")
+        self.assertEqual(list(bitfield), [0, 2, 11])
+
+    def test_complement(self):
+        bitfield = Bitfield.from_bytes(12, b"\xff\xe0")
+        self.assertEqual(list(bitfield.complement()), [11])
+        self.assertEqual(bitfield.complement().to_bytes(), b"\x00\x10")
+
+    def test_complete(self):
+        bitfield = Bitfield.from_bytes(9, b"\xff\x80")
+        self.assertTrue(bitfield.is_complete())
+
+    def test_spare_bits(self):
+        with self.assertRaises(ValueError):
+            Bitfield.from_bytes(9, b"\xff\xc0")
+
+    def test_wrong_size(self):
+        with self.assertRaises(ValueError):
+            Bitfield.from_bytes(9, b"\xff")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+
+# Seconds between two choices of the peers to upload to, and between two changes of the optimistic unchoke
+RECHOKE_INTERVAL = 10
+OPTIMISTIC_INTERVAL = 30
+
+
+class Choker:
+    """
+    Decides which of the interested peers are uploaded to. Every `interval` seconds, the peers sending us the most
+    are unchoked, tit-for-tat, peers sending as much being unchoked in turn: those unchoked least recently first. When
+    more peers are interested than there are slots, one slot is kept for an optimistic unchoke, a peer picked at random
+    every `optimistic_interval` seconds, so peers we do not download from get a chance to show what they can do.
+
+    Slots freed between two choices go to the best waiting peers at once, peers are only choked by the next choice.
+    """
+
+    def __init__(self, max_uploads=4, interval=RECHOKE_INTERVAL, optimistic_interval=OPTIMISTIC_INTERVAL):
+        self._max_uploads = max_uploads
+        self._interval = interval
+        self._optimistic_interval = optimistic_interval
+
+        # The interested peers, by protocol, with the last time they were unchoked
+        self._interested = {}
+        self._unchoked = set()
+        self._optimistic = None
+
+        self._next_rechoke = 0.0
+        self._next_optimistic = 0.0
+        self._lock = threading.Lock()
+
+    def interested(self, protocol):
+        with self._lock:
+            self._interested.setdefault(protocol, float("-inf"))
+
+    def not_interested(self, protocol):
+        """
+        The peer is no longer interested or its connection ended, its slot is freed
+        """
+        with self._lock:
+            self._interested.pop(protocol, None)
+            self._unchoked.discard(protocol)
+
+            if self._optimistic is protocol:
+                self._optimistic = None
+
+    def is_unchoked(self, protocol):
+        """
+        Chooses the peers to upload to again if it is time to
+        :return: True if the peer may be uploaded to
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if now >= self._next_rechoke:
+                self._rechoke(now)
+            elif len(self._unchoked) < min(self._max_uploads, len(self._interested)):
+                self._fill(now)
+
+            return protocol in self._unchoked
+
+    def _rank(self, protocol):
+        return -protocol.statistics.rate, self._interested[protocol]
+
+    def _rechoke(self, now):
+        ranked = sorted(self._interested, key=self._rank)
+        slots = self._max_uploads
+
+        if 0 < slots < len(ranked):
+            slots -= 1
+
+            # Kept until it is time for another peer, unless it earned a regular slot meanwhile
+            if self._optimistic is None or self._optimistic in ranked[:slots] or now >= self._next_optimistic:
+                self._optimistic = random.choice(ranked[slots:])
+                self._next_optimistic = now + self._optimistic_interval
+        else:
+            self._optimistic = None
+
+        self._unchoked = set(ranked[:slots])
+        if self._optimistic is not None:
+            self._unchoked.add(self._optimistic)
+
+        for protocol in self._unchoked:
+            self._interested[protocol] = now
+
+        self._next_rechoke = now + self._interval
+
+    def _fill(self, now):
+        waiting = sorted((protocol for protocol in self._interested if protocol not in self._unchoked), key=self._rank)
+
+        for protocol in waiting[:self._max_uploads - len(self._unchoked)]:
+            self._unchoked.add(protocol)
+            self._interested[protocol] = now
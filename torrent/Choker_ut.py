@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from torrent.Choker import Choker
+from torrent.PeerPool import PeerStatistics
+
+
+class ProtocolStandIn:
+
+    def __init__(self, port, rate):
+        self.statistics = PeerStatistics("10.0.0.1", port, rate=rate)
+
+
+def make_peers(*rates):
+    return [ProtocolStandIn(port, rate) for port, rate in enumerate(rates)]
+
+
+class ChokerTest(unittest.TestCase):
+
+    def unchoked(self, choker, peers):
+        return {port for port, peer in enumerate(peers) if choker.is_unchoked(peer)}
+
+    def test_fastest_peers_unchoked(self):
+        choker = Choker(max_uploads=3)
+        peers = make_peers(0.0, 100.0, 200.0, 300.0, 400.0)
+        for peer in peers:
+            choker.interested(peer)
+
+        # Two regular slots, the third one goes to any of the slower peers
+        unchoked = self.unchoked(choker, peers)
+        self.assertEqual(len(unchoked), 3)
+        self.assertLessEqual({3, 4}, unchoked)
+
+    def test_equal_peers_take_turns(self):
+        choker = Choker(max_uploads=2, interval=0.05)
+        peers = make_peers(0.0, 0.0, 0.0, 0.0)
+        for peer in peers:
+            choker.interested(peer)
+
+        # The regular slot goes round the peers, the optimistic unchoke stays
+        seen = set()
+        for _ in range(3):
+            unchoked = self.unchoked(choker, peers)
+            self.assertEqual(len(unchoked), 2)
+            seen |= unchoked
+            time.sleep(0.06)
+
+        self.assertEqual(seen, {0, 1, 2, 3})
+
+    def test_free_slot_goes_to_waiting_peer(self):
+        choker = Choker(max_uploads=2)
+        peers = make_peers(0.0, 0.0, 0.0)
+        for peer in peers[:2]:
+            choker.interested(peer)
+        self.assertEqual(self.unchoked(choker, peers), {0, 1})
+
+        # Nobody is choked before the next choice, until a slot is freed
+        choker.interested(peers[2])
+        self.assertEqual(self.unchoked(choker, peers), {0, 1})
+
+        choker.not_interested(peers[0])
+        self.assertEqual(self.unchoked(choker, peers), {1, 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
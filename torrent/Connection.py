@@ -0,0 +1,48 @@
+import random
+
+from torrent.TorrentException import TorrentException
+
+# Bit of the last reserved byte of the handshake announcing the Fast Extension (BEP 6)
+FAST_EXTENSION = 0x04
+
+
+def parse_handshake(data: bytes):
+    """
+    :return: A tuple with the reserved bytes, the info hash and the peer id of a handshake
+    """
+    if data[0] != len(b"BitTorrent protocol") or data[1:20] != b"BitTorrent protocol":
+        raise TorrentException("Peer does not speak the BitTorrent protocol")
+
+    return bytes(data[20:28]), bytes(data[28:48]), bytes(data[48:68])
+
+
+def supports_fast_extension(reserved: bytes):
+    return bool(reserved[7] & FAST_EXTENSION)
+
+
+def build_peer_request(info_hash: bytes, peer_id: str, port, uploaded, downloaded, left, event=None):
+    params = {
+        'info_hash': info_hash,
+        'peer_id': peer_id,
+        'port': port,
+        'uploaded': uploaded,
+        'downloaded': downloaded,
+        'left': left,
+        'compact': 1
+    }
+
+    if event is not None:
+        params['event'] = event
+
+    return params
+
+
+def build_handshake(info_hash: bytes, peer_id: str):
+    data = bytearray()
+    data += len(b"BitTorrent protocol").to_bytes(1, "big")
+    data += b"BitTorrent protocol"
+    data += bytes(7) + bytes([FAST_EXTENSION])
+    data += info_hash
+    data += peer_id.encode()
+
+    return data
@@ -0,0 +1,27 @@
+import unittest
+
+from torrent import Connection
+from torrent.TorrentException import TorrentException
+
+INFO_HASH = b"\x01" * 20
+PEER_ID = "-SM0001-000000000000"
+
+
+class ConnectionTest(unittest.TestCase):
+
+    def test_handshake_roundtrip(self):
+        reserved, info_hash, peer_id = Connection.parse_handshake(Connection.build_handshake(INFO_HASH, PEER_ID))
+        self.assertEqual(info_hash, INFO_HASH)
+        self.assertEqual(peer_id, PEER_ID.encode())
+        self.assertTrue(Connection.supports_fast_extension(reserved))
+
+    def test_no_fast_extension(self):
+        self.assertFalse(Connection.supports_fast_extension(bytes(8)))
+
+    def test_not_bittorrent(self):
+        with self.assertRaises(TorrentException):
+            Connection.parse_handshake(b"\x13" + b"X" * 67)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+
+from torrent.PieceBuffer import PieceBuffer
+from torrent.Pipeline import BLOCK_SIZE
+
+
+class DownloadingPiece:
+    """
+    A piece being downloaded, shared by every session working on it. Normally a single session downloads each piece;
+    in endgame mode its missing blocks are requested from several peers at once and the first copy of each block
+    wins, the other requesters being told to cancel theirs.
+    """
+
+    def __init__(self, piece, incremental=True):
+        self._piece = piece
+        self._buffer = PieceBuffer(piece.length, incremental)
+
+        self._lock = threading.Lock()
+        self._received = set()
+        self._requesters = {}
+        self._workers = set()
+
+    @property
+    def piece(self):
+        return self._piece
+
+    @property
+    def piece_id(self):
+        return self._piece.piece_id
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    def is_complete(self):
+        return len(self._received) == len(self._piece.blocks)
+
+    def has_block(self, begin):
+        return begin in self._received
+
+    def missing_blocks(self):
+        return [block for block in self._piece.blocks if block.block_id * BLOCK_SIZE not in self._received]
+
+    def has_worker(self, worker):
+        return worker in self._workers
+
+    def join(self, worker):
+        with self._lock:
+            self._workers.add(worker)
+
+    def leave(self, worker):
+        """
+        :return: True if nobody is working on the piece anymore
+        """
+        with self._lock:
+            self._workers.discard(worker)
+
+            for requesters in self._requesters.values():
+                requesters.discard(worker)
+
+            return not self._workers
+
+    def requested(self, worker, begin):
+        with self._lock:
+            self._requesters.setdefault(begin, set()).add(worker)
+
+    def receive(self, worker, begin, data):
+        """
+        Stores a block, unless another worker got it first
+        :return: A tuple telling if the block was accepted, the other workers that requested it as well and if this
+        block completed the piece
+        """
+        with self._lock:
+            if begin in self._received:
+                return False, [], False
+
+            self._buffer.add_block(begin, data)
+            self._received.add(begin)
+
+            others = self._requesters.pop(begin, set())
+            others.discard(worker)
+
+            return True, list(others), self.is_complete()
@@ -0,0 +1,52 @@
+import unittest
+
+from torrent.DownloadingPiece import DownloadingPiece
+from torrent.Pipeline import BLOCK_SIZE
+from torrent.Torrent import Piece
+
+
+class DownloadingPieceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.downloading = DownloadingPiece(Piece(3, b"\0" * 20, 0, 2 * BLOCK_SIZE + 10))
+
+    def test_first_copy_of_a_block_wins(self):
+        for worker in ("first", "second", "third"):
+            self.downloading.join(worker)
+            self.downloading.requested(worker, BLOCK_SIZE)
+
+        accepted, others, completed = self.downloading.receive("second", BLOCK_SIZE, b"a" * BLOCK_SIZE)
+        self.assertTrue(accepted)
+        self.assertEqual(sorted(others), ["first", "third"])
+        self.assertFalse(completed)
+
+        self.assertEqual(self.downloading.receive("first", BLOCK_SIZE, b"b" * BLOCK_SIZE), (False, [], False))
+        self.assertEqual(self.downloading.buffer.data[BLOCK_SIZE:2 * BLOCK_SIZE], b"a" * BLOCK_SIZE)
+
+    def test_missing_blocks(self):
+        self.assertEqual([block.block_size for block in self.downloading.missing_blocks()],
+                         [BLOCK_SIZE, BLOCK_SIZE, 10])
+
+        self.downloading.receive("first", 0, b"a" * BLOCK_SIZE)
+        self.downloading.receive("first", 2 * BLOCK_SIZE, b"c" * 10)
+        self.assertEqual([block.block_id for block in self.downloading.missing_blocks()], [1])
+
+        *_, completed = self.downloading.receive("first", BLOCK_SIZE, b"b" * BLOCK_SIZE)
+        self.assertTrue(completed)
+        self.assertTrue(self.downloading.is_complete())
+
+    def test_last_worker_to_leave(self):
+        self.downloading.join("first")
+        self.downloading.join("second")
+        self.downloading.requested("first", 0)
+
+        self.assertFalse(self.downloading.leave("first"))
+        self.assertTrue(self.downloading.has_worker("second"))
+
+        # Workers which left are not told to cancel anymore
+        self.assertEqual(self.downloading.receive("second", 0, b"a" * BLOCK_SIZE)[1], [])
+        self.assertTrue(self.downloading.leave("second"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import dataclasses
+import threading
+
+from torrent.RateLimit import TokenBucket
+
+
+class SharedLimit:
+    """
+    A number of slots (peer connections, block requests, pieces queued for disk...) shared by many torrents. Each
+    registered torrent may hold at most its fair share of the total, weighted by its priority, so a busy torrent
+    cannot starve the others.
+
+    Slots can be taken without waiting, by blocking the calling thread or from a coroutine. A total of None means
+    there is no limit.
+    """
+
+    def __init__(self, total=None):
+        self._total = total
+        self._used = 0
+
+        self._priorities = {}
+        self._held = {}
+
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._async_waiters = []
+
+    @property
+    def total(self):
+        return self._total
+
+    def register(self, consumer, priority=1):
+        with self._lock:
+            self._priorities[consumer] = priority
+            self._held.setdefault(consumer, 0)
+            self._wake()
+
+    def unregister(self, consumer):
+        """
+        Gives the share of the consumer to the others. Slots it still holds are counted until released
+        """
+        with self._lock:
+            self._priorities.pop(consumer, None)
+            self._wake()
+
+    def set_priority(self, consumer, priority):
+        with self._lock:
+            if consumer in self._priorities:
+                self._priorities[consumer] = priority
+                self._wake()
+
+    def share(self, consumer):
+        """
+        :return: The most slots the consumer may hold at once
+        """
+        with self._lock:
+            return self._share(consumer)
+
+    def held(self, consumer):
+        return self._held.get(consumer, 0)
+
+    def in_use(self):
+        return self._used
+
+    def try_acquire(self, consumer, count=1):
+        """
+        Takes up to count slots without waiting
+        :return: The number of slots taken, possibly 0
+        """
+        if self._total is None:
+            return count
+
+        with self._lock:
+            return self._take(consumer, count)
+
+    def acquire(self, consumer, timeout=None):
+        """
+        Takes a slot, waiting for one to be released if needed
+        :return: False if no slot was released in time
+        """
+        if self._total is None:
+            return True
+
+        with self._lock:
+            return self._released.wait_for(lambda: self._take(consumer, 1), timeout)
+
+    async def acquire_async(self, consumer):
+        """
+        Takes a slot, waiting for one to be released without blocking the event loop
+        """
+        if self._total is None:
+            return
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            with self._lock:
+                if self._take(consumer, 1):
+                    return
+
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+
+            await waiter
+
+    def release(self, consumer, count=1):
+        if count <= 0 or self._total is None:
+            return
+
+        with self._lock:
+            self._held[consumer] -= count
+            self._used -= count
+
+            if not self._held[consumer] and consumer not in self._priorities:
+                del self._held[consumer]
+
+            self._wake()
+
+    def _share(self, consumer):
+        if self._total is None:
+            return None
+
+        priorities = sum(self._priorities.values())
+        priority = self._priorities.get(consumer, 0)
+
+        if not priorities or not priority:
+            return 0
+
+        return max(1, self._total * priority // priorities)
+
+    def _take(self, consumer, count):
+        if self._total is None:
+            available = count
+        else:
+            available = min(count, self._total - self._used, self._share(consumer) - self._held.get(consumer, 0))
+
+        if available <= 0:
+            return 0
+
+        self._held[consumer] = self._held.get(consumer, 0) + available
+        self._used += available
+        return available
+
+    def _wake(self):
+        self._released.notify_all()
+
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_set_result, waiter)
+
+        self._async_waiters.clear()
+
+
+def _set_result(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+@dataclasses.dataclass
+class SessionLimits:
+    """
+    The limits shared by every torrent of a session
+    """
+    connections: SharedLimit = dataclasses.field(default_factory=SharedLimit)
+    requests: SharedLimit = dataclasses.field(default_factory=SharedLimit)
+    disk_queue: SharedLimit = dataclasses.field(default_factory=SharedLimit)
+    download: TokenBucket = dataclasses.field(default_factory=TokenBucket)
+    upload: TokenBucket = dataclasses.field(default_factory=TokenBucket)
+
+    def register(self, consumer, priority=1):
+        for limit in self._limits():
+            limit.register(consumer, priority)
+
+    def unregister(self, consumer):
+        for limit in self._limits():
+            limit.unregister(consumer)
+
+    def set_priority(self, consumer, priority):
+        for limit in self._limits():
+            limit.set_priority(consumer, priority)
+
+    def _limits(self):
+        return self.connections, self.requests, self.disk_queue
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import unittest
+
+from torrent.Limits import SharedLimit
+
+
+class SharedLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limit = SharedLimit(12)
+        self.limit.register("low", 1)
+        self.limit.register("high", 2)
+
+    def test_share_by_priority(self):
+        self.assertEqual(self.limit.share("low"), 4)
+        self.assertEqual(self.limit.share("high"), 8)
+
+    def test_partial_acquire(self):
+        self.assertEqual(self.limit.try_acquire("low", 10), 4)
+        self.assertEqual(self.limit.try_acquire("low", 1), 0)
+        self.assertEqual(self.limit.try_acquire("high", 10), 8)
+        self.assertEqual(self.limit.in_use(), 12)
+
+    def test_unregister_gives_share_away(self):
+        self.limit.unregister("high")
+        self.assertEqual(self.limit.try_acquire("low", 20), 12)
+
+    def test_paused(self):
+        self.limit.set_priority("low", 0)
+        self.assertEqual(self.limit.try_acquire("low"), 0)
+
+    def test_unlimited(self):
+        limit = SharedLimit()
+        self.assertEqual(limit.try_acquire("anyone", 1000), 1000)
+        self.assertTrue(limit.acquire("anyone"))
+
+    def test_acquire_waits_for_release(self):
+        self.limit.try_acquire("low", 4)
+        self.assertFalse(self.limit.acquire("low", timeout=0.01))
+
+        threading.Timer(0.05, self.limit.release, ("low",)).start()
+        self.assertTrue(self.limit.acquire("low", timeout=5))
+        self.assertEqual(self.limit.held("low"), 4)
+
+    def test_acquire_async(self):
+        self.limit.try_acquire("low", 4)
+
+        async def acquire():
+            asyncio.get_running_loop().call_later(0.05, self.limit.release, "low")
+            await asyncio.wait_for(self.limit.acquire_async("low"), 5)
+
+        asyncio.run(acquire())
+        self.assertEqual(self.limit.held("low"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
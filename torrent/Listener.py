@@ -0,0 +1,130 @@
+import asyncio
+import socket
+import threading
+
+from torrent import Connection
+from torrent.Network import Network
+from torrent.TorrentException import TorrentException
+
+# Seconds a peer connecting to us has to send its handshake
+HANDSHAKE_TIMEOUT = 10
+HANDSHAKE_LENGTH = 68
+
+
+class Listener:
+    """
+    Accepts the connections of peers on a single port for every torrent of a session. The handshake of a peer names
+    the torrent it wants by its info hash, and the connection is handed over to that torrent, which serves it like the
+    connections it opened itself.
+
+    Connections are accepted either by a thread (start) or by the event loop the torrents are downloaded from
+    (start_async).
+    """
+
+    def __init__(self, torrents, own_peer_id: str, port, host=""):
+        self._torrents = torrents
+        self._own_peer_id = own_peer_id
+        self._address = (host, port)
+
+        self._socket = None
+        self._server = None
+
+    @property
+    def port(self):
+        """
+        :return: The port listened on, which is only known once started when listening on port 0
+        """
+        if self._socket is not None:
+            return self._socket.getsockname()[1]
+
+        if self._server is not None:
+            return self._server.sockets[0].getsockname()[1]
+
+        return self._address[1]
+
+    def start(self):
+        self._socket = self._listen()
+        threading.Thread(target=self._accept_loop, name="listener", daemon=True).start()
+
+    async def start_async(self):
+        # A single socket, as for the thread: on port 0, each socket of the server would get a port of its own
+        self._server = await asyncio.start_server(self._accept_async, sock=self._listen())
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _listen(self):
+        # Accepted connections inherit the options of the listening socket, the buffer sizes have to be set before
+        # the TCP handshake
+        listening = socket.create_server(self._address)
+        Network.configure_socket(listening)
+        return listening
+
+    def _find_torrent(self, handshake):
+        _, info_hash, _ = Connection.parse_handshake(handshake)
+
+        for torrent in self._torrents:
+            if torrent.info_hash() == info_hash:
+                return torrent
+
+        raise TorrentException("Peer asked for a torrent we do not have")
+
+    def _accept_loop(self):
+        listening = self._socket
+
+        while True:
+            try:
+                conn, address = listening.accept()
+            except OSError:
+                # The listener was closed
+                return
+
+            # The handshake may be slow to come, it is received from a thread of its own
+            threading.Thread(target=self._accept, args=(conn, address), daemon=True).start()
+
+    def _accept(self, conn, address):
+        peer = {"ip": address[0], "port": address[1]}
+
+        try:
+            conn.settimeout(HANDSHAKE_TIMEOUT)
+
+            # Only the handshake is read, whatever follows is left to the session
+            handshake = bytearray()
+            while len(handshake) < HANDSHAKE_LENGTH:
+                received = conn.recv(HANDSHAKE_LENGTH - len(handshake))
+                if not received:
+                    raise ConnectionError("Peer closed the connection")
+
+                handshake += received
+
+            torrent = self._find_torrent(handshake)
+            conn.settimeout(None)
+
+            if torrent.accept_peer(conn, peer, self._own_peer_id, handshake):
+                return
+
+        except (OSError, TorrentException) as e:
+            print(f"{peer['ip']} : {e}")
+
+        conn.close()
+
+    async def _accept_async(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        peer = {"ip": address[0], "port": address[1]}
+
+        try:
+            handshake = await asyncio.wait_for(reader.readexactly(HANDSHAKE_LENGTH), HANDSHAKE_TIMEOUT)
+
+            if self._find_torrent(handshake).accept_peer_async(reader, writer, peer, handshake):
+                return
+
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, TorrentException) as e:
+            print(f"{peer['ip']} : {e}")
+
+        writer.close()
@@ -0,0 +1,94 @@
+import asyncio
+import socket
+import tempfile
+import unittest
+
+from torrent import Connection
+from torrent.Limits import SessionLimits, SharedLimit
+from torrent.Listener import Listener, HANDSHAKE_LENGTH
+from torrent.TestFixtures import generate_data, make_torrent
+
+PIECES = 2
+PEER_ID = "-SM0001-000000000000"
+CLIENT_ID = "-SM0001-000000000001"
+
+
+def receive(conn, length):
+    """
+    :return: What the other side sent before closing the connection, at most length bytes
+    """
+    data = b""
+
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            break
+
+        data += chunk
+
+    return data
+
+
+class ListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.torrent = make_torrent(self.directory.name, generate_data(PIECES))
+        self.listener = Listener([self.torrent], PEER_ID, 0, host="127.0.0.1")
+
+    def tearDown(self):
+        self.listener.close()
+        self.torrent.stop()
+        self.directory.cleanup()
+
+    def connect(self, info_hash):
+        conn = socket.create_connection(("127.0.0.1", self.listener.port), timeout=5)
+        conn.sendall(Connection.build_handshake(info_hash, CLIENT_ID))
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_handed_to_torrent(self):
+        self.listener.start()
+
+        # The torrent answers the handshake, then sends its greeting
+        _, info_hash, _ = Connection.parse_handshake(receive(self.connect(self.torrent.info_hash()), HANDSHAKE_LENGTH))
+        self.assertEqual(info_hash, self.torrent.info_hash())
+
+    def test_unknown_info_hash(self):
+        self.listener.start()
+        self.assertEqual(receive(self.connect(bytes(20)), HANDSHAKE_LENGTH), b"")
+
+    def test_refused_without_free_slot(self):
+        self.torrent.use_limits(SessionLimits(connections=SharedLimit(0)))
+        self.listener.start()
+        self.assertEqual(receive(self.connect(self.torrent.info_hash()), HANDSHAKE_LENGTH), b"")
+
+    def test_async(self):
+        asyncio.run(self.serve_async())
+
+    async def serve_async(self):
+        await self.listener.start_async()
+
+        # Connections are handed to the asyncio engine of the torrent, only while it downloads
+        downloading = asyncio.create_task(self.torrent.download_async(PEER_ID))
+        await asyncio.sleep(0)
+
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.listener.port)
+            writer.write(Connection.build_handshake(self.torrent.info_hash(), CLIENT_ID))
+            handshake = await asyncio.wait_for(reader.readexactly(HANDSHAKE_LENGTH), 5)
+            self.assertEqual(Connection.parse_handshake(handshake)[1], self.torrent.info_hash())
+            writer.close()
+
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.listener.port)
+            writer.write(Connection.build_handshake(bytes(20), CLIENT_ID))
+            self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+            writer.close()
+
+        finally:
+            self.torrent.stop()
+            await downloading
+
+
+if __name__ == "__main__":
+    unittest.main()
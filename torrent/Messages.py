@@ -0,0 +1,303 @@
+import dataclasses
+import struct
+from typing import ClassVar
+
+from torrent.TorrentException import TorrentException
+
+# Every message is prefixed by its length, the id included, in network byte order
+_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct(">IB")
+_INDEX = struct.Struct(">IBI")
+_BLOCK = struct.Struct(">IBIII")
+_PIECE = struct.Struct(">IBII")
+_PORT = struct.Struct(">IBH")
+_EXTENDED = struct.Struct(">IBB")
+
+# Largest block a peer may request, and the longest message accepted: a piece message carrying such a block. The
+# bitfield of a torrent with many pieces may be longer, its sessions accept it
+MAX_BLOCK_LENGTH = 2**17
+MAX_MESSAGE_LENGTH = MAX_BLOCK_LENGTH + 9
+
+# The same formats without the length prefix and the id, to decode payloads in place
+_INDEX_PAYLOAD = struct.Struct(">I")
+_BLOCK_PAYLOAD = struct.Struct(">III")
+_PIECE_PAYLOAD = struct.Struct(">II")
+_PORT_PAYLOAD = struct.Struct(">H")
+
+
+@dataclasses.dataclass(slots=True)
+class KeepAlive:
+    id: ClassVar = None
+
+    def encode(self):
+        return _LENGTH.pack(0)
+
+
+@dataclasses.dataclass(slots=True)
+class Choke:
+    id: ClassVar = 0
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class Unchoke:
+    id: ClassVar = 1
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class Interested:
+    id: ClassVar = 2
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class NotInterested:
+    id: ClassVar = 3
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class Have:
+    id: ClassVar = 4
+    index: int
+
+    def encode(self):
+        return _INDEX.pack(5, self.id, self.index)
+
+
+@dataclasses.dataclass(slots=True)
+class Bitfield:
+    id: ClassVar = 5
+    bitfield: bytes
+
+    def encode(self):
+        return _HEADER.pack(1 + len(self.bitfield), self.id) + self.bitfield
+
+
+@dataclasses.dataclass(slots=True)
+class Request:
+    id: ClassVar = 6
+    index: int
+    begin: int
+    length: int
+
+    def encode(self):
+        return _BLOCK.pack(13, self.id, self.index, self.begin, self.length)
+
+
+@dataclasses.dataclass(slots=True)
+class Piece:
+    """
+    A block of a piece. Decoded blocks are views over the receive buffer, only valid until the next receive
+    """
+    id: ClassVar = 7
+    index: int
+    begin: int
+    block: bytes
+
+    def header(self):
+        return _PIECE.pack(9 + len(self.block), self.id, self.index, self.begin)
+
+    def encode(self):
+        return self.header() + self.block
+
+
+@dataclasses.dataclass(slots=True)
+class Cancel:
+    id: ClassVar = 8
+    index: int
+    begin: int
+    length: int
+
+    def encode(self):
+        return _BLOCK.pack(13, self.id, self.index, self.begin, self.length)
+
+
+@dataclasses.dataclass(slots=True)
+class Port:
+    """
+    The port of the DHT node of the peer
+    """
+    id: ClassVar = 9
+    port: int
+
+    def encode(self):
+        return _PORT.pack(3, self.id, self.port)
+
+
+@dataclasses.dataclass(slots=True)
+class Suggest:
+    """
+    Fast Extension (BEP 6): a piece the peer would rather upload, e.g. because it is in its cache
+    """
+    id: ClassVar = 13
+    index: int
+
+    def encode(self):
+        return _INDEX.pack(5, self.id, self.index)
+
+
+@dataclasses.dataclass(slots=True)
+class HaveAll:
+    """
+    Fast Extension (BEP 6): sent instead of the bitfield by a peer having every piece
+    """
+    id: ClassVar = 14
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class HaveNone:
+    """
+    Fast Extension (BEP 6): sent instead of the bitfield by a peer having no piece
+    """
+    id: ClassVar = 15
+
+    def encode(self):
+        return _HEADER.pack(1, self.id)
+
+
+@dataclasses.dataclass(slots=True)
+class Reject:
+    """
+    Fast Extension (BEP 6): a request the peer is not going to answer
+    """
+    id: ClassVar = 16
+    index: int
+    begin: int
+    length: int
+
+    def encode(self):
+        return _BLOCK.pack(13, self.id, self.index, self.begin, self.length)
+
+
+@dataclasses.dataclass(slots=True)
+class AllowedFast:
+    """
+    Fast Extension (BEP 6): a piece which may be requested even while the peer chokes us
+    """
+    id: ClassVar = 17
+    index: int
+
+    def encode(self):
+        return _INDEX.pack(5, self.id, self.index)
+
+
+@dataclasses.dataclass(slots=True)
+class Extended:
+    """
+    A message of the extension protocol (BEP 10), identified by its extended id
+    """
+    id: ClassVar = 20
+    extended_id: int
+    payload: bytes
+
+    def encode(self):
+        return _EXTENDED.pack(2 + len(self.payload), self.id, self.extended_id) + self.payload
+
+
+@dataclasses.dataclass(slots=True)
+class Unknown:
+    """
+    A message this client does not understand, kept so it can be reported
+    """
+    id: int
+    payload: bytes
+
+    def encode(self):
+        return _HEADER.pack(1 + len(self.payload), self.id) + self.payload
+
+
+# Messages without a payload are all alike, they are decoded to shared instances
+KEEP_ALIVE = KeepAlive()
+CHOKE = Choke()
+UNCHOKE = Unchoke()
+INTERESTED = Interested()
+NOT_INTERESTED = NotInterested()
+HAVE_ALL = HaveAll()
+HAVE_NONE = HaveNone()
+
+# Length of the messages with a fixed size, id included
+_FIXED_LENGTHS = {0: 1, 1: 1, 2: 1, 3: 1, 4: 5, 6: 13, 8: 13, 9: 3, 13: 5, 14: 1, 15: 1, 16: 13, 17: 5}
+
+_DECODERS = {
+    0: lambda message: CHOKE,
+    1: lambda message: UNCHOKE,
+    2: lambda message: INTERESTED,
+    3: lambda message: NOT_INTERESTED,
+    4: lambda message: Have(_INDEX_PAYLOAD.unpack_from(message, 1)[0]),
+    5: lambda message: Bitfield(message[1:]),
+    6: lambda message: Request(*_BLOCK_PAYLOAD.unpack_from(message, 1)),
+    7: lambda message: Piece(*_PIECE_PAYLOAD.unpack_from(message, 1), message[9:]),
+    8: lambda message: Cancel(*_BLOCK_PAYLOAD.unpack_from(message, 1)),
+    9: lambda message: Port(_PORT_PAYLOAD.unpack_from(message, 1)[0]),
+    13: lambda message: Suggest(_INDEX_PAYLOAD.unpack_from(message, 1)[0]),
+    14: lambda message: HAVE_ALL,
+    15: lambda message: HAVE_NONE,
+    16: lambda message: Reject(*_BLOCK_PAYLOAD.unpack_from(message, 1)),
+    17: lambda message: AllowedFast(_INDEX_PAYLOAD.unpack_from(message, 1)[0]),
+    20: lambda message: Extended(message[1], message[2:]),
+}
+
+
+def decode_message(message):
+    """
+    Decodes a message without its length prefix
+    :param message: The id and the payload of the message, a memoryview which the payload of the result may point into
+    :return: A message object
+    """
+    if not message:
+        return KEEP_ALIVE
+
+    message_id = message[0]
+
+    expected = _FIXED_LENGTHS.get(message_id)
+    if expected is not None and len(message) != expected:
+        raise TorrentException(f"Message {message_id} has {len(message)} bytes instead of {expected}")
+
+    decoder = _DECODERS.get(message_id)
+    if decoder is None:
+        return Unknown(message_id, message[1:])
+
+    try:
+        return decoder(message)
+    except struct.error:
+        raise TorrentException(f"Message {message_id} is too short")
+
+
+def decode_messages(view, start, end, max_length=MAX_MESSAGE_LENGTH):
+    """
+    Decodes every complete message of a receive buffer, in a single pass
+    :param view: A memoryview over the buffer, which the payloads of the messages point into
+    :param max_length: The longest message accepted, longer ones are refused before they are buffered
+    :return: A tuple with the list of messages, the position of the first byte not decoded and the number of bytes
+    needed from there to decode the next message
+    """
+    messages = []
+    unpack_length = _LENGTH.unpack_from
+
+    while end - start >= 4:
+        length, = unpack_length(view, start)
+        message_end = start + 4 + length
+
+        if length > max_length:
+            raise TorrentException(f"Message of {length} bytes is longer than {max_length}")
+
+        if message_end > end:
+            return messages, start, 4 + length
+
+        messages.append(decode_message(view[start + 4:message_end]))
+        start = message_end
+
+    return messages, start, 4
@@ -0,0 +1,62 @@
+import unittest
+
+from torrent import Messages
+from torrent.TorrentException import TorrentException
+
+
+class MessagesTest(unittest.TestCase):
+
+    def decode(self, data):
+        return Messages.decode_messages(memoryview(data), 0, len(data))
+
+    def test_roundtrip(self):
+        messages = [Messages.KEEP_ALIVE, Messages.CHOKE, Messages.UNCHOKE, Messages.INTERESTED,
+                    Messages.NOT_INTERESTED, Messages.Have(7), Messages.Bitfield(b"\xf0"),
+                    Messages.Request(1, 16384, 16384), Messages.Piece(2, 0, b"block"), Messages.Cancel(3, 0, 5),
+                    Messages.Port(6881), Messages.Suggest(4), Messages.HAVE_ALL, Messages.HAVE_NONE,
+                    Messages.Reject(5, 0, 16384), Messages.AllowedFast(6), Messages.Extended(0, b"d1:v3:abce"),
+                    Messages.Unknown(42, b"?")]
+
+        decoded, start, needed = self.decode(b"".join(message.encode() for message in messages))
+        self.assertEqual(decoded, messages)
+        self.assertEqual(needed, 4)
+
+    def test_wire_format(self):
+        self.assertEqual(Messages.Request(1, 2, 3).encode(), bytes.fromhex("0000000d06" "000000010000000200000003"))
+        self.assertEqual(Messages.Piece(1, 2, b"ab").encode(), bytes.fromhex("0000000b07" "0000000100000002") + b"ab")
+
+    def test_partial_message(self):
+        data = Messages.Have(1).encode() + Messages.Piece(0, 0, bytes(100)).encode()
+        messages, start, needed = self.decode(data[:20])
+
+        self.assertEqual(messages, [Messages.Have(1)])
+        self.assertEqual(start, 9)
+        self.assertEqual(needed, 4 + 109)
+
+        messages, start, needed = self.decode(data[:11])
+        self.assertEqual(start, 9)
+        self.assertEqual(needed, 4)
+
+    def test_payload_is_a_view(self):
+        data = bytearray(Messages.Piece(0, 0, b"block").encode())
+        piece, = self.decode(data)[0]
+        data[-5:] = b"other"
+        self.assertEqual(piece.block, b"other")
+
+    def test_wrong_length(self):
+        with self.assertRaises(TorrentException):
+            self.decode(b"\x00\x00\x00\x02\x04\x00")
+
+        with self.assertRaises(TorrentException):
+            self.decode(b"\x00\x00\x00\x05\x07\x00\x00\x00\x00")
+
+    def test_too_long(self):
+        with self.assertRaises(TorrentException):
+            self.decode(b"\xff\xff\xff\xf0\x07")
+
+        data = Messages.Bitfield(bytes(Messages.MAX_MESSAGE_LENGTH)).encode()
+        self.assertEqual(len(Messages.decode_messages(memoryview(data), 0, len(data), len(data) - 4)[0]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
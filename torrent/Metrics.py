@@ -0,0 +1,187 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class Histogram:
+    """
+    Counts observations in buckets by upper bound, as Prometheus histograms do. Observing is a bisection and an
+    increment, cheap enough for every piece.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self._bounds, value)] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        :return: A dictionary with the cumulative count of each bucket by upper bound, the sum and the count
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+
+        cumulative = 0
+        buckets = {}
+
+        for bound, count in zip(self._bounds + ("+Inf",), counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {"buckets": buckets, "sum": total, "count": cumulative}
+
+
+class JsonSink:
+    """
+    Writes the snapshot of every torrent to a JSON file, replaced as a whole at every report
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def write(self, snapshots):
+        _replace(self._path, json.dumps({"time": time.time(), "torrents": snapshots}, indent=2))
+
+
+class PrometheusSink:
+    """
+    Writes the snapshot of every torrent to a file in the Prometheus text format, e.g. for the textfile collector of
+    the node exporter
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def write(self, snapshots):
+        _replace(self._path, prometheus_text(snapshots))
+
+
+def _replace(path, text):
+    """
+    Writes the file next to its final path and renames it, so readers never see it half written
+    """
+    temporary = path + ".tmp"
+
+    with open(temporary, "w") as file:
+        file.write(text)
+
+    os.replace(temporary, path)
+
+
+# Snapshot entries exported as they are, with their Prometheus type and help
+_SCALARS = {
+    "downloaded": ("counter", "smtorrent_downloaded_bytes_total", "Bytes of blocks accepted from peers"),
+    "uploaded": ("counter", "smtorrent_uploaded_bytes_total", "Bytes of blocks sent to peers"),
+    "left": ("gauge", "smtorrent_left_bytes", "Bytes still to be downloaded"),
+    "download_rate": ("gauge", "smtorrent_download_rate_bytes", "Download rate since the previous snapshot"),
+    "upload_rate": ("gauge", "smtorrent_upload_rate_bytes", "Upload rate since the previous snapshot"),
+    "pieces_verified": ("counter", "smtorrent_pieces_verified_total", "Pieces verified during this run"),
+    "hash_failures": ("counter", "smtorrent_hash_failures_total", "Pieces failing verification"),
+    "pieces_waiting": ("gauge", "smtorrent_pieces_waiting", "Pieces waiting to be handed out to a peer"),
+    "pieces_downloading": ("gauge", "smtorrent_pieces_downloading", "Pieces being downloaded"),
+    "disk_queue": ("gauge", "smtorrent_disk_queue", "Pieces waiting to be verified and written"),
+    "peers_known": ("gauge", "smtorrent_peers_known", "Peers known from the tracker or connecting to us"),
+    "peers_connected": ("gauge", "smtorrent_peers_connected", "Peers with an open session"),
+}
+
+_HISTOGRAMS = {
+    "piece_latency": ("smtorrent_piece_latency_seconds", "Time from handing a piece out to its verification"),
+    "disk_write_latency": ("smtorrent_disk_write_latency_seconds", "Time taken to write a verified piece"),
+}
+
+# The bytes downloaded from a peer are kept across its connections, they only grow
+_PEER_VALUES = {
+    "rate": ("gauge", "smtorrent_peer_download_rate_bytes", "Download rate from the peer"),
+    "rtt": ("gauge", "smtorrent_peer_rtt_seconds", "Round trip of block requests to the peer"),
+    "downloaded": ("counter", "smtorrent_peer_downloaded_bytes_total", "Bytes accepted from the peer"),
+}
+
+
+def _label(value):
+    """
+    Escapes a label value as the text format requires: backslashes, double quotes and line feeds
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(snapshots):
+    """
+    Formats torrent snapshots in the Prometheus text exposition format, every sample labelled by torrent
+    """
+    lines = []
+
+    for key, (kind, name, description) in _SCALARS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{torrent="{_label(snapshot["name"])}"}} {snapshot[key]}' for snapshot in snapshots]
+
+    for key, (name, description) in _HISTOGRAMS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+
+        for snapshot in snapshots:
+            labels = f'torrent="{_label(snapshot["name"])}"'
+            histogram = snapshot[key]
+
+            lines += [f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                      for bound, count in histogram["buckets"].items()]
+            lines += [f"{name}_sum{{{labels}}} {histogram['sum']}", f"{name}_count{{{labels}}} {histogram['count']}"]
+
+    for key, (kind, name, description) in _PEER_VALUES.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{torrent="{_label(snapshot["name"])}",peer="{_label(peer["ip"])}:{peer["port"]}"}} '
+                  f'{peer[key]}' for snapshot in snapshots for peer in snapshot["peers"]]
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsReporter:
+    """
+    Takes a snapshot of every torrent each `interval` seconds and hands them to the sinks, from a thread of its own
+    """
+
+    def __init__(self, torrents, sinks, interval=10):
+        self._torrents = torrents
+        self._sinks = sinks
+        self._interval = interval
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops reporting, after a last report
+        """
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self):
+        snapshots = [torrent.metrics() for torrent in self._torrents]
+
+        for sink in self._sinks:
+            try:
+                sink.write(snapshots)
+            except OSError as e:
+                print(f"Metrics could not be written: {e}")
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.report()
+
+        self.report()
@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+
+from torrent.Metrics import Histogram, JsonSink, prometheus_text
+
+
+def snapshot():
+    histogram = Histogram((0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(2)
+
+    return {"name": "test", "downloaded": 10, "uploaded": 0, "left": 5, "download_rate": 1.5, "upload_rate": 0.0,
+            "pieces_verified": 1, "hash_failures": 0, "pieces_waiting": 2, "pieces_downloading": 1, "disk_queue": 0,
+            "peers_known": 3, "peers_connected": 1, "piece_latency": histogram.snapshot(),
+            "disk_write_latency": Histogram().snapshot(),
+            "peers": [{"ip": "10.0.0.1", "port": 6881, "rate": 1.5, "rtt": 0.2, "downloaded": 10}]}
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_cumulative_buckets(self):
+        self.assertEqual(snapshot()["piece_latency"], {"buckets": {"0.1": 1, "1": 2, "+Inf": 3}, "sum": 2.55,
+                                                       "count": 3})
+
+
+class SinkTest(unittest.TestCase):
+
+    def test_prometheus_text(self):
+        text = prometheus_text([snapshot()])
+        self.assertIn('smtorrent_downloaded_bytes_total{torrent="test"} 10\n', text)
+        self.assertIn('smtorrent_piece_latency_seconds_bucket{torrent="test",le="+Inf"} 3\n', text)
+        self.assertIn('smtorrent_piece_latency_seconds_count{torrent="test"} 3\n', text)
+        self.assertIn('smtorrent_peer_download_rate_bytes{torrent="test",peer="10.0.0.1:6881"} 1.5\n', text)
+        self.assertIn("# TYPE smtorrent_hash_failures_total counter\n", text)
+        self.assertIn("# TYPE smtorrent_peer_downloaded_bytes_total counter\n", text)
+
+    def test_prometheus_label_escaping(self):
+        torrent = dict(snapshot(), name='a "b"\\c\nd')
+        text = prometheus_text([torrent])
+        self.assertIn('smtorrent_left_bytes{torrent="a \\"b\\"\\\\c\\nd"} 5\n', text)
+        self.assertEqual(len(text.splitlines()), len(prometheus_text([snapshot()]).splitlines()))
+
+    def test_json_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            JsonSink(path).write([snapshot()])
+
+            with open(path) as file:
+                self.assertEqual(json.load(file)["torrents"][0]["peers_known"], 3)
+
+            self.assertEqual(os.listdir(directory), ["metrics.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
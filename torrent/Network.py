@@ -1,11 +1,43 @@
 
 import socket
 
+from torrent import Messages
+
+# Most buffers given to a single sendmsg call, below the IOV_MAX of common systems
+MAX_SEND_BUFFERS = 512
+
+# Kernel buffer sizes of peer connections, enough for a full pipeline of blocks in either direction
+SOCKET_BUFFER_SIZE = 2**20
+
+
 class Network:
+    """
+    Sends and receives length-prefixed messages. Received bytes go straight into a preallocated buffer with
+    recv_into and messages are handed out as memoryviews over it, so they are only valid until the next receive.
+
+    Messages to send are queued and flushed together, with vectored writes: the requests, haves and uploaded blocks
+    of a round go out in as few system calls as the socket allows, and blocks are never copied into a send buffer.
+    """
+
+    def __init__(self, buffer_size=2**17, download=None, upload=None, trace=None) -> None:
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+
+        # Rate limiters, charged once per socket call
+        self._download = download
+        self._upload = upload
+
+        # Called as trace(event, bytes=n) after every socket call, when tracing
+        self._trace = trace
 
-    def __init__(self) -> None:
-        self.data = b""
+        # Received but not yet consumed data lives in [_start, _end)
+        self._start = 0
+        self._end = 0
 
+        # Buffers queued to be sent, in order
+        self._outgoing = []
+
+    @staticmethod
     def get_socket(ip_address):
         # Determine if the IP address is IPv4 or IPv6
         try:
@@ -20,33 +52,130 @@ class Network:
 
         return socket.socket(family, socket.SOCK_STREAM)
 
+    @staticmethod
+    def configure_socket(conn):
+        """
+        Sets the options of a peer connection. Small messages are coalesced before being sent, so Nagle's algorithm
+        only delays them
+        """
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+    def queue(self, data):
+        """
+        Queues data to be sent with the next flush. The data is not copied, it must not change until then
+        """
+        if data:
+            self._outgoing.append(data)
+
+    def flush(self, conn):
+        """
+        Sends everything queued
+        """
+        buffers = self._outgoing
+        sendmsg = getattr(conn, "sendmsg", None)
+
+        while buffers:
+            # Without sendmsg (e.g. on Windows) buffers are sent one at a time
+            sent = sendmsg(buffers[:MAX_SEND_BUFFERS]) if sendmsg is not None else conn.send(buffers[0])
+
+            if self._upload is not None:
+                self._upload.throttle(sent)
+
+            if self._trace is not None:
+                self._trace("send", bytes=sent)
+
+            # Drop the buffers sent, the rest of a buffer sent in part is a view over it
+            done = 0
+            while done < len(buffers) and sent >= len(buffers[done]):
+                sent -= len(buffers[done])
+                done += 1
+
+            del buffers[:done]
+            if sent:
+                buffers[0] = memoryview(buffers[0])[sent:]
+
     def send_data(self, conn, data):
+        self.queue(data)
+        self.flush(conn)
 
-        bytes_to_send = len(data)
-        sent = 0
+    def _fill(self, conn, needed):
+        """
+        Receives until at least `needed` bytes are buffered
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
 
-        while sent < bytes_to_send:
-            sent += conn.send(data[sent:])
+        while self._end - self._start < needed:
 
-    def receive_data(self, conn):
+            if len(self._buffer) - self._start < needed:
+                self._make_room(needed)
+
+            received = conn.recv_into(self._view[self._end:])
+
+            # A long-lived connection has to notice when the peer goes away
+            if received == 0:
+                raise ConnectionError("Peer closed the connection")
+
+            self._end += received
+
+            if self._download is not None:
+                self._download.throttle(received)
+
+            if self._trace is not None:
+                self._trace("recv", bytes=received)
+
+    def _make_room(self, needed):
+        buffered = self._end - self._start
 
-        while len(self.data) < 4:
-            self.data += conn.recv(2**14)
-        
-        size = int.from_bytes(self.data[:4], byteorder='big')
+        if needed > len(self._buffer):
+            # Messages handed out earlier keep pointing at the old buffer
+            self._buffer = bytearray(max(needed, 2 * len(self._buffer)))
+            old_view, self._view = self._view, memoryview(self._buffer)
+            self._view[:buffered] = old_view[self._start:self._end]
+        else:
+            # Compact the unread data to the front
+            self._view[:buffered] = self._view[self._start:self._end]
 
-        while len(self.data) < size:
-            self.data += conn.recv(2**14)
-        
-        message = self.data[:4 + size]
-        self.data = self.data[4 + size:]
+        self._start = 0
+        self._end = buffered
+
+    def _consume(self, length):
+        message = self._view[self._start:self._start + length]
+        self._start += length
         return message
 
-    def receive_data_with_length(self, conn, length):
+    def receive_data(self, conn):
+        """
+        Receives a single message, including its 4 byte length prefix
+        :return: A memoryview over the message, valid until the next receive
+        """
+        self._fill(conn, 4)
+        size = int.from_bytes(self._view[self._start:self._start + 4], byteorder='big')
+
+        self._fill(conn, 4 + size)
+        return self._consume(4 + size)
 
-        while len(self.data) < length:
-            self.data += conn.recv(2**14)
-        
-        message = self.data[:length]
-        self.data = self.data[length:]
-        return message
\ No newline at end of file
+    def receive_messages(self, conn, max_length=Messages.MAX_MESSAGE_LENGTH):
+        """
+        Receives at least one message, decoding every complete message buffered in a single pass
+        :param max_length: The longest message accepted, the buffer never grows past it
+        :return: A list of message objects, whose payloads are views valid until the next receive
+        """
+        needed = 4
+
+        while True:
+            self._fill(conn, needed)
+            messages, self._start, needed = Messages.decode_messages(self._view, self._start, self._end, max_length)
+
+            if messages:
+                return messages
+
+    def receive_data_with_length(self, conn, length):
+        """
+        Receives exactly `length` bytes
+        :return: A memoryview over the data, valid until the next receive
+        """
+        self._fill(conn, length)
+        return self._consume(length)
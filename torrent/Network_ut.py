@@ -0,0 +1,91 @@
+import socket
+import unittest
+
+from torrent.Network import Network
+from torrent.TorrentException import TorrentException
+
+
+class NetworkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair()
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_receive_message(self):
+        self.sender.sendall(b"\x00\x00\x00\x01\x02")
+        message = Network().receive_data(self.receiver)
+        self.assertIsInstance(message, memoryview)
+        self.assertEqual(message, b"\x00\x00\x00\x01\x02")
+
+    def test_receive_several_messages_from_one_chunk(self):
+        self.sender.sendall(b"\x00\x00\x00\x01\x01" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x02\x04\x07")
+        network = Network()
+        self.assertEqual(network.receive_data(self.receiver), b"\x00\x00\x00\x01\x01")
+        self.assertEqual(network.receive_data(self.receiver), b"\x00\x00\x00\x00")
+        self.assertEqual(network.receive_data(self.receiver), b"\x00\x00\x00\x02\x04\x07")
+
+    def test_receive_with_length(self):
+        self.sender.sendall(b"handshake" + b"\x00\x00\x00\x00")
+        network = Network()
+        self.assertEqual(network.receive_data_with_length(self.receiver, 9), b"handshake")
+        self.assertEqual(network.receive_data(self.receiver), b"\x00\x00\x00\x00")
+
+    def test_message_too_long(self):
+        self.sender.sendall(b"\xff\xff\xff\xff\x07")
+        network = Network(buffer_size=16)
+
+        with self.assertRaises(TorrentException):
+            network.receive_messages(self.receiver)
+
+    def test_compaction(self):
+        network = Network(buffer_size=16)
+        for i in range(10):
+            self.sender.sendall(b"\x00\x00\x00\x05" + bytes([i] * 5))
+            self.assertEqual(network.receive_data(self.receiver), b"\x00\x00\x00\x05" + bytes([i] * 5))
+
+    def test_message_larger_than_buffer(self):
+        payload = bytes(range(256)) * 4
+        self.sender.sendall(len(payload).to_bytes(4, "big") + payload)
+        network = Network(buffer_size=16)
+        self.assertEqual(network.receive_data(self.receiver)[4:], payload)
+
+    def test_flush_queued_buffers(self):
+        network = Network()
+        network.queue(b"\x00\x00\x00\x01\x02")
+        network.queue(b"")
+        network.queue(memoryview(b"\x00\x00\x00\x02\x04\x07"))
+        network.flush(self.sender)
+        self.assertEqual(self.receiver.recv(64), b"\x00\x00\x00\x01\x02\x00\x00\x00\x02\x04\x07")
+
+    def test_flush_partial_sends(self):
+        class Trickle:
+            """
+            Accepts at most 3 bytes per call
+            """
+            def __init__(self):
+                self.received = bytearray()
+
+            def sendmsg(self, buffers):
+                sent = b"".join(buffers)[:3]
+                self.received += sent
+                return len(sent)
+
+        conn = Trickle()
+        network = Network()
+        for data in (b"abcd", b"e", b"fghij"):
+            network.queue(data)
+
+        network.flush(conn)
+        self.assertEqual(conn.received, b"abcdefghij")
+
+    def test_closed_connection(self):
+        self.sender.close()
+        with self.assertRaises(ConnectionError):
+            Network().receive_data(self.receiver)
+
+
+if __name__ == "__main__":
+    unittest.main()
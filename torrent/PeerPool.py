@@ -0,0 +1,177 @@
+import dataclasses
+import threading
+import time
+
+# Seconds to wait before connecting again to a peer that failed, doubled at each consecutive failure
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 30 * 60
+
+# Pieces failing verification before the peer that sent them is banned
+BAN_HASH_FAILURES = 3
+
+
+@dataclasses.dataclass(slots=True)
+class PeerStatistics:
+    """
+    What we know about a peer, kept across connections. Rates and round trips are those of the last connection
+    """
+    ip: str
+    port: int
+    downloaded: int = 0
+    rate: float = 0.0
+    rtt: float = 0.0
+    failures: int = 0
+    hash_failures: int = 0
+    snubbed: bool = False
+    banned: bool = False
+    connected: bool = False
+    retry_at: float = 0.0
+
+    # The peer connected to us, from a port nobody listens on
+    inbound: bool = False
+
+    def score(self):
+        """
+        :return: A sort key, the best peers first: not snubbed, fastest, with the fewest failures
+        """
+        return self.snubbed, -self.rate, self.failures + self.hash_failures
+
+
+class PeerPool:
+    """
+    The peers known for a torrent, with their statistics. Peers are handed out for connection best first, so the
+    download converges on the fast part of the swarm: a peer that failed is retried later and later, a peer that
+    snubbed us goes to the back of the line and a peer that keeps sending corrupt data is banned, by address.
+
+    Peers connecting to us are known by the source port of their connection. They are never handed out for
+    connection and are forgotten once their connection ends, their bans are kept.
+    """
+
+    def __init__(self):
+        self._peers = {}
+        self._banned = set()
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def __len__(self):
+        return len(self._peers)
+
+    def add(self, peers):
+        """
+        Adds the peers returned by a tracker. Peers already known keep their statistics, those which connected to us
+        are kept from now on
+        """
+        with self._lock:
+            for peer in peers:
+                self._get(peer).inbound = False
+
+            self._changed.notify_all()
+
+    def statistics(self, peer=None):
+        """
+        :return: The statistics of a peer, created if it is not known yet (e.g. a peer connecting to us), or a list
+        with the statistics of every peer
+        """
+        with self._lock:
+            if peer is None:
+                return list(self._peers.values())
+
+            return self._get(peer)
+
+    def connected(self, peer, inbound=False):
+        """
+        A session to the peer starts
+        :param inbound: The peer connected to us, unless it was known already it is only kept while connected
+        :return: The statistics of the peer
+        """
+        with self._lock:
+            known = (peer["ip"], peer["port"]) in self._peers
+
+            stats = self._get(peer)
+            stats.connected = True
+
+            if inbound and not known:
+                stats.inbound = True
+
+            return stats
+
+    def take(self, timeout=None):
+        """
+        Picks the best peer to connect to, waiting for one to be available
+        :return: The peer, as returned by the tracker, or None if none was available in time
+        """
+        with self._lock:
+            stats = self._changed.wait_for(self._best, timeout)
+
+            if not stats:
+                return None
+
+            stats.connected = True
+            return {"ip": stats.ip, "port": stats.port}
+
+    def release(self, peer, failed=False):
+        """
+        The connection to the peer ended. Peers which failed are retried after a delay growing with each failure,
+        peers which connected to us are forgotten
+        """
+        with self._lock:
+            stats = self._get(peer)
+            stats.connected = False
+
+            if stats.inbound:
+                del self._peers[(stats.ip, stats.port)]
+
+            elif failed:
+                stats.failures += 1
+                stats.retry_at = time.monotonic() + min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (stats.failures - 1))
+            else:
+                stats.failures = 0
+
+            self._changed.notify_all()
+
+    def snubbed(self, peer):
+        """
+        The peer stopped sending the blocks we asked for
+        """
+        with self._lock:
+            self._get(peer).snubbed = True
+
+    def hash_failed(self, peer):
+        """
+        The peer sent a piece failing verification
+        :return: True if the peer got banned
+        """
+        with self._lock:
+            stats = self._get(peer)
+            stats.hash_failures += 1
+
+            if stats.hash_failures >= BAN_HASH_FAILURES:
+                self._banned.add(stats.ip)
+
+                # Every port of the address is banned
+                for other in self._peers.values():
+                    if other.ip == stats.ip:
+                        other.banned = True
+
+            return stats.banned
+
+    def is_banned(self, ip):
+        return ip in self._banned
+
+    def _get(self, peer):
+        key = (peer["ip"], peer["port"])
+
+        stats = self._peers.get(key)
+        if stats is None:
+            stats = self._peers[key] = PeerStatistics(ip=peer["ip"], port=peer["port"],
+                                                       banned=peer["ip"] in self._banned)
+
+        return stats
+
+    def _best(self):
+        now = time.monotonic()
+        candidates = [stats for stats in self._peers.values()
+                      if not stats.connected and not stats.inbound and not stats.banned and stats.retry_at <= now]
+
+        return min(candidates, key=PeerStatistics.score, default=None)
@@ -0,0 +1,87 @@
+import unittest
+
+from torrent.PeerPool import PeerPool, BAN_HASH_FAILURES
+
+
+class PeerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = PeerPool()
+        self.slow, self.fast = {"ip": "10.0.0.1", "port": 1}, {"ip": "10.0.0.2", "port": 2}
+        self.pool.add([self.slow, self.fast])
+
+    def test_fastest_first(self):
+        self.pool.statistics(self.slow).rate = 10.0
+        self.pool.statistics(self.fast).rate = 1000.0
+        self.assertEqual(self.pool.take(0), self.fast)
+        self.assertEqual(self.pool.take(0), self.slow)
+        self.assertIsNone(self.pool.take(0))
+
+    def test_snubbed_last(self):
+        self.pool.statistics(self.fast).rate = 1000.0
+        self.pool.snubbed(self.fast)
+        self.assertEqual(self.pool.take(0), self.slow)
+
+    def test_failed_peer_retried_later(self):
+        self.pool.take(0)
+        self.pool.take(0)
+        self.pool.release(self.slow, failed=True)
+        self.pool.release(self.fast)
+        self.assertEqual(self.pool.take(0), self.fast)
+        self.assertIsNone(self.pool.take(0))
+        self.assertEqual(self.pool.statistics(self.slow).failures, 1)
+
+    def test_ban_after_hash_failures(self):
+        other_port = {"ip": "10.0.0.1", "port": 3}
+        self.pool.add([other_port])
+
+        for _ in range(BAN_HASH_FAILURES - 1):
+            self.assertFalse(self.pool.hash_failed(self.slow))
+
+        self.assertTrue(self.pool.hash_failed(self.slow))
+        self.assertTrue(self.pool.is_banned("10.0.0.1"))
+        self.assertTrue(self.pool.statistics(other_port).banned)
+        self.assertEqual(self.pool.take(0), self.fast)
+        self.assertIsNone(self.pool.take(0))
+
+    def test_inbound_peer_never_taken(self):
+        self.pool.take(0)
+        self.pool.take(0)
+
+        # Known by the source port of its connection, nobody listens there
+        inbound = {"ip": "10.0.0.3", "port": 50000}
+        self.assertTrue(self.pool.connected(inbound, inbound=True).inbound)
+        self.assertEqual(len(self.pool), 3)
+
+        self.pool.release(inbound)
+        self.assertEqual(len(self.pool), 2)
+        self.assertIsNone(self.pool.take(0))
+
+    def test_known_peer_connecting_to_us_is_kept(self):
+        self.pool.take(0)
+        self.pool.take(0)
+        self.pool.connected(self.slow, inbound=True)
+        self.pool.release(self.slow)
+        self.assertEqual(self.pool.take(0), self.slow)
+
+        # Reported by the tracker while connected to us
+        inbound = {"ip": "10.0.0.3", "port": 50000}
+        self.pool.connected(inbound, inbound=True)
+        self.pool.add([inbound])
+        self.pool.release(inbound)
+        self.assertEqual(self.pool.take(0), inbound)
+
+    def test_inbound_peer_banned_by_address(self):
+        inbound = {"ip": "10.0.0.3", "port": 50000}
+        self.pool.connected(inbound, inbound=True)
+
+        for _ in range(BAN_HASH_FAILURES):
+            self.pool.hash_failed(inbound)
+        self.pool.release(inbound)
+
+        # Reconnecting from another port does not lift the ban
+        self.assertTrue(self.pool.is_banned("10.0.0.3"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,502 @@
+from collections import deque
+
+from torrent import Connection, Messages
+from torrent.Bitfield import Bitfield
+from torrent.Pipeline import RequestPipeline, BLOCK_SIZE
+from torrent.TorrentException import TorrentException
+
+# Largest block a peer may request, and the most requests queued for a peer before they are dropped
+MAX_REQUEST_LENGTH = Messages.MAX_BLOCK_LENGTH
+MAX_QUEUED_REQUESTS = 256
+
+# Seconds without any message while requests are in flight before the peer is considered to be snubbing us
+SNUB_TIMEOUT = 60
+
+# Returned by handlers of messages completing no piece
+_NOTHING = ()
+
+
+class PeerProtocol:
+    """
+    The download state of a connection to a single peer, independent of how the bytes are moved. It decides which
+    blocks to request and interprets the messages received from the peer, leaving the socket handling to the
+    threaded PeerSession and to the asyncio engine.
+
+    The other direction is handled too: the peer is unchoked while it is interested and the choker of the torrent
+    gives it an upload slot, and its requests are answered with blocks of the pieces we have.
+
+    When both sides support the Fast Extension (BEP 6), requests which are not going to be answered are rejected
+    instead of being dropped silently: the pieces of rejected requests are handed back to the torrent at once rather
+    than after the snub timeout, and the pieces the peer allows while choking us are still downloaded.
+    """
+
+    def __init__(self, torrent, peer, pipeline_size=5, adaptive_pipeline=True, inbound=False):
+        self._torrent = torrent
+        self._peer = peer
+        self._choked = True
+
+        # Kept by the torrent across connections to the peer, updated as blocks arrive
+        self._statistics = torrent.peers.connected(peer, inbound)
+
+        # Pieces the peer has, as announced by its bitfield and have messages
+        self._bitfield = Bitfield(torrent.piece_count())
+
+        # Pieces being downloaded from this peer and the blocks still to be requested
+        self._pipeline = RequestPipeline(size=pipeline_size, adaptive=adaptive_pipeline)
+        self._pieces = {}
+        self._pending_blocks = deque()
+
+        # Blocks received from other peers in endgame mode, whose requests have to be cancelled
+        self._cancels = deque()
+
+        # Requests in flight count against the limit shared by every torrent of the session
+        self._requests_held = 0
+
+        # Fast Extension state: the pieces which may be requested while choked, and whether pieces were handed back
+        self._handlers = self._HANDLERS
+        self._fast = False
+        self._allowed_fast = set()
+        self._returned_work = False
+
+        # Upload state: the peer is choked until it is interested and the choker gives it an upload slot
+        self._am_choking = True
+        self._peer_interested = False
+        self._peer_requests = deque()
+        self._rejects = deque()
+        self._haves_sent = 0
+
+    @property
+    def peer(self):
+        return self._peer
+
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    @property
+    def choked(self):
+        return self._choked
+
+    @property
+    def bitfield(self):
+        return self._bitfield
+
+    @property
+    def max_message_length(self):
+        """
+        The longest message the peer may send: a block as large as may be requested, or our bitfield
+        """
+        return max(Messages.MAX_MESSAGE_LENGTH, 1 + -(-len(self._bitfield) // 8))
+
+    def has_work(self):
+        return bool(self._pieces)
+
+    def take_returned_work(self):
+        """
+        :return: True if pieces were handed back to the torrent since the last call, for other peers to download
+        """
+        returned, self._returned_work = self._returned_work, False
+        return returned
+
+    def negotiate(self, reserved):
+        """
+        Enables the extensions both sides support, from the reserved bytes of the handshake of the peer
+        """
+        self._fast = Connection.supports_fast_extension(reserved)
+
+        if self._fast:
+            self._handlers = {**self._HANDLERS, **self._FAST_HANDLERS}
+
+    def waiting_for_blocks(self):
+        """
+        Requests are in flight, so the peer is going to send something. Otherwise the session may be idle: choked,
+        without pieces to download or out of request slots
+        """
+        return len(self._pipeline) > 0
+
+    def is_pointless(self):
+        """
+        Neither side has anything left to give the other, both have every piece
+        """
+        return self._torrent.is_complete() and self._bitfield.is_complete()
+
+    def timed_out(self):
+        """
+        Nothing arrived for SNUB_TIMEOUT seconds although blocks were requested: the peer is snubbing us, and the
+        pieces it was sending are better downloaded from someone else
+        """
+        self._torrent.peers.snubbed(self._peer)
+        raise TorrentException(f"Peer sent nothing for {SNUB_TIMEOUT}s, snubbed")
+
+    def cancel(self, index, begin, length):
+        """
+        Asks for a request to be cancelled. It may be called from other sessions, so the cancel message is only built
+        with the next requests
+        """
+        self._cancels.append((index, begin, length))
+
+    def close(self):
+        """
+        Gives the pieces being downloaded back to the torrent, so someone else can download them, and withdraws the
+        pieces of this peer from the swarm availability
+        """
+        self._torrent.picker.remove_peer(self._bitfield)
+        self._bitfield = Bitfield(len(self._bitfield))
+
+        for downloading in self._pieces.values():
+            self._torrent.stop_piece(downloading, self)
+
+        self._pieces.clear()
+        self._pending_blocks.clear()
+        self._pipeline.clear()
+        self._release_requests()
+
+        self._am_choking = True
+        self._torrent.choker.not_interested(self)
+
+        self._peer_requests.clear()
+        self._rejects.clear()
+
+    def build_greeting(self):
+        """
+        :return: The messages sent once the handshake is done: the pieces we have and whether we want any of theirs
+        """
+        bitfield, self._haves_sent = self._torrent.bitfield()
+        messages = bytearray()
+        count = bitfield.count()
+
+        if self._fast and count in (0, len(bitfield)):
+            messages += (Messages.HAVE_NONE if count == 0 else Messages.HAVE_ALL).encode()
+
+        elif count:
+            messages += Messages.Bitfield(bitfield.to_bytes()).encode()
+
+        if not self._torrent.is_complete():
+            messages += Messages.INTERESTED.encode()
+
+        return messages
+
+    def build_requests(self):
+        """
+        Cancels the requests for blocks other peers sent first and requests blocks until the pipeline window is full
+        :return: All the messages to be sent, at once
+        """
+        requests = bytearray()
+
+        while self._cancels:
+            index, begin, length = self._cancels.popleft()
+            if self._pipeline.remove(index, begin) is not None:
+                requests += Messages.Cancel(index, begin, length).encode()
+
+        # Pieces completed by other peers are left behind
+        for index, downloading in list(self._pieces.items()):
+            if downloading.is_complete():
+                del self._pieces[index]
+                downloading.leave(self)
+
+        # Slots are still held for the requests answered since the last call, they count against the window. While
+        # choked, only the allowed fast pieces are requested
+        free_slots = max(0, self._pipeline.window - self._requests_held) \
+            if not self._choked or self._allowed_fast else 0
+        self._requests_held += self._torrent.limits.requests.try_acquire(self._torrent, free_slots)
+
+        while len(self._pipeline) < self._requests_held:
+
+            block = self._next_block()
+            if block is None:
+                break
+
+            begin = block.block_id * BLOCK_SIZE
+            self._pieces[block.piece_id].requested(self, begin)
+            self._pipeline.add(block.piece_id, begin, block)
+            requests += Messages.Request(block.piece_id, begin, block.block_size).encode()
+
+        self._release_requests()
+        return requests
+
+    def build_uploads(self):
+        """
+        Announces the pieces verified since the last call, chokes or unchokes the peer and answers its requests
+        :return: A list with the buffers of all the messages to be sent, in order. Blocks are views over the pieces
+        read, they are not copied
+        """
+        messages = bytearray()
+        buffers = [messages]
+
+        verified = self._torrent.verified_since(self._haves_sent)
+        self._haves_sent += len(verified)
+        for index in verified:
+            messages += Messages.Have(index).encode()
+
+        unchoked = self._peer_interested and self._torrent.choker.is_unchoked(self)
+        if self._am_choking and unchoked:
+            self._am_choking = False
+            messages += Messages.UNCHOKE.encode()
+
+        elif not self._am_choking and not unchoked:
+            self._choke()
+            messages += Messages.CHOKE.encode()
+
+        while self._rejects:
+            messages += Messages.Reject(*self._rejects.popleft()).encode()
+
+        while self._peer_requests:
+            index, begin, length = self._peer_requests.popleft()
+            block = self._torrent.read_block(index, begin, length)
+            buffers += [Messages.Piece(index, begin, block).header(), block]
+
+        return buffers
+
+    def handle_message(self, message):
+        """
+        Updates the state of the connection with a message received from the peer
+        :param message: A message object, as decoded by Messages
+        :return: The (piece, PieceBuffer) pairs completed by this message
+        """
+        if self._statistics.banned:
+            raise TorrentException("Peer is banned for sending corrupt data")
+
+        return self._handlers.get(type(message), PeerProtocol._unknown_received)(self, message) or _NOTHING
+
+    def _choke_received(self, message):
+        self._choked = True
+
+        if not self._fast:
+            # Requests are discarded by the peer when it chokes us, they will be sent again once unchoked. Their
+            # slots are given back, the window is filled again from scratch then
+            self._pending_blocks.extendleft(reversed(self._pipeline.clear()))
+            self._release_requests()
+            return
+
+        # The peer rejects the requests it is not going to answer. Only the allowed fast pieces can still be
+        # downloaded from it, the others are better downloaded from someone else
+        for index, downloading in list(self._pieces.items()):
+            if index not in self._allowed_fast:
+                self._give_back(downloading)
+
+    def _unchoke_received(self, message):
+        self._choked = False
+
+    def _interested_received(self, message):
+        self._peer_interested = True
+        self._torrent.choker.interested(self)
+
+    def _not_interested_received(self, message):
+        self._peer_interested = False
+        self._torrent.choker.not_interested(self)
+
+    def _cancel_received(self, message):
+        request = (message.index, message.begin, message.length)
+        if request in self._peer_requests:
+            self._peer_requests.remove(request)
+
+            # With the Fast Extension, every request gets an answer
+            if self._fast:
+                self._rejects.append(request)
+
+    def _have_all_received(self, message):
+        self._set_bitfield(Bitfield(len(self._bitfield)).complement())
+
+    def _have_none_received(self, message):
+        self._set_bitfield(Bitfield(len(self._bitfield)))
+
+    def _allowed_fast_received(self, message):
+        if message.index < len(self._bitfield):
+            self._allowed_fast.add(message.index)
+
+    def _reject_received(self, message):
+        block = self._pipeline.remove(message.index, message.begin)
+        downloading = self._pieces.get(message.index)
+
+        if block is None or downloading is None:
+            return
+
+        if self._choked:
+            # The piece is no longer allowed fast
+            self._allowed_fast.discard(message.index)
+            self._give_back(downloading)
+        else:
+            # The peer may have had too many requests queued, the block is asked for again
+            self._pending_blocks.appendleft(block)
+
+    def _give_back(self, downloading):
+        """
+        Stops working on a piece, so other peers can download it. Its requests still in flight are rejected or
+        answered by the peer, answered blocks are dropped
+        """
+        del self._pieces[downloading.piece_id]
+        self._torrent.stop_piece(downloading, self)
+        self._returned_work = True
+
+    def _ignored(self, message):
+        # Keep-alives, and messages of the extensions we do not support
+        pass
+
+    def _unknown_received(self, message):
+        print(f"Unknown message {message.id} received")
+
+    def _choke(self):
+        self._am_choking = True
+
+        # With the Fast Extension, the requests dropped are rejected
+        if self._fast:
+            self._rejects.extend(self._peer_requests)
+
+        self._peer_requests.clear()
+
+    def _request_received(self, message):
+        index, begin, length = message.index, message.begin, message.length
+
+        if index >= len(self._bitfield) or length > MAX_REQUEST_LENGTH \
+                or begin + length > self._torrent.piece_size(index):
+            raise TorrentException(f"Peer requested {length} bytes at {begin} of piece {index}, which does not exist")
+
+        # Requests sent while choked or for pieces we do not have are not answered
+        if self._am_choking or not self._torrent.has_piece(index) or len(self._peer_requests) >= MAX_QUEUED_REQUESTS:
+            if self._fast:
+                self._rejects.append((index, begin, length))
+            return
+
+        self._peer_requests.append((index, begin, length))
+
+    def _release_requests(self):
+        """
+        Gives back the request slots no longer backing a request in flight
+        """
+        unused = self._requests_held - len(self._pipeline)
+        self._torrent.limits.requests.release(self._torrent, unused)
+        self._requests_held -= unused
+
+    def _next_block(self):
+        # While choked, only blocks of the allowed fast pieces the peer has are requested, the others wait for the
+        # peer to unchoke us
+        pieces = {index for index in self._allowed_fast if index in self._bitfield} if self._choked else None
+        if pieces is not None and not pieces:
+            return None
+
+        while True:
+            block = self._pop_pending_block(pieces)
+
+            if block is None:
+                downloading = self._torrent.start_piece(self, pieces)
+                if downloading is None:
+                    return None
+
+                self._pieces[downloading.piece_id] = downloading
+                self._pending_blocks.extend(downloading.missing_blocks())
+                continue
+
+            downloading = self._pieces.get(block.piece_id)
+
+            # Skip the blocks other peers already sent
+            if downloading is not None and not downloading.has_block(block.block_id * BLOCK_SIZE):
+                return block
+
+    def _pop_pending_block(self, pieces):
+        """
+        :param pieces: The pieces the block may belong to, any when None
+        :return: The first block still to be requested of one of the pieces, or None
+        """
+        if pieces is None:
+            return self._pending_blocks.popleft() if self._pending_blocks else None
+
+        for position, block in enumerate(self._pending_blocks):
+            if block.piece_id in pieces:
+                del self._pending_blocks[position]
+                return block
+
+        return None
+
+    def _have_received(self, message):
+        index = message.index
+
+        if index >= len(self._bitfield):
+            raise TorrentException(f"Peer announced piece {index}, which does not exist")
+
+        if index not in self._bitfield:
+            self._bitfield.add(index)
+            self._torrent.picker.peer_has(index)
+
+    def _bitfield_received(self, message):
+        try:
+            bitfield = Bitfield.from_bytes(len(self._bitfield), message.bitfield)
+        except ValueError as e:
+            raise TorrentException(f"Peer sent an invalid bitfield: {e}")
+
+        self._set_bitfield(bitfield)
+
+    def _set_bitfield(self, bitfield):
+        # Replaces whatever the peer announced before
+        self._torrent.picker.remove_peer(self._bitfield)
+        self._torrent.picker.add_peer(bitfield)
+        self._bitfield = bitfield
+
+    def _block_received(self, message):
+        index, begin, data = message.index, message.begin, message.block
+        block = self._pipeline.complete(index, begin, len(data))
+
+        # Blocks we did not ask for (or no longer wait for) are dropped
+        if block is None:
+            return _NOTHING
+
+        if len(data) != block.block_size:
+            raise TorrentException(f"Peer sent {len(data)} bytes for a block of {block.block_size}")
+
+        downloading = self._pieces.get(index)
+        if downloading is None:
+            return _NOTHING
+
+        # The received data is a view over the network buffer, it is copied into the piece before the next receive
+        accepted, others, completed = downloading.receive(self, begin, data)
+        if not accepted:
+            return _NOTHING
+
+        self._torrent.block_received(len(data))
+
+        statistics = self._statistics
+        statistics.downloaded += len(data)
+        statistics.rate = self._pipeline.rate
+        statistics.rtt = self._pipeline.rtt
+        statistics.snubbed = False
+
+        # In endgame mode, the other peers asked for this block are told not to bother
+        for other in others:
+            other.cancel(index, begin, len(data))
+
+        if not completed:
+            return _NOTHING
+
+        del self._pieces[index]
+        downloading.leave(self)
+
+        return [(downloading.piece, downloading.buffer)]
+
+    # Handlers of the messages received, by message type
+    _HANDLERS = {
+        Messages.KeepAlive: _ignored,
+        Messages.Choke: _choke_received,
+        Messages.Unchoke: _unchoke_received,
+        Messages.Interested: _interested_received,
+        Messages.NotInterested: _not_interested_received,
+        Messages.Have: _have_received,
+        Messages.Bitfield: _bitfield_received,
+        Messages.Request: _request_received,
+        Messages.Piece: _block_received,
+        Messages.Cancel: _cancel_received,
+        Messages.Port: _ignored,
+        Messages.Extended: _ignored,
+    }
+
+    # Handlers of the messages of the Fast Extension, once negotiated. Suggestions are only a hint, the rarest pieces
+    # are still picked first
+    _FAST_HANDLERS = {
+        Messages.Suggest: _ignored,
+        Messages.HaveAll: _have_all_received,
+        Messages.HaveNone: _have_none_received,
+        Messages.Reject: _reject_received,
+        Messages.AllowedFast: _allowed_fast_received,
+    }
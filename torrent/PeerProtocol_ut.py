@@ -0,0 +1,152 @@
+import tempfile
+import unittest
+
+from torrent import Messages
+from torrent.PeerProtocol import PeerProtocol
+from torrent.Pipeline import BLOCK_SIZE
+from torrent.TestFixtures import PEER, PIECE_LENGTH, downloaded_piece, generate_data, make_torrent
+
+PIECES = 8
+
+
+def messages(data):
+    return Messages.decode_messages(memoryview(bytes(data)), 0, len(data))[0]
+
+
+def requests(data):
+    return [(message.index, message.begin) for message in messages(data) if isinstance(message, Messages.Request)]
+
+
+class PeerProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = generate_data(PIECES)
+
+        # Pieces are only joined by several peers once the whole torrent is handed out
+        self.torrent = make_torrent(self.directory.name, self.data, endgame_threshold=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def protocol(self, fast=False, pipeline_size=5, peer=PEER):
+        protocol = PeerProtocol(self.torrent, peer, pipeline_size=pipeline_size, adaptive_pipeline=False)
+        protocol.negotiate(bytes(7) + bytes([0x04 if fast else 0]))
+        protocol.handle_message(Messages.Bitfield(b"\xff"))
+        return protocol
+
+    def block(self, index, begin):
+        start = index * PIECE_LENGTH + begin
+        return Messages.Piece(index, begin, memoryview(self.data)[start:start + BLOCK_SIZE])
+
+    def test_window_is_kept_full(self):
+        protocol = self.protocol()
+        self.assertEqual(requests(protocol.build_requests()), [])
+
+        protocol.handle_message(Messages.UNCHOKE)
+        sent = requests(protocol.build_requests())
+        self.assertEqual(sent, [(0, 0), (0, BLOCK_SIZE), (1, 0), (1, BLOCK_SIZE), (2, 0)])
+
+        # Every block received is replaced by a new request, a completed piece is handed over
+        self.assertEqual(protocol.handle_message(self.block(0, 0)), ())
+        self.assertEqual(requests(protocol.build_requests()), [(2, BLOCK_SIZE)])
+
+        [(piece, buffer)] = protocol.handle_message(self.block(0, BLOCK_SIZE))
+        self.assertEqual((piece.piece_id, bytes(buffer.data)), (0, self.data[:PIECE_LENGTH]))
+        self.assertEqual(len(protocol.pipeline), 4)
+        self.assertEqual(requests(protocol.build_requests()), [(3, 0)])
+
+    def test_endgame_cancels(self):
+        first = self.protocol(pipeline_size=2 * PIECES)
+        first.handle_message(Messages.UNCHOKE)
+        self.assertEqual(len(requests(first.build_requests())), 2 * PIECES)
+
+        # Every piece is handed out, the second peer asks for the blocks still missing too
+        second = self.protocol(pipeline_size=2, peer={"ip": "127.0.0.1", "port": 6882})
+        second.handle_message(Messages.UNCHOKE)
+        [request, _] = requests(second.build_requests())
+
+        second.handle_message(self.block(*request))
+        self.assertEqual(messages(first.build_requests()), [Messages.Cancel(*request, BLOCK_SIZE)])
+
+        # The block arriving from the first peer anyway is dropped
+        self.assertEqual(first.handle_message(self.block(*request)), ())
+        self.assertEqual(len(first.pipeline), 2 * PIECES - 1)
+
+    def test_choked_requests_are_sent_again_on_unchoke(self):
+        protocol = self.protocol()
+        protocol.handle_message(Messages.UNCHOKE)
+        sent = requests(protocol.build_requests())
+        self.assertEqual(len(sent), 5)
+
+        # The peer drops the requests when choking us, nothing is asked for until it unchokes us again
+        protocol.handle_message(Messages.CHOKE)
+        self.assertEqual(requests(protocol.build_requests()), [])
+        self.assertFalse(protocol.waiting_for_blocks())
+
+        protocol.handle_message(Messages.UNCHOKE)
+        self.assertEqual(requests(protocol.build_requests()), sent)
+        self.assertTrue(protocol.waiting_for_blocks())
+
+    def test_fast_choke_gives_pieces_back(self):
+        protocol = self.protocol(fast=True)
+        protocol.handle_message(Messages.UNCHOKE)
+        sent = requests(protocol.build_requests())
+
+        # Pieces are handed back at once, the peer rejects the requests it is not going to answer
+        protocol.handle_message(Messages.CHOKE)
+        self.assertTrue(protocol.take_returned_work())
+        self.assertEqual(len(self.torrent.picker), PIECES)
+        self.assertEqual(requests(protocol.build_requests()), [])
+
+        for index, begin in sent:
+            protocol.handle_message(Messages.Reject(index, begin, BLOCK_SIZE))
+        self.assertFalse(protocol.waiting_for_blocks())
+
+        protocol.handle_message(Messages.UNCHOKE)
+        self.assertEqual(len(requests(protocol.build_requests())), 5)
+
+    def test_allowed_fast_pieces_are_requested_while_choked(self):
+        protocol = self.protocol(fast=True)
+        protocol.handle_message(Messages.AllowedFast(3))
+        self.assertEqual(requests(protocol.build_requests()), [(3, 0), (3, BLOCK_SIZE)])
+
+        # Rejected while choked, the piece is no longer allowed
+        protocol.handle_message(Messages.Reject(3, 0, BLOCK_SIZE))
+        self.assertTrue(protocol.take_returned_work())
+        self.assertEqual(requests(protocol.build_requests()), [])
+
+    def test_rejected_while_unchoked_is_requested_again(self):
+        protocol = self.protocol(fast=True)
+        protocol.handle_message(Messages.UNCHOKE)
+        sent = requests(protocol.build_requests())
+
+        protocol.handle_message(Messages.Reject(*sent[1], BLOCK_SIZE))
+        self.assertFalse(protocol.take_returned_work())
+        self.assertEqual(requests(protocol.build_requests()), [sent[1]])
+
+    def test_requests_not_answered_are_rejected(self):
+        self.torrent.verify_piece(*downloaded_piece(self.data, 0), PEER)
+
+        for fast in (False, True):
+            protocol = self.protocol(fast, peer={"ip": "127.0.0.1", "port": 6882 + fast})
+            protocol.build_greeting()
+
+            # Requests sent while choked, for pieces we do not have or cancelled get no block
+            protocol.handle_message(Messages.Request(0, 0, BLOCK_SIZE))
+            protocol.handle_message(Messages.INTERESTED)
+            self.assertEqual(messages(b"".join(protocol.build_uploads())),
+                             [Messages.UNCHOKE] + ([Messages.Reject(0, 0, BLOCK_SIZE)] if fast else []))
+
+            for message in (Messages.Request(1, 0, BLOCK_SIZE), Messages.Request(0, BLOCK_SIZE, BLOCK_SIZE),
+                            Messages.Cancel(0, BLOCK_SIZE, BLOCK_SIZE)):
+                protocol.handle_message(message)
+
+            rejects = [Messages.Reject(1, 0, BLOCK_SIZE), Messages.Reject(0, BLOCK_SIZE, BLOCK_SIZE)]
+            self.assertEqual(messages(b"".join(protocol.build_uploads())), rejects if fast else [])
+
+            protocol.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
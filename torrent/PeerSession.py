@@ -0,0 +1,138 @@
+import functools
+import socket
+
+from torrent import Connection
+from torrent.Network import Network
+from torrent.PeerProtocol import PeerProtocol, SNUB_TIMEOUT
+from torrent.TorrentException import TorrentException
+
+# Seconds an idle session waits for a message before looking for work again
+IDLE_TIMEOUT = 1
+CONNECT_TIMEOUT = 10
+
+# Seconds the peer may take to make room for what we send it before the connection is dropped
+SEND_TIMEOUT = 60
+
+
+class PeerSession:
+    """
+    A long-lived connection to a single peer, driven by its own thread. The connection is established (handshake,
+    interested, unchoke) only once and is then reused to download as many pieces as the peer is willing to give us.
+    Block requests are pipelined, so several of them are in flight at any time. Peers connecting to us are served the
+    same way, from the socket they connected on.
+    """
+
+    def __init__(self, torrent, peer, own_peer_id: str, pipeline_size=5, adaptive_pipeline=True, conn=None,
+                 handshake=None):
+        self._torrent = torrent
+        self._peer = peer
+        self._own_peer_id = own_peer_id
+
+        # Inbound connections are accepted with the handshake of the peer already received
+        self._conn = conn
+        self._handshake = handshake
+        self._inbound = conn is not None
+        download, upload = torrent.peer_rate_limiters()
+        trace = functools.partial(torrent.trace, peer=peer) if torrent.trace is not None else None
+        self._network = Network(download=download, upload=upload, trace=trace)
+        self._protocol = PeerProtocol(torrent, peer, pipeline_size, adaptive_pipeline, self._inbound)
+
+    @property
+    def peer(self):
+        return self._peer
+
+    @property
+    def protocol(self):
+        return self._protocol
+
+    def run(self):
+        """
+        Keeps pulling work from the torrent and serving the requests of the peer until the torrent stops running or
+        the peer stops answering
+        """
+        failed = False
+
+        try:
+            self._connect()
+
+            while self._torrent.is_running() and not self._protocol.is_pointless():
+
+                # Everything to be sent this round goes out together. The idle timeout only applies to receives, a
+                # peer slow to read what we upload is not dropped for it
+                self._network.queue(self._protocol.build_requests())
+                for buffer in self._protocol.build_uploads():
+                    self._network.queue(buffer)
+
+                self._conn.settimeout(SEND_TIMEOUT)
+                self._network.flush(self._conn)
+
+                # Without work, wake up regularly to look for pieces made available by other peers
+                waiting = self._protocol.waiting_for_blocks()
+                self._conn.settimeout(SNUB_TIMEOUT if waiting else IDLE_TIMEOUT)
+
+                try:
+                    messages = self._network.receive_messages(self._conn, self._protocol.max_message_length)
+                except socket.timeout:
+                    if waiting:
+                        self._protocol.timed_out()
+                    continue
+
+                # Every message received at once is handled before the next receive reuses the buffer
+                for message in messages:
+                    for piece, buffer in self._protocol.handle_message(message):
+                        self._torrent.piece_downloaded(piece, buffer, self._peer)
+
+        except (OSError, TorrentException) as e:
+            print(f"{self._peer['ip']} : {e}")
+            failed = True
+
+        finally:
+            self._protocol.close()
+            self.close()
+            self._torrent.peers.release(self._peer, failed)
+
+    def interrupt(self):
+        """
+        Wakes the session up if it is waiting for the peer, e.g. when the torrent stops. May be called from any thread
+        """
+        conn = self._conn
+
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self):
+        peer_ip, peer_port = self._peer["ip"], self._peer["port"]
+        handshake = Connection.build_handshake(self._torrent.info_hash(), self._own_peer_id)
+
+        if self._inbound:
+            # Answer the handshake of the peer
+            self._network.send_data(self._conn, handshake)
+            print(f"> Accepted {peer_ip}:{peer_port}")
+
+        else:
+            self._conn = Network.get_socket(peer_ip)
+            Network.configure_socket(self._conn)
+            self._conn.settimeout(CONNECT_TIMEOUT)
+            self._conn.connect((peer_ip, peer_port))
+            print(f"> Connected to {peer_ip}:{peer_port}")
+
+            # Send Handshake and receive
+            self._network.send_data(self._conn, handshake)
+            self._handshake = self._network.receive_data_with_length(self._conn, len(handshake))
+
+        reserved, info_hash, _ = Connection.parse_handshake(self._handshake)
+        if info_hash != self._torrent.info_hash():
+            raise TorrentException("Peer answered the handshake with a different info hash")
+
+        self._protocol.negotiate(reserved)
+
+        # Send our bitfield and interested
+        self._network.send_data(self._conn, self._protocol.build_greeting())
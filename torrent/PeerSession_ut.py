@@ -0,0 +1,73 @@
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from torrent import Connection, Messages
+from torrent.Network import Network
+from torrent.PeerSession import PeerSession
+from torrent.Pipeline import BLOCK_SIZE
+from torrent.TestFixtures import PEER, PIECE_LENGTH, generate_data, make_torrent
+
+PIECES = 2
+PEER_ID = "-SM0001-000000000000"
+
+
+class PeerSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = generate_data(PIECES)
+        self.torrent = make_torrent(self.directory.name, self.data)
+
+        # The session is served from one end as a peer connecting to us, the test plays the peer on the other
+        conn, self.remote = socket.socketpair()
+        self.remote.settimeout(5)
+        self.network = Network()
+
+        handshake = Connection.build_handshake(self.torrent.info_hash(), "-PEER-" + "0" * 14)
+        self.session = PeerSession(self.torrent, PEER, PEER_ID, conn=conn, handshake=handshake)
+        self.thread = threading.Thread(target=self.session.run, daemon=True)
+
+    def tearDown(self):
+        self.remote.close()
+        self.thread.join(5)
+        self.directory.cleanup()
+
+    def send(self, *messages):
+        self.network.send_data(self.remote, b"".join(message.encode() for message in messages))
+
+    def test_piece_then_disconnect(self):
+        self.thread.start()
+
+        _, info_hash, _ = Connection.parse_handshake(self.network.receive_data_with_length(self.remote, 68))
+        self.assertEqual(info_hash, self.torrent.info_hash())
+        self.send(Messages.Bitfield(b"\xc0"), Messages.UNCHOKE)
+
+        # Only the first piece is sent, the requests for the second one are left unanswered
+        missing = {0, BLOCK_SIZE}
+        while missing:
+            for message in self.network.receive_messages(self.remote):
+                if isinstance(message, Messages.Request) and message.index == 0:
+                    missing.discard(message.begin)
+                    self.send(Messages.Piece(0, message.begin, self.data[message.begin:message.begin + BLOCK_SIZE]))
+
+        deadline = time.monotonic() + 5
+        while not self.torrent.has_piece(0) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.torrent.has_piece(0))
+
+        # The session ends with the connection, the piece it was downloading goes back to the picker
+        self.remote.close()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+        self.assertFalse(self.torrent.has_piece(1))
+        self.assertEqual(len(self.torrent.picker), 1)
+        self.assertEqual(self.torrent.metrics()["peers_connected"], 0)
+        self.assertEqual(bytes(self.torrent.read_block(0, 0, PIECE_LENGTH)), self.data[:PIECE_LENGTH])
+
+
+if __name__ == "__main__":
+    unittest.main()
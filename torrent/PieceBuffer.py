@@ -0,0 +1,66 @@
+import time
+from hashlib import sha1
+
+
+class PieceBuffer:
+    """
+    Collects the blocks of a piece as they arrive. When incremental, the blocks are fed to SHA-1 as soon as they
+    extend the contiguous prefix already hashed, so by the time the last block arrives the piece is (almost) hashed.
+    """
+
+    def __init__(self, size, incremental=True):
+        self._data = bytearray(size)
+        self._view = memoryview(self._data)
+
+        self._incremental = incremental
+        self._hasher = sha1()
+        self._hashed = 0
+        self._out_of_order = {}
+
+        # Time spent hashing this piece, in seconds
+        self.hash_time = 0.0
+
+    @property
+    def data(self):
+        return self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def add_block(self, begin, block):
+        """
+        Copies a block into the piece
+        """
+        self._view[begin:begin + len(block)] = block
+
+        if not self._incremental:
+            return
+
+        if begin != self._hashed:
+            self._out_of_order[begin] = len(block)
+            return
+
+        start = time.perf_counter()
+
+        end = begin + len(block)
+        while end in self._out_of_order:
+            end += self._out_of_order.pop(end)
+
+        self._hasher.update(self._view[self._hashed:end])
+        self._hashed = end
+
+        self.hash_time += time.perf_counter() - start
+
+    def digest(self):
+        """
+        Hashes whatever was not hashed yet
+        :return: The SHA-1 digest of the piece
+        """
+        start = time.perf_counter()
+
+        self._hasher.update(self._view[self._hashed:])
+        self._hashed = len(self._data)
+        self._out_of_order.clear()
+
+        self.hash_time += time.perf_counter() - start
+        return self._hasher.digest()
@@ -0,0 +1,36 @@
+import os
+import unittest
+from hashlib import sha1
+
+from torrent.PieceBuffer import PieceBuffer
+
+
+class PieceBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(10 * 1024 + 7)
+        self.blocks = [(begin, self.data[begin:begin + 1024]) for begin in range(0, len(self.data), 1024)]
+
+    def _fill(self, buffer, blocks):
+        for begin, block in blocks:
+            buffer.add_block(begin, memoryview(block))
+        return buffer
+
+    def test_in_order(self):
+        buffer = self._fill(PieceBuffer(len(self.data)), self.blocks)
+        self.assertEqual(buffer.data, self.data)
+        self.assertEqual(buffer.digest(), sha1(self.data).digest())
+
+    def test_out_of_order(self):
+        blocks = self.blocks[1::2] + self.blocks[::2]
+        buffer = self._fill(PieceBuffer(len(self.data)), blocks)
+        self.assertEqual(buffer.data, self.data)
+        self.assertEqual(buffer.digest(), sha1(self.data).digest())
+
+    def test_not_incremental(self):
+        buffer = self._fill(PieceBuffer(len(self.data), incremental=False), reversed(self.blocks))
+        self.assertEqual(buffer.digest(), sha1(self.data).digest())
+
+
+if __name__ == "__main__":
+    unittest.main()
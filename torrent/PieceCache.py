@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+
+
+class PieceCache:
+    """
+    Keeps the pieces most recently read for uploads in memory, up to `capacity` bytes, and evicts the least recently
+    used ones first. Peers request a piece block by block and popular pieces are requested by many peers, so whole
+    pieces are read from the storage at once and the following requests are answered from memory.
+    """
+
+    def __init__(self, storage, metadata, capacity=2**24):
+        self._storage = storage
+        self._metadata = metadata
+        self._capacity = capacity
+
+        self._pieces = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._bytes_read = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def bytes_read(self):
+        """
+        :return: The number of bytes read from the storage, to be compared with the bytes uploaded
+        """
+        return self._bytes_read
+
+    def __len__(self):
+        return len(self._pieces)
+
+    def read(self, index, begin, length):
+        """
+        Reads a block of a verified piece
+        :return: A memoryview over the block
+        """
+        with self._lock:
+            piece = self._pieces.get(index)
+
+            if piece is not None:
+                self._pieces.move_to_end(index)
+                self._hits += 1
+                return memoryview(piece)[begin:begin + length]
+
+            self._misses += 1
+
+        piece_size = self._metadata.piece_size(index)
+
+        # Pieces that would not fit are not cached at all
+        if piece_size > self._capacity:
+            self._count_read(length)
+            return memoryview(self._storage.read(index, begin, length))
+
+        # Two peers missing the same piece at once may both read it, which is cheaper than serializing every read
+        piece = self._storage.read(index, 0, piece_size)
+        self._count_read(piece_size)
+
+        with self._lock:
+            if index not in self._pieces:
+                self._pieces[index] = piece
+                self._size += len(piece)
+
+                while self._size > self._capacity:
+                    _, evicted = self._pieces.popitem(last=False)
+                    self._size -= len(evicted)
+
+        return memoryview(piece)[begin:begin + length]
+
+    def clear(self):
+        with self._lock:
+            self._pieces.clear()
+            self._size = 0
+
+    def _count_read(self, length):
+        with self._lock:
+            self._bytes_read += length
@@ -0,0 +1,50 @@
+import unittest
+
+from torrent.PieceCache import PieceCache
+from torrent.TorrentInformation import TorrentInformation
+
+
+class CountingStorage:
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+
+    def read(self, piece_index, offset, length):
+        self.reads += 1
+        position = piece_index * 32 + offset
+        return bytearray(self.data[position:position + length])
+
+
+class PieceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = CountingStorage(bytes(range(100)))
+        metadata = TorrentInformation({"info": {"name": b"cache", "piece length": 32, "length": 100,
+                                                "pieces": b"\0" * 20 * 4}})
+        self.cache = PieceCache(self.storage, metadata, capacity=64)
+
+    def test_blocks_of_a_piece_are_read_once(self):
+        self.assertEqual(self.cache.read(1, 0, 16), bytes(range(32, 48)))
+        self.assertEqual(self.cache.read(1, 16, 16), bytes(range(48, 64)))
+        self.assertEqual(self.storage.reads, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.bytes_read), (1, 1, 32))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.read(0, 0, 1)
+        self.cache.read(1, 0, 1)
+        self.cache.read(0, 0, 1)
+        self.cache.read(2, 0, 1)
+        self.assertEqual(len(self.cache), 2)
+
+        self.cache.read(0, 0, 1)
+        self.assertEqual(self.storage.reads, 3)
+        self.cache.read(1, 0, 1)
+        self.assertEqual(self.storage.reads, 4)
+
+    def test_last_piece(self):
+        self.assertEqual(self.cache.read(3, 0, 4), bytes(range(96, 100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+HASH_SIZE = 20
+
+
+class PieceHashes:
+    """
+    The SHA-1 hashes of every piece of a torrent, kept as the single string they come in from the metadata rather than
+    an object per piece. Indexing returns a zero-copy view of the hash.
+    """
+
+    def __init__(self, data):
+        self._data = memoryview(data).cast("B")
+
+        if len(self._data) % HASH_SIZE != 0:
+            raise ValueError(f"Piece hashes of {len(self._data)} bytes are not a multiple of {HASH_SIZE}")
+
+    def __len__(self):
+        return len(self._data) // HASH_SIZE
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(f"Piece {index} does not exist")
+
+        return self._data[index * HASH_SIZE:(index + 1) * HASH_SIZE]
+
+    def __iter__(self):
+        for start in range(0, len(self._data), HASH_SIZE):
+            yield self._data[start:start + HASH_SIZE]
+
+    def matches(self, index, digest):
+        return self[index] == digest
+
+    def verify(self, indexes, digests):
+        """
+        Compares many digests at once. When the indexes are consecutive, every digest is checked with a single
+        comparison over the whole range and pieces are only compared one by one if that fails
+        :param indexes: The indexes of the pieces, in the order of their digests
+        :param digests: The digests of the pieces, concatenated
+        :return: The indexes whose digest matches
+        """
+        indexes = list(indexes)
+        digests = memoryview(digests).cast("B")
+
+        if len(digests) != len(indexes) * HASH_SIZE:
+            raise ValueError(f"Expected {len(indexes)} digests, got {len(digests)} bytes")
+
+        if not indexes:
+            return []
+
+        first, last = indexes[0], indexes[-1]
+
+        if last - first + 1 == len(indexes) and indexes == list(range(first, last + 1)):
+            if self._data[first * HASH_SIZE:(last + 1) * HASH_SIZE] == digests:
+                return indexes
+
+        return [index for position, index in enumerate(indexes)
+                if self[index] == digests[position * HASH_SIZE:(position + 1) * HASH_SIZE]]
@@ -0,0 +1,41 @@
+import unittest
+
+from torrent.PieceHashes import PieceHashes
+
+
+class PieceHashesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes(range(100))
+        self.hashes = PieceHashes(self.data)
+
+    def test_index(self):
+        self.assertEqual(len(self.hashes), 5)
+        self.assertEqual(self.hashes[2], self.data[40:60])
+        self.assertIsInstance(self.hashes[2], memoryview)
+
+    def test_out_of_range(self):
+        with self.assertRaises(IndexError):
+            self.hashes[5]
+
+    def test_iter(self):
+        self.assertEqual(b"".join(self.hashes), self.data)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            PieceHashes(b"\0" * 30)
+
+    def test_verify_range(self):
+        self.assertEqual(self.hashes.verify(range(1, 4), self.data[20:80]), [1, 2, 3])
+
+    def test_verify_mismatch(self):
+        digests = bytearray(self.data[20:80])
+        digests[25] ^= 1
+        self.assertEqual(self.hashes.verify([1, 2, 3], digests), [1, 3])
+
+    def test_verify_scattered(self):
+        self.assertEqual(self.hashes.verify([4, 0], self.data[80:100] + self.data[0:20]), [4, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
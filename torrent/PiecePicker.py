@@ -0,0 +1,101 @@
+import threading
+from array import array
+
+from torrent.Bitfield import Bitfield
+
+
+class PiecePicker:
+    """
+    Hands out the pieces still to be downloaded, rarest first. The availability of every piece across the connected
+    peers is counted from their bitfield and have messages, and a peer is only ever given pieces it actually has.
+
+    Pieces waiting to be handed out are kept in buckets by availability, so a peer announcing a piece moves it to the
+    next bucket in constant time. Pieces nobody has cannot be handed out, so they are only marked in a bitfield
+    rather than kept in a bucket of their own, which keeps the picker compact until peers announce pieces.
+    """
+
+    def __init__(self, pieces: Bitfield, piece_count):
+        self._lock = threading.Lock()
+        self._availability = array("I", [0]) * piece_count
+
+        self._waiting = Bitfield(piece_count, pieces.to_bytes())
+        self._waiting_count = pieces.count()
+        self._buckets = {}
+
+    def __len__(self):
+        """
+        :return: The number of pieces waiting to be handed out
+        """
+        return self._waiting_count
+
+    def availability(self, index):
+        return self._availability[index]
+
+    def add_peer(self, bitfield):
+        with self._lock:
+            for index in bitfield:
+                self._change_availability(index, 1)
+
+    def remove_peer(self, bitfield):
+        with self._lock:
+            for index in bitfield:
+                self._change_availability(index, -1)
+
+    def peer_has(self, index):
+        with self._lock:
+            self._change_availability(index, 1)
+
+    def pick(self, bitfield):
+        """
+        Takes the rarest piece the peer has out of the picker
+        :return: The index of the piece, or None if the peer has nothing we still need
+        """
+        with self._lock:
+            for availability in sorted(self._buckets):
+                bucket = self._buckets[availability]
+
+                for index in bucket:
+                    if index in bitfield:
+                        self._remove(index)
+                        self._waiting.discard(index)
+                        self._waiting_count -= 1
+                        return index
+
+        return None
+
+    def put_back(self, index):
+        """
+        Makes a piece available again, e.g. when its download failed
+        """
+        with self._lock:
+            if index in self._waiting:
+                return
+
+            self._waiting.add(index)
+            self._waiting_count += 1
+
+            availability = self._availability[index]
+            if availability:
+                self._buckets.setdefault(availability, set()).add(index)
+
+    def _remove(self, index):
+        availability = self._availability[index]
+        if not availability:
+            return
+
+        bucket = self._buckets[availability]
+        bucket.discard(index)
+
+        if not bucket:
+            del self._buckets[availability]
+
+    def _change_availability(self, index, delta):
+        availability = self._availability[index] + delta
+
+        # Pieces handed out (or already downloaded) are only counted
+        if index in self._waiting:
+            self._remove(index)
+            if availability:
+                self._buckets.setdefault(availability, set()).add(index)
+
+        self._availability[index] = availability
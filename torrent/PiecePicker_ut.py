@@ -0,0 +1,54 @@
+import unittest
+
+from torrent.Bitfield import Bitfield
+from torrent.PiecePicker import PiecePicker
+
+
+def bitfield(length, indexes):
+    result = Bitfield(length)
+    for index in indexes:
+        result.add(index)
+    return result
+
+
+class PiecePickerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.picker = PiecePicker(Bitfield(4).complement(), 4)
+
+    def test_only_pieces_the_peer_has(self):
+        peer = bitfield(4, [2])
+        self.picker.add_peer(peer)
+        self.assertEqual(self.picker.pick(peer), 2)
+        self.assertIsNone(self.picker.pick(peer))
+
+    def test_rarest_first(self):
+        seed = bitfield(4, range(4))
+        self.picker.add_peer(seed)
+        self.picker.add_peer(bitfield(4, [0, 1, 3]))
+        self.picker.peer_has(0)
+
+        self.assertEqual(self.picker.pick(seed), 2)
+        self.assertEqual({self.picker.pick(seed), self.picker.pick(seed)}, {1, 3})
+        self.assertEqual(self.picker.pick(seed), 0)
+
+    def test_put_back(self):
+        peer = bitfield(4, [1])
+        self.picker.add_peer(peer)
+        piece = self.picker.pick(peer)
+        self.assertIsNone(self.picker.pick(peer))
+
+        self.picker.put_back(piece)
+        self.assertEqual(self.picker.pick(peer), 1)
+
+    def test_remove_peer(self):
+        peer = bitfield(4, [0, 1])
+        self.picker.add_peer(peer)
+        self.picker.remove_peer(peer)
+        self.assertEqual(self.picker.availability(0), 0)
+        self.assertIsNone(self.picker.pick(bitfield(4, [0])))
+        self.assertEqual(len(self.picker), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
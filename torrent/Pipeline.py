@@ -0,0 +1,111 @@
+import math
+import time
+
+BLOCK_SIZE = 2 ** 14
+
+
+class RequestPipeline:
+    """
+    Keeps track of the block requests in flight to a single peer. Instead of waiting for each block before asking for
+    the next one, up to `window` requests are kept outstanding so the peer always has work queued.
+
+    When adaptive, the window follows the measured throughput of the peer: it is sized to hold `queue_time` seconds
+    worth of blocks at the current download rate, bounded by `min_size` and `max_size`.
+    """
+
+    def __init__(self, size=5, adaptive=True, min_size=2, max_size=250, queue_time=3.0, rate_interval=1.0):
+        self._outstanding = {}
+
+        self._window = size
+        self._adaptive = adaptive
+        self._min_size = min_size
+        self._max_size = max_size
+        self._queue_time = queue_time
+
+        # Throughput and latency measurements
+        self._rate_interval = rate_interval
+        self._interval_start = time.monotonic()
+        self._interval_bytes = 0
+        self._rate = 0.0
+        self._rtt = 0.0
+
+    def __len__(self):
+        return len(self._outstanding)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def rate(self):
+        """
+        Download rate from this peer, in bytes per second
+        """
+        return self._rate
+
+    @property
+    def rtt(self):
+        """
+        Average time between requesting a block and receiving it, in seconds
+        """
+        return self._rtt
+
+    def free_slots(self):
+        return max(0, self._window - len(self._outstanding))
+
+    def add(self, piece_id, begin, block):
+        """
+        Registers a request that is about to be sent to the peer
+        """
+        self._outstanding[(piece_id, begin)] = (block, time.monotonic())
+
+    def complete(self, piece_id, begin, length):
+        """
+        Matches a received block back to its request
+        :return: The requested block, or None if the block was never requested
+        """
+        request = self._outstanding.pop((piece_id, begin), None)
+        if request is None:
+            return None
+
+        block, sent_at = request
+        now = time.monotonic()
+
+        # Exponential moving average of the round trip
+        rtt = now - sent_at
+        self._rtt = rtt if self._rtt == 0 else 0.8 * self._rtt + 0.2 * rtt
+
+        self._interval_bytes += length
+        elapsed = now - self._interval_start
+
+        if elapsed >= self._rate_interval:
+            rate = self._interval_bytes / elapsed
+            self._rate = rate if self._rate == 0 else 0.5 * self._rate + 0.5 * rate
+            self._interval_start = now
+            self._interval_bytes = 0
+
+            if self._adaptive:
+                self._resize()
+
+        return block
+
+    def remove(self, piece_id, begin):
+        """
+        Forgets a request that was cancelled
+        :return: The block that was requested, or None if it was not outstanding
+        """
+        request = self._outstanding.pop((piece_id, begin), None)
+        return None if request is None else request[0]
+
+    def clear(self):
+        """
+        Forgets every outstanding request, e.g. when the peer chokes us and discards them
+        :return: The blocks that were outstanding, in the order they were requested
+        """
+        blocks = [block for block, _ in self._outstanding.values()]
+        self._outstanding.clear()
+        return blocks
+
+    def _resize(self):
+        desired = math.ceil(self._rate * self._queue_time / BLOCK_SIZE)
+        self._window = max(self._min_size, min(self._max_size, desired))
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+from torrent.Pipeline import RequestPipeline, BLOCK_SIZE
+
+
+class RequestPipelineTest(unittest.TestCase):
+
+    def fill(self, pipeline, count):
+        for block_id in range(count):
+            pipeline.add(0, block_id * BLOCK_SIZE, block_id)
+
+    def test_window(self):
+        pipeline = RequestPipeline(size=3, adaptive=False)
+        self.fill(pipeline, 3)
+        self.assertEqual(pipeline.free_slots(), 0)
+
+        self.assertEqual(pipeline.complete(0, BLOCK_SIZE, BLOCK_SIZE), 1)
+        self.assertEqual(pipeline.free_slots(), 1)
+
+        # Blocks which were not requested, or already received, are not matched
+        self.assertIsNone(pipeline.complete(0, BLOCK_SIZE, BLOCK_SIZE))
+        self.assertIsNone(pipeline.complete(1, 0, BLOCK_SIZE))
+        self.assertEqual(len(pipeline), 2)
+
+    def test_remove_and_clear(self):
+        pipeline = RequestPipeline(size=5, adaptive=False)
+        self.fill(pipeline, 4)
+
+        self.assertEqual(pipeline.remove(0, 2 * BLOCK_SIZE), 2)
+        self.assertIsNone(pipeline.remove(0, 2 * BLOCK_SIZE))
+
+        # Blocks are given back in the order they were requested, to be requested again
+        self.assertEqual(pipeline.clear(), [0, 1, 3])
+        self.assertEqual(len(pipeline), 0)
+
+    def test_window_follows_the_rate(self):
+        pipeline = RequestPipeline(size=5, min_size=2, max_size=250, rate_interval=0.05)
+        self.fill(pipeline, 2)
+
+        # A byte in a tenth of a second is as slow as it gets
+        time.sleep(0.1)
+        pipeline.complete(0, 0, 1)
+        self.assertEqual(pipeline.window, 2)
+
+        pipeline = RequestPipeline(size=5, min_size=2, max_size=250, rate_interval=0)
+        self.fill(pipeline, 2)
+        pipeline.complete(0, 0, BLOCK_SIZE)
+        self.assertEqual(pipeline.window, 250)
+
+    def test_fixed_window(self):
+        pipeline = RequestPipeline(size=5, adaptive=False, rate_interval=0)
+        self.fill(pipeline, 2)
+        pipeline.complete(0, 0, BLOCK_SIZE)
+        self.assertEqual(pipeline.window, 5)
+        self.assertGreater(pipeline.rate, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Bounds a transfer rate, in bytes per second. Tokens accumulate at the rate up to `burst` (one second of traffic by
+    default), and every transfer takes as many tokens as it moved bytes. A transfer larger than the tokens available
+    is let through and leaves the bucket in debt, which the caller pays by waiting: the accounting is done once per
+    socket operation rather than per byte. A rate of None means no limit.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self._lock = threading.Lock()
+        self._rate = None
+        self._burst = 0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate, burst=None):
+        """
+        Changes the rate, taking effect on the next transfer
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+
+        if burst is None:
+            burst = rate or 0
+
+        with self._lock:
+            if self._rate is None:
+                self._tokens = burst
+
+            self._rate = rate
+            self._burst = burst
+            self._tokens = min(self._tokens, self._burst)
+            self._stamp = time.monotonic()
+
+    def consume(self, amount):
+        """
+        Takes the tokens for a transfer of amount bytes
+        :return: The number of seconds to wait before transferring again
+        """
+        if self._rate is None:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+            self._stamp = now
+
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+
+class RateLimiter:
+    """
+    Applies several token buckets at once, e.g. those of the session, the torrent and the peer a transfer belongs to
+    """
+
+    def __init__(self, *buckets):
+        self._buckets = buckets
+
+    def consume(self, amount):
+        """
+        :return: The number of seconds to wait before transferring again, for the most restrictive bucket
+        """
+        delay = 0.0
+
+        for bucket in self._buckets:
+            delay = max(delay, bucket.consume(amount))
+
+        return delay
+
+    def throttle(self, amount):
+        """
+        Accounts for a transfer, blocking the calling thread as long as needed
+        """
+        delay = self.consume(amount)
+        if delay:
+            time.sleep(delay)
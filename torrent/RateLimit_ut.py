@@ -0,0 +1,39 @@
+import unittest
+
+from torrent.RateLimit import RateLimiter, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        self.assertEqual(bucket.consume(10 ** 9), 0)
+
+    def test_burst_then_debt(self):
+        bucket = TokenBucket(1000)
+        self.assertEqual(bucket.consume(1000), 0)
+        self.assertAlmostEqual(bucket.consume(500), 0.5, places=1)
+
+    def test_set_rate(self):
+        bucket = TokenBucket()
+        bucket.set_rate(100, burst=10)
+        self.assertEqual(bucket.rate, 100)
+        self.assertAlmostEqual(bucket.consume(110), 1, places=1)
+
+        bucket.set_rate(None)
+        self.assertEqual(bucket.consume(1000), 0)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_most_restrictive_bucket(self):
+        limiter = RateLimiter(TokenBucket(1000, burst=0), TokenBucket(100, burst=0), TokenBucket())
+        self.assertAlmostEqual(limiter.consume(100), 1, places=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+
+from bencode import bencode
+from torrent.Bitfield import Bitfield
+
+
+def resume_path(save_path, info_hash: bytes):
+    return os.path.join(save_path, f"{info_hash.hex()}.resume")
+
+
+def _file_state(span):
+    try:
+        return {"length": os.stat(span.path).st_size}
+    except FileNotFoundError:
+        return {"length": -1}
+
+
+def save_resume(path, info_hash: bytes, have: Bitfield, spans):
+    """
+    Records which pieces were verified, along with the size of every file. The file is replaced atomically, so a
+    crash while saving never leaves a truncated resume file behind
+    """
+    with open(path + ".part", "wb") as file:
+        bencode.encode({
+            "info hash": info_hash,
+            "pieces": have.to_bytes(),
+            "files": [_file_state(span) for span in spans],
+        }, file)
+
+    os.replace(path + ".part", path)
+
+
+def load_resume(path, info_hash: bytes, piece_count, spans):
+    """
+    Reads a resume file back. Files are modified after the resume file is written, as pieces verified since then are
+    written into them, but pieces are never written again once verified: the recorded pieces are trusted as long as
+    the files still have the same size
+    :return: None if there is no usable resume file, otherwise the verified pieces
+    """
+    try:
+        with open(path, "rb") as file:
+            data = bencode.decode_dictionary(file.read())[0]
+
+        have = Bitfield.from_bytes(piece_count, data["pieces"])
+    except (OSError, KeyError, ValueError, bencode.BencodeException):
+        return None
+
+    if data.get("info hash") != info_hash or len(data.get("files", [])) != len(spans):
+        return None
+
+    # A file with a different size cannot hold the data we verified
+    for span, recorded in zip(spans, data["files"]):
+        if _file_state(span)["length"] != recorded.get("length"):
+            return None
+
+    return have
+
+
+def recheck(metadata, storage, indexes, workers=None, batch=64):
+    """
+    Hashes the pieces already on disk against the torrent metadata, using a thread per core (hashlib releases the GIL).
+    Every thread hashes a batch of pieces and checks all their digests at once
+    :return: The indexes of the pieces that are valid
+    """
+    indexes = list(indexes)
+
+    def check(batch_indexes):
+        digests = bytearray()
+
+        for index in batch_indexes:
+            digests += sha1(storage.read(index, 0, metadata.piece_size(index))).digest()
+
+        return metadata.pieces().verify(batch_indexes, digests)
+
+    batches = [indexes[start:start + batch] for start in range(0, len(indexes), batch)]
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        return [index for valid in executor.map(check, batches) for index in valid]
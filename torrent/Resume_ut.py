@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from torrent import Resume
+from torrent.Bitfield import Bitfield
+from torrent.Storage import FileSpan
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spans = []
+
+        for i in range(2):
+            path = os.path.join(self.directory.name, f"file{i}")
+            with open(path, "wb") as file:
+                file.write(b"\0" * 10)
+            self.spans.append(FileSpan(path=path, offset=10 * i, length=10))
+
+        self.path = Resume.resume_path(self.directory.name, b"\x01" * 20)
+        self.have = Bitfield.from_bytes(4, b"\xa0")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        Resume.save_resume(self.path, b"\x01" * 20, self.have, self.spans)
+        have = Resume.load_resume(self.path, b"\x01" * 20, 4, self.spans)
+        self.assertEqual(list(have), [0, 2])
+
+    def test_missing_file(self):
+        self.assertIsNone(Resume.load_resume(self.path, b"\x01" * 20, 4, self.spans))
+
+    def test_other_torrent(self):
+        Resume.save_resume(self.path, b"\x01" * 20, self.have, self.spans)
+        self.assertIsNone(Resume.load_resume(self.path, b"\x02" * 20, 4, self.spans))
+
+    def test_modified_file(self):
+        Resume.save_resume(self.path, b"\x01" * 20, self.have, self.spans)
+
+        # Pieces verified after the save were written into the file, the recorded ones are still there
+        with open(self.spans[1].path, "r+b") as file:
+            file.seek(5)
+            file.write(b"\1" * 5)
+
+        have = Resume.load_resume(self.path, b"\x01" * 20, 4, self.spans)
+        self.assertEqual(list(have), [0, 2])
+
+    def test_resized_file(self):
+        Resume.save_resume(self.path, b"\x01" * 20, self.have, self.spans)
+        with open(self.spans[0].path, "ab") as file:
+            file.write(b"\0")
+
+        self.assertIsNone(Resume.load_resume(self.path, b"\x01" * 20, 4, self.spans))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from random import randint
+
+from torrent.Limits import SessionLimits, SharedLimit
+from torrent.Listener import Listener
+from torrent.Metrics import MetricsReporter
+from torrent.RateLimit import TokenBucket
+
+
+class Session:
+    """
+    Downloads many torrents at once. Peer connections, block requests in flight and pieces queued for the disk are
+    bounded across all torrents, and every torrent gets a share of each limit weighted by its priority.
+
+    With a listen port, peers can connect to us for any of the torrents, which is what lets other peers download
+    from us. With metrics sinks, a snapshot of every torrent is written to them each `metrics_interval` seconds.
+    """
+
+    def __init__(self, max_connections=200, max_requests=4000, max_disk_queue=64, download_rate=None,
+                 upload_rate=None, listen_port=None, metrics_sinks=(), metrics_interval=10):
+        self._torrents = []
+        self._peerID = "-smtorren-" + "".join([str(randint(0, 9)) for _ in range(10)])
+        self._listener = Listener(self._torrents, self._peerID, listen_port) if listen_port is not None else None
+        self._reporter = MetricsReporter(self._torrents, metrics_sinks, metrics_interval) if metrics_sinks else None
+
+        self._limits = SessionLimits(connections=SharedLimit(max_connections), requests=SharedLimit(max_requests),
+                                     disk_queue=SharedLimit(max_disk_queue), download=TokenBucket(download_rate),
+                                     upload=TokenBucket(upload_rate))
+
+    def add_torrent(self, torrent_file, priority=1):
+        torrent_file.use_limits(self._limits, priority)
+        self._torrents.append(torrent_file)
+
+    def set_priority(self, torrent_file, priority):
+        """
+        Changes the share of the limits given to a torrent, a priority of 0 pauses it
+        """
+        self._limits.set_priority(torrent_file, priority)
+
+    def set_rate_limits(self, download_rate=None, upload_rate=None):
+        """
+        Bounds the total transfer rate of every torrent, in bytes per second. None removes the limit
+        """
+        self._limits.download.set_rate(download_rate)
+        self._limits.upload.set_rate(upload_rate)
+
+    def download(self, engine="threads"):
+        """
+        Downloads every torrent concurrently, either with a thread per peer ("threads") or from a single event loop
+        ("asyncio"). Seeds keep running until stopped
+        """
+        if self._reporter is not None:
+            self._reporter.start()
+
+        try:
+            self._download(engine)
+        finally:
+            if self._reporter is not None:
+                self._reporter.stop()
+
+    def _download(self, engine):
+        if engine == "asyncio":
+            asyncio.run(self._download_async())
+        elif engine == "threads":
+            if self._listener is not None:
+                self._listener.start()
+                self._use_listen_port()
+
+            try:
+                threads = [threading.Thread(target=torrent.download, args=(self._peerID,))
+                           for torrent in self._torrents]
+                [thread.start() for thread in threads]
+                [thread.join() for thread in threads]
+            finally:
+                if self._listener is not None:
+                    self._listener.close()
+        else:
+            raise ValueError(f"Unknown download engine {engine}")
+
+    def stop(self):
+        """
+        Stops every torrent, including seeds. May be called from any thread
+        """
+        for torrent in self._torrents:
+            torrent.stop()
+
+    def _use_listen_port(self):
+        """
+        Torrents announce the port we listen on, known once listening
+        """
+        for torrent in self._torrents:
+            torrent.port = self._listener.port
+
+    async def _download_async(self):
+        if self._listener is not None:
+            await self._listener.start_async()
+            self._use_listen_port()
+
+        try:
+            await asyncio.gather(*[torrent.download_async(self._peerID) for torrent in self._torrents])
+        finally:
+            if self._listener is not None:
+                self._listener.close()
+
+    @property
+    def torrents(self):
+        return self._torrents
+
+    @property
+    def limits(self):
+        return self._limits
+
+    def metrics(self):
+        """
+        :return: A snapshot of every torrent, as written to the metrics sinks
+        """
+        return [torrent.metrics() for torrent in self._torrents]
@@ -0,0 +1,198 @@
+import dataclasses
+import mmap
+import os
+import threading
+from bisect import bisect_right
+from typing import List
+
+from torrent.TorrentException import TorrentException
+
+
+@dataclasses.dataclass
+class FileSpan:
+    path: str
+    offset: int
+    length: int
+
+
+def build_spans(metadata, save_path="."):
+    """
+    Lays the files of the torrent out one after the other, as the pieces see them
+    :return: A list of FileSpan sorted by their offset in the torrent
+    """
+    spans = []
+    offset = 0
+
+    for file in metadata.files():
+        if metadata.is_single_file():
+            path = _safe_path(save_path, [metadata.name()])
+        else:
+            path = _safe_path(save_path, [metadata.name(), *[bytes(part).decode() for part in file.path]])
+
+        spans.append(FileSpan(path=path, offset=offset, length=file.length))
+        offset += file.length
+
+    return spans
+
+
+def _safe_path(save_path, parts):
+    """
+    Joins the parts of a path given by the torrent below the save path. The torrent may be crafted to write anywhere
+    else: absolute paths and parts which are empty, `.`, `..` or hold a separator are refused
+    """
+    separators = {os.sep, os.altsep} - {None}
+
+    for part in parts:
+        if part in ("", ".", "..") or separators & set(part) or os.path.splitdrive(part)[0]:
+            raise TorrentException(f"Torrent has an invalid file path {parts}")
+
+    root = os.path.realpath(save_path)
+    path = os.path.join(save_path, *parts)
+
+    # Symbolic links already in the save path may lead out of it too
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise TorrentException(f"Torrent file path {parts} is outside of {save_path}")
+
+    return path
+
+
+class Storage:
+    """
+    Writes pieces straight into the final files of the torrent. A sorted index of the file spans maps any position
+    of a piece to the file (and the position within the file) it belongs to.
+    """
+
+    def __init__(self, metadata, save_path="."):
+        self._piece_length = metadata.piece_length()
+        self._spans = build_spans(metadata, save_path)
+
+        # Empty files still have to be created, but they never hold any data
+        self._index = [span for span in self._spans if span.length > 0]
+        self._offsets = [span.offset for span in self._index]
+
+        self._files = {}
+        self._locks = {}
+
+    @property
+    def spans(self) -> List[FileSpan]:
+        return self._spans
+
+    def open(self):
+        """
+        Creates every file (and directory) of the torrent with its final size, keeping any data already there
+        """
+        for span in self._spans:
+            directory = os.path.dirname(span.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            file = open(span.path, "r+b" if os.path.exists(span.path) else "w+b", buffering=0)
+            if os.fstat(file.fileno()).st_size != span.length:
+                file.truncate(span.length)
+
+            self._files[span.path] = file
+            self._locks[span.path] = threading.Lock()
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+        self._files.clear()
+        self._locks.clear()
+
+    def locate(self, piece_index, offset, length):
+        """
+        Maps a range of a piece to the files holding it
+        :return: A list of (span, file offset, size) tuples, in order
+        """
+        position = piece_index * self._piece_length + offset
+        end = position + length
+        ranges = []
+
+        i = bisect_right(self._offsets, position) - 1
+
+        while position < end:
+            span = self._index[i]
+            size = min(end, span.offset + span.length) - position
+
+            ranges.append((span, position - span.offset, size))
+            position += size
+            i += 1
+
+        return ranges
+
+    def write_piece(self, piece_index, data):
+        view = memoryview(data)
+        written = 0
+
+        for span, file_offset, size in self.locate(piece_index, 0, len(data)):
+            file = self._files[span.path]
+
+            with self._locks[span.path]:
+                file.seek(file_offset)
+
+                chunk = view[written:written + size]
+                while chunk:
+                    chunk = chunk[file.write(chunk):]
+
+            written += size
+
+    def read(self, piece_index, offset, length):
+        data = bytearray()
+
+        for span, file_offset, size in self.locate(piece_index, offset, length):
+            file = self._files[span.path]
+
+            with self._locks[span.path]:
+                file.seek(file_offset)
+                data += file.read(size)
+
+        return data
+
+
+class MmapStorage(Storage):
+    """
+    Storage backend that maps every file of the torrent in memory once. Pieces are copied into the mappings, without
+    any seek/write system calls, and as pieces never overlap no locking is needed.
+    """
+
+    def __init__(self, metadata, save_path="."):
+        super().__init__(metadata, save_path)
+        self._maps = {}
+
+    def open(self):
+        super().open()
+
+        # Empty files cannot be mapped, but they are never written to either
+        for span in self._index:
+            self._maps[span.path] = mmap.mmap(self._files[span.path].fileno(), span.length)
+
+    def close(self):
+        for mapping in self._maps.values():
+            mapping.flush()
+            mapping.close()
+
+        self._maps.clear()
+        super().close()
+
+    def write_piece(self, piece_index, data):
+        view = memoryview(data)
+        written = 0
+
+        for span, file_offset, size in self.locate(piece_index, 0, len(data)):
+            self._maps[span.path][file_offset:file_offset + size] = view[written:written + size]
+            written += size
+
+    def read(self, piece_index, offset, length):
+        data = bytearray()
+
+        for span, file_offset, size in self.locate(piece_index, offset, length):
+            data += self._maps[span.path][file_offset:file_offset + size]
+
+        return data
+
+
+BACKENDS = {
+    "file": Storage,
+    "mmap": MmapStorage,
+}
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from torrent.Storage import Storage, MmapStorage
+from torrent.TorrentException import TorrentException
+from torrent.TorrentInformation import TorrentInformation
+
+
+def multi_file_torrent(lengths, piece_length):
+    files = [{"length": length, "path": [b"dir", f"file{i}".encode()]} for i, length in enumerate(lengths)]
+    pieces = b"\0" * 20 * -(-sum(lengths) // piece_length)
+    return TorrentInformation({"info": {"name": b"multi", "piece length": piece_length, "pieces": pieces,
+                                        "files": files}})
+
+
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_locate_inside_a_file(self):
+        storage = Storage(multi_file_torrent([100, 100], 32), self.directory.name)
+        [(span, file_offset, size)] = storage.locate(1, 4, 8)
+        self.assertTrue(span.path.endswith(os.path.join("multi", "dir", "file0")))
+        self.assertEqual((file_offset, size), (36, 8))
+
+    def test_locate_across_files(self):
+        storage = Storage(multi_file_torrent([10, 0, 5, 40], 16), self.directory.name)
+        ranges = storage.locate(0, 0, 16)
+        self.assertEqual([(span.length, file_offset, size) for span, file_offset, size in ranges],
+                         [(10, 0, 10), (5, 0, 5), (40, 0, 1)])
+
+    def test_write_and_read_pieces(self):
+        self._write_and_read_pieces(Storage)
+
+    def test_mmap_write_and_read_pieces(self):
+        self._write_and_read_pieces(MmapStorage)
+
+    def _write_and_read_pieces(self, backend):
+        lengths = [10, 0, 5, 40]
+        data = bytes(range(sum(lengths)))
+        storage = backend(multi_file_torrent(lengths, 16), self.directory.name)
+        storage.open()
+
+        for index in range(0, len(data), 16):
+            storage.write_piece(index // 16, data[index:index + 16])
+
+        self.assertEqual(storage.read(0, 8, 20), data[8:28])
+        storage.close()
+
+        contents = b""
+        for span in storage.spans:
+            with open(span.path, "rb") as file:
+                contents += file.read()
+
+        self.assertEqual(contents, data)
+
+    def test_paths_outside_of_the_save_path(self):
+        for path in ([b"..", b"..", b"etc", b"x"], [b"dir", b""], [b"/etc", b"x"], [b"a/../../b"]):
+            files = [{"length": 1, "path": path}]
+            metadata = TorrentInformation({"info": {"name": b"multi", "piece length": 16, "pieces": b"\0" * 20,
+                                                    "files": files}})
+            with self.subTest(path=path), self.assertRaises(TorrentException):
+                Storage(metadata, self.directory.name)
+
+        for name in (b"/etc/cron.d/evil", b"..", b""):
+            metadata = TorrentInformation({"info": {"name": name, "piece length": 16, "pieces": b"\0" * 20,
+                                                    "length": 1}})
+            with self.subTest(name=name), self.assertRaises(TorrentException):
+                Storage(metadata, self.directory.name)
+
+    def test_symbolic_link_outside_of_the_save_path(self):
+        os.symlink(tempfile.gettempdir(), os.path.join(self.directory.name, "multi"))
+        with self.assertRaises(TorrentException):
+            Storage(multi_file_torrent([10], 16), self.directory.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
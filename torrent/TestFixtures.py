@@ -0,0 +1,47 @@
+"""
+Small torrents for the unit tests, built from generated data: pieces of two blocks, hashed so they verify
+"""
+import hashlib
+import os
+
+from torrent.PieceBuffer import PieceBuffer
+from torrent.Pipeline import BLOCK_SIZE
+from torrent.Torrent import Torrent, Piece
+from torrent.TorrentInformation import TorrentInformation
+
+PIECE_LENGTH = 2 * BLOCK_SIZE
+PEER = {"ip": "127.0.0.1", "port": 6881}
+
+
+def generate_data(pieces):
+    return bytes(range(256)) * (pieces * PIECE_LENGTH // 256)
+
+
+def make_metadata(data, announce=b"http://127.0.0.1/announce"):
+    pieces = b"".join(hashlib.sha1(data[i:i + PIECE_LENGTH]).digest() for i in range(0, len(data), PIECE_LENGTH))
+    info = {"name": b"data.bin", "piece length": PIECE_LENGTH, "length": len(data), "pieces": pieces}
+    return TorrentInformation({"announce": announce, "info": info})
+
+
+def make_torrent(directory, data, seed=False, **options):
+    """
+    :param seed: Writes the data first, so the torrent starts complete and keeps seeding
+    :param options: Passed to Torrent
+    """
+    metadata = options.pop("metadata", None) or make_metadata(data)
+
+    if seed:
+        with open(os.path.join(directory, metadata.name()), "wb") as file:
+            file.write(data)
+
+    return Torrent(metadata, directory, resume=False, recheck=seed, seed=seed, **options)
+
+
+def downloaded_piece(data, index):
+    """
+    :return: The piece and the buffer of a piece as received from peers
+    """
+    block = data[index * PIECE_LENGTH:(index + 1) * PIECE_LENGTH]
+    buffer = PieceBuffer(PIECE_LENGTH)
+    buffer.add_block(0, block)
+    return Piece(index, hashlib.sha1(block).digest(), index * PIECE_LENGTH, PIECE_LENGTH), buffer
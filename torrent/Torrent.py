@@ -0,0 +1,707 @@
+import dataclasses
+import threading
+import time
+import weakref
+
+from array import array
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from torrent.AsyncEngine import AsyncEngine, ANNOUNCE_RETRY
+from torrent.Choker import Choker
+from torrent.DownloadingPiece import DownloadingPiece
+from torrent.PeerPool import PeerPool
+from torrent.PeerSession import PeerSession
+from torrent.PieceBuffer import PieceBuffer
+from torrent.PieceCache import PieceCache
+from torrent.PiecePicker import PiecePicker
+from torrent.Pipeline import BLOCK_SIZE
+from torrent import Resume, Storage, Tracker
+from torrent.Bitfield import Bitfield
+from torrent.Limits import SessionLimits
+from torrent.Metrics import Histogram
+from torrent.RateLimit import RateLimiter, TokenBucket
+from torrent.TorrentException import TorrentException
+
+
+# Seconds between two saves of the resume file while downloading
+RESUME_INTERVAL = 30
+
+
+@dataclasses.dataclass(slots=True)
+class BlockPiece:
+    piece_id: int
+    block_id: int
+    block_size: int
+    start_position: int
+
+
+@dataclasses.dataclass(slots=True)
+class Piece:
+    """
+    A piece being downloaded. Pieces are only created when handed out to a peer, and their blocks are laid out from
+    the piece length the first time they are needed
+    """
+    piece_id: int
+    hash: bytes
+    start_position: int
+    length: int
+    _blocks: List[BlockPiece] = dataclasses.field(default=None, repr=False, compare=False)
+    started_at: float = dataclasses.field(default=0.0, repr=False, compare=False)
+
+    @property
+    def blocks(self) -> List[BlockPiece]:
+        if self._blocks is None:
+            self._blocks = [BlockPiece(piece_id=self.piece_id, block_id=block_id,
+                                       block_size=min(BLOCK_SIZE, self.length - begin),
+                                       start_position=self.start_position + begin)
+                            for block_id, begin in enumerate(range(0, self.length, BLOCK_SIZE))]
+
+        return self._blocks
+
+
+class Torrent:
+
+    def __init__(self, file_data, save_path=".", storage="file", max_peers=30, pipeline_size=5, adaptive_pipeline=True,
+                 verify_workers=0, resume=True, recheck=False, endgame_threshold=64, port=Tracker.DEFAULT_PORT, seed=False,
+                 max_uploads=4, cache_size=2**24):
+        self._metadata = file_data
+
+        # Peers returned by the tracker or connecting to us, with what we learnt about them
+        self._peers = PeerPool()
+
+        # Tracker announces, with the transfer statistics of this run
+        self._tracker = Tracker.create_tracker(file_data.announce_url())
+        self._port = port
+        self._uploaded = 0
+        self._downloaded = 0
+        self._announce_event = "started"
+
+        # Pieces already verified, possibly by a previous run
+        self._have = Bitfield(file_data.piece_count())
+        self._resume_file = Resume.resume_path(save_path, file_data.info_hash()) if resume else None
+        self._resume_saved = time.monotonic()
+        self._resume_mutex = threading.Lock()
+
+        # The resume file has to be checked against the files before they are resized
+        storage_backend = Storage.BACKENDS[storage](file_data, save_path)
+        resume_data = Resume.load_resume(self._resume_file, file_data.info_hash(), len(self._have),
+                                         storage_backend.spans) if resume and not recheck else None
+
+        # Create files to be downloaded, pieces are written straight into them
+        self._storage = storage_backend
+        self._storage.open()
+        self._load_progress(resume_data, recheck)
+
+        # The missing pieces are handed out rarest first. Only their indexes are kept, pieces and their blocks are
+        # laid out when a peer starts downloading them
+        self.picker = PiecePicker(self._have.complement(), len(self._have))
+        self._to_complete_pieces = len(self._have) - self._have.count()
+
+        # Pieces verified during this run, in order, to be announced to the connected peers
+        self._verified = array("I")
+
+        # A seed keeps running once complete, until stopped
+        self._seed = seed
+        self._progress_mutex = threading.Lock()
+        self._stopped = threading.Event()
+        if self.is_complete() and not seed:
+            self._stopped.set()
+
+        # Uploads: a few interested peers are unchoked at once, chosen again and again by the choker, and their
+        # requests are answered from the pieces most recently read
+        self._choker = Choker(max_uploads)
+        self._cache = PieceCache(self._storage, file_data, cache_size)
+
+        # Pieces being downloaded. Once fewer than endgame_threshold blocks are missing, idle peers join them
+        self._downloading = {}
+        self._endgame_threshold = endgame_threshold
+
+        # Bytes and blocks still missing, counted from the piece length as all pieces but the last have the same size
+        piece_length = file_data.piece_length()
+        self._left = self._to_complete_pieces * piece_length
+        self._blocks_left = self._to_complete_pieces * -(-piece_length // BLOCK_SIZE)
+
+        last_piece = len(self._have) - 1
+        if last_piece >= 0 and last_piece not in self._have:
+            last_length = file_data.piece_size(last_piece)
+            self._left -= piece_length - last_length
+            self._blocks_left -= -(-piece_length // BLOCK_SIZE) - -(-last_length // BLOCK_SIZE)
+
+        # Pieces are either hashed incrementally by the session receiving them or by a pool of workers
+        self._verifier = ThreadPoolExecutor(verify_workers, "verify") if verify_workers else None
+        self._hash_latencies = []
+
+        # Metrics, and a hook told about the life of every piece when tracing
+        self._hash_failures = 0
+        self._piece_latency = Histogram()
+        self._disk_write_latency = Histogram()
+        self._rate_sample = (time.monotonic(), 0, 0)
+        self._trace = None
+
+        # Long-lived sessions, one per connected peer. Connections, requests and the disk queue are also bounded by
+        # the limits of the session running the torrent, if any
+        self._limits = SessionLimits()
+        self._max_peers = max_peers
+
+        # Transfer rates of the whole torrent and of each peer, in bytes per second
+        self._download_bucket = TokenBucket()
+        self._upload_bucket = TokenBucket()
+        self._peer_rates = (None, None)
+        self._peer_buckets = weakref.WeakSet(), weakref.WeakSet()
+        self._sessions = {}
+        self._sessions_mutex = threading.Lock()
+        self._threads = []
+        self._engine = None
+
+        # Block requests kept in flight per peer
+        self._pipeline_size = pipeline_size
+        self._adaptive_pipeline = adaptive_pipeline
+
+    @property
+    def limits(self):
+        return self._limits
+
+    @property
+    def choker(self):
+        return self._choker
+
+    @property
+    def peers(self):
+        return self._peers
+
+    @property
+    def trace(self):
+        return self._trace
+
+    def set_trace(self, hook):
+        """
+        Calls hook(event, **fields) as pieces are started, verified and written, and as sessions opened afterwards
+        move bytes ("recv" and "send" events). None stops tracing
+        """
+        self._trace = hook
+
+    @property
+    def port(self):
+        return self._port
+
+    @port.setter
+    def port(self, port):
+        """
+        The port peers can connect to, as announced to the tracker
+        """
+        self._port = port
+
+    def use_limits(self, limits: SessionLimits, priority=1):
+        """
+        Shares the limits of a session with its other torrents, getting a share of them weighted by priority
+        """
+        self._limits = limits
+        limits.register(self, priority)
+
+    def set_rate_limits(self, download_rate=None, upload_rate=None):
+        """
+        Bounds the transfer rate of the torrent, in bytes per second. None removes the limit
+        """
+        self._download_bucket.set_rate(download_rate)
+        self._upload_bucket.set_rate(upload_rate)
+
+    def set_peer_rate_limits(self, download_rate=None, upload_rate=None):
+        """
+        Bounds the transfer rate of every connection of the torrent, in bytes per second, including those already open
+        """
+        self._peer_rates = (download_rate, upload_rate)
+
+        for buckets, rate in zip(self._peer_buckets, self._peer_rates):
+            for bucket in list(buckets):
+                bucket.set_rate(rate)
+
+    def peer_rate_limiters(self):
+        """
+        :return: The download and upload limiters for a new connection, applying the limits of the peer, the torrent
+        and the session
+        """
+        limiters = []
+
+        for buckets, rate, torrent_bucket, session_bucket in zip(self._peer_buckets, self._peer_rates,
+                                                                (self._download_bucket, self._upload_bucket),
+                                                                (self._limits.download, self._limits.upload)):
+            peer_bucket = TokenBucket(rate)
+            buckets.add(peer_bucket)
+            limiters.append(RateLimiter(peer_bucket, torrent_bucket, session_bucket))
+
+        return tuple(limiters)
+
+    def is_complete(self):
+        return self._to_complete_pieces == 0
+
+    def is_running(self):
+        """
+        The torrent is running until it is complete, or until it is stopped when seeding
+        """
+        return not self._stopped.is_set()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._engine is not None:
+            self._engine.stop()
+
+    def piece_count(self):
+        return len(self._have)
+
+    def piece_size(self, index):
+        return self._metadata.piece_size(index)
+
+    def has_piece(self, index):
+        return index in self._have
+
+    def bitfield(self):
+        """
+        :return: A copy of the pieces we have, and the position in the pieces verified since then to announce from
+        """
+        with self._progress_mutex:
+            return Bitfield(len(self._have), self._have.to_bytes()), len(self._verified)
+
+    def verified_since(self, position):
+        """
+        :return: The indexes of the pieces verified after the given position
+        """
+        return self._verified[position:]
+
+    def read_block(self, index, begin, length):
+        """
+        Reads a block of a piece we have for a peer, counting it as uploaded
+        :return: A memoryview over the block
+        """
+        block = self._cache.read(index, begin, length)
+
+        with self._progress_mutex:
+            self._uploaded += length
+
+        return block
+
+    def in_endgame(self):
+        return len(self.picker) == 0 or self._blocks_left <= self._endgame_threshold
+
+    def start_piece(self, protocol, pieces=None):
+        """
+        Finds a piece for the peer to work on: the rarest piece it has or, in endgame mode, the piece it has with the
+        most missing blocks among those already being downloaded by other peers. The peer joins the piece before the
+        lock is released, so a piece it is given cannot be put back in the picker by the last of its other workers
+        :param pieces: The pieces to choose from, those the peer has when not given
+        :return: A DownloadingPiece, or None if there is nothing the peer can help with
+        """
+        if pieces is None:
+            pieces = protocol.bitfield
+
+        index = self.picker.pick(pieces)
+
+        with self._progress_mutex:
+
+            if index is not None:
+                downloading = DownloadingPiece(self._make_piece(index), self.incremental_hashing)
+                downloading.join(protocol)
+                self._downloading[index] = downloading
+
+                if self._trace is not None:
+                    self._trace("piece_started", index=index, peer=protocol.peer)
+
+                return downloading
+
+            if not self.in_endgame():
+                return None
+
+            candidates = [downloading for downloading in self._downloading.values()
+                          if downloading.piece_id in pieces and not downloading.has_worker(protocol)
+                          and not downloading.is_complete()]
+
+            downloading = max(candidates, key=lambda downloading: len(downloading.missing_blocks()), default=None)
+            if downloading is not None:
+                downloading.join(protocol)
+
+            return downloading
+
+    def stop_piece(self, downloading: DownloadingPiece, protocol):
+        """
+        The peer stops working on the piece. The last one to leave an unfinished piece puts it back in the picker
+        """
+        with self._progress_mutex:
+            if not downloading.leave(protocol) or downloading.is_complete():
+                return
+
+            self._downloading.pop(downloading.piece_id, None)
+            self._blocks_left += len(downloading.piece.blocks) - len(downloading.missing_blocks())
+
+        self.picker.put_back(downloading.piece_id)
+
+    def block_received(self, length):
+        with self._progress_mutex:
+            self._blocks_left -= 1
+            self._downloaded += length
+
+    def _load_progress(self, resume_data, recheck):
+        """
+        Trusts the pieces recorded in the resume file. Pieces verified after it was last saved are downloaded again.
+        A recheck hashes every piece already on disk instead
+        """
+        if recheck:
+            for index in Resume.recheck(self._metadata, self._storage, range(len(self._have))):
+                self._have.add(index)
+
+        elif resume_data is not None:
+            self._have = resume_data
+
+        else:
+            return
+
+        print(f"Resuming with {self._have.count()} of {len(self._have)} pieces")
+
+    def _save_resume(self):
+        if self._resume_file is None:
+            return
+
+        with self._resume_mutex:
+            with self._progress_mutex:
+                have = Bitfield(len(self._have), self._have.to_bytes())
+
+            Resume.save_resume(self._resume_file, self._metadata.info_hash(), have, self._storage.spans)
+            self._resume_saved = time.monotonic()
+
+    def download(self, own_peer_id: str, threads=1):
+        # Start thread responsible for communicating with tracker
+        tracker_comm = threading.Thread(target=self._get_peers, args=(own_peer_id,))
+        tracker_comm.start()
+
+        # Start threads responsible for downloading the pieces
+        self._download(own_peer_id)
+        self._finish(own_peer_id)
+
+        # End threads
+        tracker_comm.join()
+
+    async def download_async(self, own_peer_id: str, max_peers=None):
+        """
+        Downloads the torrent with the asyncio engine: every peer is served by a task instead of a thread
+        """
+        engine = AsyncEngine(self, own_peer_id, max_peers or self._max_peers, self._pipeline_size,
+                             self._adaptive_pipeline)
+        self._engine = engine
+
+        try:
+            await engine.download()
+        finally:
+            self._engine = None
+
+        self._finish(own_peer_id)
+
+    def accept_peer(self, conn, peer, own_peer_id: str, handshake):
+        """
+        Serves a peer which connected to us, from a thread of its own
+        :param handshake: The handshake of the peer, already received
+        :return: False if the peer was turned away, in which case the connection is left to the caller
+        """
+        # Turned away before the session is built, it would mark the peer of a running session as connected again
+        if not self.is_running() or self._peers.is_banned(peer["ip"]) or len(self._sessions) >= self._max_peers \
+                or (peer["ip"], peer["port"]) in self._sessions or not self._limits.connections.try_acquire(self):
+            return False
+
+        session = PeerSession(self, peer, own_peer_id, self._pipeline_size, self._adaptive_pipeline, conn, handshake)
+        if not self._add_session(session):
+            self._limits.connections.release(self)
+            return False
+
+        thread = threading.Thread(target=self._run_session, args=(session,), name=peer["ip"])
+
+        with self._sessions_mutex:
+            self._threads.append(thread)
+
+        thread.start()
+        return True
+
+    def accept_peer_async(self, reader, writer, peer, handshake):
+        """
+        Serves a peer which connected to us from the asyncio engine, when the torrent is downloaded with it
+        :return: False if the peer was turned away
+        """
+        if self._engine is None or not self.is_running() or self._peers.is_banned(peer["ip"]):
+            return False
+
+        return self._engine.accept(reader, writer, peer, handshake)
+
+    def _finish(self, own_peer_id: str):
+        # The other torrents of the session get our share
+        self._limits.unregister(self)
+
+        if self._verifier is not None:
+            self._verifier.shutdown()
+
+        self._storage.close()
+        self._save_resume()
+        self._print_hash_latencies()
+        self._print_upload_statistics()
+
+        # Tell the tracker we completed the download, or that we are gone so it stops handing us out. Nothing is
+        # sent if the tracker never heard of us
+        if self._announce_event != "started":
+            try:
+                self.announce(own_peer_id, "completed" if self.is_complete() and not self._seed else "stopped")
+            except (OSError, TorrentException) as e:
+                print(f"Peer request failed: {e}")
+
+    def _download(self, own_peer_id):
+
+        while self.is_running():
+
+            # Seeds only serve the peers connecting to them
+            if self.is_complete() or len(self._sessions) >= self._max_peers \
+                    or not self._limits.connections.try_acquire(self):
+                self._stopped.wait(1)
+                continue
+
+            """
+            Connect to the best peer known, waiting for the tracker if there is none
+            """
+            peer = self._peers.take(timeout=1)
+            if peer is None:
+                self._limits.connections.release(self)
+                continue
+
+            """
+            Peers already being served by a session are not connected to twice
+            """
+            session = PeerSession(self, peer, own_peer_id, self._pipeline_size, self._adaptive_pipeline)
+            if not self._add_session(session):
+                self._limits.connections.release(self)
+                self._peers.release(peer)
+                self._stopped.wait(1)
+                continue
+
+            thread = threading.Thread(target=self._run_session, args=(session,), name=peer["ip"])
+
+            with self._sessions_mutex:
+                self._threads.append(thread)
+
+            thread.start()
+
+        # Sessions still waiting for a peer are woken up
+        with self._sessions_mutex:
+            threads, self._threads = self._threads, []
+            sessions = list(self._sessions.values())
+
+        for session in sessions:
+            session.interrupt()
+
+        [thread.join() for thread in threads]
+
+    def _add_session(self, session: PeerSession):
+        key = (session.peer["ip"], session.peer["port"])
+
+        with self._sessions_mutex:
+            if key in self._sessions:
+                return False
+
+            self._sessions[key] = session
+            return True
+
+    def _run_session(self, session: PeerSession):
+        try:
+            session.run()
+        finally:
+            with self._sessions_mutex:
+                del self._sessions[(session.peer["ip"], session.peer["port"])]
+
+            self._limits.connections.release(self)
+
+    def info_hash(self):
+        return self._metadata.info_hash()
+
+    @property
+    def incremental_hashing(self):
+        """
+        Pieces are hashed block by block as they arrive, unless they are verified by a pool of workers
+        """
+        return self._verifier is None
+
+    @property
+    def verifier(self):
+        return self._verifier
+
+    def hash_latencies(self):
+        """
+        :return: The time spent hashing each verified piece, in seconds
+        """
+        return self._hash_latencies
+
+    def piece_downloaded(self, piece: Piece, buffer: PieceBuffer, peer):
+        """
+        Hands a downloaded piece over for verification. With verify workers this returns immediately, otherwise the
+        piece was already hashed as its blocks arrived and is verified right away. Either way, this waits while the
+        session has too many pieces queued for the disk. A paused torrent gets no room in the queue, the piece is
+        dropped if the torrent stops meanwhile
+        """
+        while not self._limits.disk_queue.acquire(self, timeout=1):
+            if not self.is_running():
+                return
+
+        if self._verifier is None:
+            self._verify_queued_piece(piece, buffer, peer)
+        else:
+            self._verifier.submit(self._verify_queued_piece, piece, buffer, peer)
+
+    def _verify_queued_piece(self, piece: Piece, buffer: PieceBuffer, peer):
+        try:
+            return self.verify_piece(piece, buffer, peer)
+        finally:
+            self._limits.disk_queue.release(self)
+
+    def verify_piece(self, piece: Piece, buffer: PieceBuffer, peer):
+        """
+        Verifies the downloaded piece and stores it. Pieces failing verification are put back in the picker
+        :return: True if the piece was valid
+        """
+        digest = buffer.digest()
+
+        with self._progress_mutex:
+            self._hash_latencies.append(buffer.hash_time)
+
+        with self._progress_mutex:
+            # A copy of a piece already verified is neither counted nor put back again
+            if piece.piece_id in self._have:
+                return piece.hash == digest
+
+            self._downloading.pop(piece.piece_id, None)
+
+            if piece.hash != digest:
+                self._blocks_left += len(piece.blocks)
+                self._hash_failures += 1
+
+        if piece.hash != digest:
+            print(f"{peer['ip']} : Hashes do not match")
+            self.picker.put_back(piece.piece_id)
+
+            if self._trace is not None:
+                self._trace("hash_failed", index=piece.piece_id, peer=peer)
+
+            if self._peers.hash_failed(peer):
+                print(f"{peer['ip']} : Banned for sending corrupt data")
+
+            return False
+
+        write_start = time.monotonic()
+        self._storage.write_piece(piece.piece_id, buffer.data)
+        verified_at = time.monotonic()
+
+        self._disk_write_latency.observe(verified_at - write_start)
+        self._piece_latency.observe(verified_at - piece.started_at)
+
+        if self._trace is not None:
+            self._trace("piece_verified", index=piece.piece_id, peer=peer, latency=verified_at - piece.started_at,
+                        write_time=verified_at - write_start)
+
+        with self._progress_mutex:
+            if piece.piece_id in self._have:
+                return True
+
+            self._to_complete_pieces -= 1
+            self._left -= len(buffer.data)
+            self._have.add(piece.piece_id)
+            self._verified.append(piece.piece_id)
+
+            if self._to_complete_pieces == 0:
+                if not self._seed:
+                    self._stopped.set()
+                elif self._announce_event is None:
+                    self._announce_event = "completed"
+
+        # Progress is saved regularly, so a crash only loses the pieces verified since the last save
+        if time.monotonic() - self._resume_saved > RESUME_INTERVAL:
+            self._save_resume()
+
+        return True
+
+    def metrics(self):
+        """
+        Takes a snapshot of the torrent: transfer totals and rates since the previous snapshot, the depth of the
+        download queues, latency histograms and the statistics of the connected peers
+        :return: A dictionary, as written by the metrics sinks
+        """
+        with self._progress_mutex:
+            downloaded, uploaded, left = self._downloaded, self._uploaded, self._left
+            downloading = list(self._downloading.values())
+
+        now = time.monotonic()
+        then, downloaded_then, uploaded_then = self._rate_sample
+        self._rate_sample = (now, downloaded, uploaded)
+        elapsed = max(now - then, 1e-9)
+
+        peers = self._peers.statistics()
+        connected = [dataclasses.asdict(statistics) for statistics in peers if statistics.connected]
+
+        return {
+            "name": self._metadata.name(),
+            "info_hash": self._metadata.info_hash().hex(),
+            "downloaded": downloaded,
+            "uploaded": uploaded,
+            "left": left,
+            "download_rate": (downloaded - downloaded_then) / elapsed,
+            "upload_rate": (uploaded - uploaded_then) / elapsed,
+            "pieces_verified": len(self._verified),
+            "hash_failures": self._hash_failures,
+            "pieces_waiting": len(self.picker),
+            "pieces_downloading": len(downloading),
+            "disk_queue": sum(1 for piece in downloading if piece.is_complete()),
+            "peers_known": len(peers),
+            "peers_connected": len(connected),
+            "piece_latency": self._piece_latency.snapshot(),
+            "disk_write_latency": self._disk_write_latency.snapshot(),
+            "peers": connected,
+        }
+
+    def _print_hash_latencies(self):
+        if self._hash_latencies:
+            latencies = self._hash_latencies
+            print(f"Hashed {len(latencies)} pieces: {1000 * sum(latencies) / len(latencies):.3f} ms average, "
+                  f"{1000 * max(latencies):.3f} ms max")
+
+    def _print_upload_statistics(self):
+        if self._uploaded:
+            print(f"Uploaded {self._uploaded} bytes, read {self._cache.bytes_read} from disk "
+                  f"({self._cache.hits} cache hits, {self._cache.misses} misses)")
+
+    def announce(self, own_peer_id: str, event=None):
+        """
+        Queries the tracker for peers. The first announce of a run tells the tracker the download started
+        :return: A tuple with the list of peers and the number of seconds to wait before the next announce
+        """
+        event = event or self._announce_event
+
+        with self._progress_mutex:
+            uploaded, downloaded, left = self._uploaded, self._downloaded, self._left
+
+        peers, interval = self._tracker.announce(self._metadata.info_hash(), own_peer_id, self._port, uploaded,
+                                                 downloaded, left, event)
+        self._announce_event = None
+
+        return peers, interval
+
+    def _get_peers(self, own_peer_id: str):
+
+        while self.is_running():
+            # Query the tracker
+            try:
+                peers, interval = self.announce(own_peer_id)
+            except (OSError, TorrentException) as e:
+                print(f"Peer request failed: {e}")
+                self._stopped.wait(ANNOUNCE_RETRY)
+                continue
+
+            self._peers.add(peers)
+
+            # Wait for the next announce, unless the torrent stops first
+            print(f"Peer request: Waiting for {interval}s")
+            self._stopped.wait(interval)
+
+    def _make_piece(self, index) -> Piece:
+        piece_length = self._metadata.piece_length()
+        return Piece(piece_id=index, hash=self._metadata.piece(index), start_position=index * piece_length,
+                     length=self._metadata.piece_size(index), started_at=time.monotonic())
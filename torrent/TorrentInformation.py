@@ -3,8 +3,12 @@ import dataclasses
 from hashlib import sha1
 
 from bencode import bencode
+from torrent.PieceHashes import PieceHashes
 from torrent.TorrentException import TorrentException
 
+# Strings this large, in practice only the piece hashes, are kept as views over the .torrent data
+VIEW_THRESHOLD = 2 ** 12
+
 @dataclasses.dataclass
 class FileInformation:
     length: int
@@ -15,47 +19,74 @@ class TorrentInformation:
     Holds the metadata from the torrent file
     """
 
-    def __init__(self, info):
+    def __init__(self, info, info_hash=None):
 
         self._info = info
 
-        # Calculate the info_hash
-        self._info_hash = sha1(bencode.encode_dictionary(info['info'])).digest()
+        # Calculate the info_hash, unless it was computed over the original bytes
+        self._info_hash = info_hash or sha1(bencode.encode_dictionary(info['info'])).digest()
 
         # Process the files in the torrent
         self._files = self._process_files()
+        self._total_length = sum(f.length for f in self._files)
+
+        # The piece hashes are 20 byte chunks of a single string, sliced when needed
+        self._pieces = PieceHashes(TorrentInformation._get('pieces', info['info']))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Loads the metadata from the contents of a .torrent file. The info hash is computed over the info dictionary as
+        it appears in the file, and the piece hashes are not copied out of it
+        """
+        info, spans = bencode.decode_spans(data, VIEW_THRESHOLD)
+
+        if 'info' not in info:
+            raise TorrentException("Dictionary has no info!")
 
-        # Split the pieces into 20 byte chunks
-        pieces = TorrentInformation._get('pieces', info['info'])
-        self._pieces = [pieces[i:i+20] for i in range(0, len(pieces), 20)]
+        start, end = spans['info']
+        return cls(info, sha1(memoryview(data)[start:end]).digest())
 
     def announce_url(self):
-        return TorrentInformation._get("announce", self._info).decode()
+        return bytes(TorrentInformation._get("announce", self._info)).decode()
 
     def creation_date(self):
         return TorrentInformation._get('creation date', self._info)
 
     def author(self):
-        return TorrentInformation._get("created by", self._info).decode()
+        return bytes(TorrentInformation._get("created by", self._info)).decode()
     
     def comment(self):
-        return TorrentInformation._get("comment", self._info).decode()
+        return bytes(TorrentInformation._get("comment", self._info)).decode()
     
     def piece_length(self):
         return TorrentInformation._get("piece length", self._info['info'])
 
+    def files(self):
+        return self._files
+
     def total_length(self):
-        return sum([f.length for f in self._files])
+        return self._total_length
 
     def name(self):
-        return TorrentInformation._get("name", self._info['info']).decode()
+        return bytes(TorrentInformation._get("name", self._info['info'])).decode()
 
     def pieces(self):
         return self._pieces
 
+    def piece_count(self):
+        return len(self._pieces)
+
     def piece(self, index):
         return self._pieces[index]
 
+    def piece_size(self, index):
+        """
+        All pieces have the same length, except the last one which holds whatever is left
+        """
+        piece_length = self.piece_length()
+        return min(piece_length, self._total_length - index * piece_length)
+
     def file_length(self):
 
         if self.is_single_file():
@@ -0,0 +1,32 @@
+import unittest
+from hashlib import sha1
+
+from torrent.TorrentInformation import TorrentInformation
+
+
+class TorrentInformationTest(unittest.TestCase):
+
+    def setUp(self):
+        # The info dictionary keys are not sorted, so encoding it again would give a different hash
+        self.info = b"d6:lengthi40000e4:name4:test12:piece lengthi32768e6:pieces40:" + bytes(range(40)) + b"e"
+        self.data = b"d8:announce16:http://tracker/a4:info" + self.info + b"e"
+
+    def test_info_hash_over_original_bytes(self):
+        metadata = TorrentInformation.from_bytes(self.data)
+        self.assertEqual(metadata.info_hash(), sha1(self.info).digest())
+
+    def test_pieces(self):
+        metadata = TorrentInformation.from_bytes(self.data)
+        self.assertEqual(metadata.piece_count(), 2)
+        self.assertEqual(metadata.piece(1), bytes(range(20, 40)))
+        self.assertEqual(metadata.piece_size(1), 40000 - 32768)
+
+    def test_fields(self):
+        metadata = TorrentInformation.from_bytes(self.data)
+        self.assertEqual(metadata.announce_url(), "http://tracker/a")
+        self.assertEqual(metadata.name(), "test")
+        self.assertEqual(metadata.total_length(), 40000)
+
+
+if __name__ == "__main__":
+    unittest.main()
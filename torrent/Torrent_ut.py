@@ -0,0 +1,97 @@
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bencode import bencode
+
+from torrent import Messages
+from torrent.Limits import SessionLimits, SharedLimit
+from torrent.PeerProtocol import PeerProtocol
+from torrent.TestFixtures import PEER, downloaded_piece, generate_data, make_metadata, make_torrent
+
+PIECES = 4
+PEER_ID = "-SM0001-000000000000"
+
+
+class TrackerStandIn(BaseHTTPRequestHandler):
+    events = []
+
+    def do_GET(self):
+        self.events.append(parse_qs(urlparse(self.path).query).get("event", [None])[0])
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(bencode.encode_dictionary({"interval": 1800, "peers": b""}))
+
+    def log_message(self, *args):
+        pass
+
+
+class TorrentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = generate_data(PIECES)
+        self.torrent = make_torrent(self.directory.name, self.data)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_stop_while_paused_on_the_disk_queue(self):
+        # A torrent with priority 0 gets no room in the disk queue
+        self.torrent.use_limits(SessionLimits(disk_queue=SharedLimit(1)), priority=0)
+
+        thread = threading.Thread(target=self.torrent.piece_downloaded, args=(*downloaded_piece(self.data, 0), PEER),
+                                  daemon=True)
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+
+        self.torrent.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(self.torrent.has_piece(0))
+
+    def test_piece_verified_twice_is_counted_once(self):
+        for index in (0, 0, 1, 2):
+            self.assertTrue(self.torrent.verify_piece(*downloaded_piece(self.data, index), PEER))
+
+        self.assertFalse(self.torrent.is_complete())
+        self.assertTrue(self.torrent.verify_piece(*downloaded_piece(self.data, 3), PEER))
+        self.assertTrue(self.torrent.is_complete())
+
+    def test_endgame_piece_is_joined_before_its_workers_leave(self):
+        first, second = (PeerProtocol(self.torrent, {"ip": "127.0.0.1", "port": port}) for port in (1, 2))
+        for protocol in (first, second):
+            protocol.handle_message(Messages.Bitfield(b"\xf0"))
+
+        started = [self.torrent.start_piece(first) for _ in range(PIECES)]
+        self.assertTrue(self.torrent.in_endgame())
+
+        # The second peer joins the piece the first one is downloading, which stays out of the picker when left
+        downloading = self.torrent.start_piece(second)
+        self.assertIn(downloading, started)
+        self.assertTrue(downloading.has_worker(second))
+
+        self.torrent.stop_piece(downloading, first)
+        self.assertEqual(len(self.torrent.picker), 0)
+
+    def test_stopped_is_announced_when_stopping_early(self):
+        server = HTTPServer(("127.0.0.1", 0), TrackerStandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        TrackerStandIn.events = []
+        metadata = make_metadata(self.data, f"http://127.0.0.1:{server.server_port}/announce".encode())
+        torrent = make_torrent(self.directory.name, self.data, metadata=metadata)
+
+        torrent.announce(PEER_ID)
+        torrent.stop()
+        torrent.download(PEER_ID)
+        self.assertEqual(TrackerStandIn.events, ["started", "stopped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import random
+import socket
+import struct
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from bencode import bencode
+from torrent import Connection
+from torrent.TorrentException import TorrentException
+
+DEFAULT_PORT = 6881
+
+# UDP tracker protocol (BEP 15)
+UDP_PROTOCOL_ID = 0x41727101980
+UDP_CONNECT = 0
+UDP_ANNOUNCE = 1
+UDP_ERROR = 3
+UDP_EVENTS = {None: 0, "completed": 1, "started": 2, "stopped": 3}
+
+# A connection id can be used for one minute after it was received
+UDP_CONNECTION_TTL = 60
+
+
+def parse_compact_peers(data, address_size=4):
+    """
+    Decodes a compact peer list: every peer is its address in network order (4 bytes for IPv4, 16 for IPv6)
+    followed by a 2 byte port
+    :return: A list of peers
+    """
+    entry_size = address_size + 2
+    family = socket.AF_INET if address_size == 4 else socket.AF_INET6
+
+    if len(data) % entry_size != 0:
+        raise TorrentException(f"Compact peer list of {len(data)} bytes is not a multiple of {entry_size}")
+
+    peers = []
+    view = memoryview(data)
+
+    for start in range(0, len(data), entry_size):
+        ip = socket.inet_ntop(family, view[start:start + address_size])
+        port = int.from_bytes(view[start + address_size:start + entry_size], "big")
+        peers.append({"ip": ip, "port": port})
+
+    return peers
+
+
+def parse_peers(peers):
+    """
+    Decodes the peers of an HTTP announce, either in the dictionary or in the compact format
+    """
+    if isinstance(peers, list):
+        return [_parse_peer(peer) for peer in peers]
+
+    if not isinstance(peers, (bytes, memoryview)):
+        raise TorrentException(f"Tracker sent peers as {type(peers).__name__}")
+
+    return parse_compact_peers(peers)
+
+
+def _parse_peer(peer):
+    ip = peer.get("ip") if isinstance(peer, dict) else None
+    port = peer.get("port") if isinstance(peer, dict) else None
+
+    if not isinstance(ip, bytes) or not isinstance(port, int) or not 0 < port < 2**16:
+        raise TorrentException(f"Tracker sent an invalid peer {peer}")
+
+    try:
+        return {"ip": ip.decode(), "port": port}
+    except UnicodeDecodeError:
+        raise TorrentException(f"Tracker sent an invalid peer address {ip}")
+
+
+class HTTPTracker:
+
+    def __init__(self, url, timeout=30):
+        self._url = url
+        self._timeout = timeout
+
+    def announce(self, info_hash: bytes, peer_id: str, port, uploaded, downloaded, left, event=None):
+        """
+        Queries the tracker for peers
+        :return: A tuple with the list of peers and the number of seconds to wait before the next announce
+        """
+        params = Connection.build_peer_request(info_hash, peer_id, port, uploaded, downloaded, left, event)
+
+        req = requests.get(self._url, params, timeout=self._timeout)
+
+        # Decode the answer, anything else than a dictionary with an interval is a failed announce
+        try:
+            answer = bencode.decode_dictionary(req.content)[0]
+        except bencode.BencodeException as e:
+            raise TorrentException(f"Tracker sent an invalid answer: {e}")
+
+        if not isinstance(answer, dict):
+            raise TorrentException("Tracker answer is not a dictionary")
+
+        if "failure reason" in answer:
+            raise TorrentException(f"Tracker refused the announce: {bytes(answer['failure reason']).decode()}")
+
+        interval = answer.get("interval")
+        if not isinstance(interval, int):
+            raise TorrentException("Tracker answer has no interval")
+
+        peers = parse_peers(answer.get("peers", b""))
+        peers += parse_compact_peers(answer.get("peers6", b""), address_size=16)
+
+        return peers, interval
+
+
+class UDPTracker:
+    """
+    Announces over the UDP tracker protocol: a connect exchange gives a connection id, which is then used by the
+    announces for one minute. Requests are retried with an exponential timeout, as the protocol suggests.
+    """
+
+    def __init__(self, url, timeout=15, retries=3):
+        parsed = urlparse(url)
+
+        self._address = (parsed.hostname, parsed.port)
+        self._timeout = timeout
+        self._retries = retries
+
+        self._connection_id = None
+        self._connected_at = 0
+
+    def announce(self, info_hash: bytes, peer_id: str, port, uploaded, downloaded, left, event=None):
+        """
+        Queries the tracker for peers
+        :return: A tuple with the list of peers and the number of seconds to wait before the next announce
+        """
+        family, _, _, _, address = socket.getaddrinfo(*self._address, type=socket.SOCK_DGRAM)[0]
+
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+
+            if self._connection_id is None or time.monotonic() - self._connected_at > UDP_CONNECTION_TTL:
+                self._connect(sock, address)
+
+            transaction_id = random.getrandbits(32)
+            request = struct.pack(">QII20s20sQQQIIIiH", self._connection_id, UDP_ANNOUNCE, transaction_id, info_hash,
+                                  peer_id.encode(), downloaded, left, uploaded, UDP_EVENTS[event], 0,
+                                  random.getrandbits(32), -1, port)
+
+            response = self._exchange(sock, address, request, UDP_ANNOUNCE, transaction_id, 20)
+            interval, _, _ = struct.unpack_from(">III", response, 8)
+
+            # Peers come in the address family used to reach the tracker
+            address_size = 4 if family == socket.AF_INET else 16
+            return parse_compact_peers(response[20:], address_size), interval
+
+    def _connect(self, sock, address):
+        transaction_id = random.getrandbits(32)
+        request = struct.pack(">QII", UDP_PROTOCOL_ID, UDP_CONNECT, transaction_id)
+
+        response = self._exchange(sock, address, request, UDP_CONNECT, transaction_id, 16)
+
+        self._connection_id = struct.unpack_from(">Q", response, 8)[0]
+        self._connected_at = time.monotonic()
+
+    def _exchange(self, sock, address, request, action, transaction_id, minimum_size):
+        """
+        Sends the request until an answer with the same transaction id arrives
+        :return: The answer
+        """
+        for attempt in range(self._retries + 1):
+            sock.settimeout(self._timeout * 2 ** attempt)
+            sock.sendto(request, address)
+
+            try:
+                while True:
+                    response, _ = sock.recvfrom(2 ** 16)
+
+                    if len(response) < 8:
+                        continue
+
+                    received_action, received_transaction = struct.unpack_from(">II", response)
+                    if received_transaction != transaction_id:
+                        continue
+
+                    if received_action == UDP_ERROR:
+                        raise TorrentException(f"Tracker refused the announce: {response[8:].decode(errors='replace')}")
+
+                    if received_action != action or len(response) < minimum_size:
+                        raise TorrentException("Tracker sent an invalid answer")
+
+                    return response
+
+            except socket.timeout:
+                continue
+
+        raise TorrentException(f"Tracker {address[0]}:{address[1]} did not answer")
+
+
+def create_tracker(url):
+    """
+    :return: The tracker client for the announce url
+    """
+    scheme = urlparse(url).scheme
+
+    if scheme == "udp":
+        return UDPTracker(url)
+
+    if scheme in ("http", "https"):
+        return HTTPTracker(url)
+
+    raise TorrentException(f"Unsupported tracker {url}")
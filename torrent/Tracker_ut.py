@@ -0,0 +1,155 @@
+import socket
+import struct
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bencode import bencode
+from torrent import Tracker
+from torrent.TorrentException import TorrentException
+
+INFO_HASH = b"\x01" * 20
+PEER_ID = "-SM0001-000000000000"
+
+
+class UDPTrackerStandIn:
+    """
+    Answers UDP tracker requests with a fixed list of peers
+    """
+
+    def __init__(self, peers, error=None):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.peers = peers
+        self.error = error
+        self.announces = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"udp://127.0.0.1:{self.socket.getsockname()[1]}/announce"
+
+    def _serve(self):
+        while True:
+            try:
+                request, address = self.socket.recvfrom(2 ** 16)
+            except OSError:
+                return
+
+            connection_id, action, transaction_id = struct.unpack_from(">QII", request)
+
+            if self.error is not None:
+                self.socket.sendto(struct.pack(">II", Tracker.UDP_ERROR, transaction_id) + self.error, address)
+            elif action == Tracker.UDP_CONNECT:
+                self.socket.sendto(struct.pack(">IIQ", action, transaction_id, 1234), address)
+            elif connection_id == 1234:
+                self.announces.append(struct.unpack(">QII20s20sQQQIIIiH", request))
+                peers = b"".join(socket.inet_aton(ip) + struct.pack(">H", port) for ip, port in self.peers)
+                self.socket.sendto(struct.pack(">IIIII", action, transaction_id, 60, 0, len(self.peers)) + peers,
+                                   address)
+
+    def close(self):
+        self.socket.close()
+
+
+class HTTPTrackerStandIn(BaseHTTPRequestHandler):
+    answer = {}
+    queries = []
+
+    def do_GET(self):
+        self.queries.append(parse_qs(urlparse(self.path).query))
+        body = self.answer if isinstance(self.answer, bytes) else bencode.encode_dictionary(self.answer)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TrackerTest(unittest.TestCase):
+
+    def test_compact_peers(self):
+        data = socket.inet_aton("10.0.0.1") + b"\x1a\xe1" + socket.inet_aton("192.168.1.2") + b"\x00\x50"
+        self.assertEqual(Tracker.parse_compact_peers(data),
+                         [{"ip": "10.0.0.1", "port": 6881}, {"ip": "192.168.1.2", "port": 80}])
+
+    def test_compact_peers6(self):
+        data = socket.inet_pton(socket.AF_INET6, "2001:db8::1") + b"\x1a\xe1"
+        self.assertEqual(Tracker.parse_compact_peers(data, address_size=16), [{"ip": "2001:db8::1", "port": 6881}])
+
+    def test_truncated_compact_peers(self):
+        with self.assertRaises(TorrentException):
+            Tracker.parse_compact_peers(b"\x0a\x00\x00\x01\x1a")
+
+    def test_dictionary_peers(self):
+        self.assertEqual(Tracker.parse_peers([{"ip": b"10.0.0.1", "port": 6881}]), [{"ip": "10.0.0.1", "port": 6881}])
+
+    def test_malformed_dictionary_peers(self):
+        for peers in ([b"10.0.0.1"], [{"ip": b"10.0.0.1"}], [{"ip": 10, "port": 6881}], [{"ip": b"\xff", "port": 1}],
+                      [{"ip": b"10.0.0.1", "port": 2**16}], 5):
+            with self.subTest(peers=peers), self.assertRaises(TorrentException):
+                Tracker.parse_peers(peers)
+
+    def test_udp_announce(self):
+        tracker = UDPTrackerStandIn([("10.0.0.1", 6881), ("10.0.0.2", 6882)])
+        self.addCleanup(tracker.close)
+
+        client = Tracker.create_tracker(tracker.url)
+        peers, interval = client.announce(INFO_HASH, PEER_ID, 6881, 10, 20, 30, "started")
+
+        self.assertEqual(peers, [{"ip": "10.0.0.1", "port": 6881}, {"ip": "10.0.0.2", "port": 6882}])
+        self.assertEqual(interval, 60)
+
+        _, _, _, info_hash, _, downloaded, left, uploaded, event, _, _, _, port = tracker.announces[0]
+        self.assertEqual((info_hash, downloaded, left, uploaded, event, port), (INFO_HASH, 20, 30, 10, 2, 6881))
+
+    def test_udp_error(self):
+        tracker = UDPTrackerStandIn([], error=b"unregistered torrent")
+        self.addCleanup(tracker.close)
+
+        with self.assertRaises(TorrentException):
+            Tracker.create_tracker(tracker.url).announce(INFO_HASH, PEER_ID, 6881, 0, 0, 0)
+
+    def test_udp_timeout(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        self.addCleanup(sock.close)
+
+        client = Tracker.UDPTracker(f"udp://127.0.0.1:{sock.getsockname()[1]}", timeout=0.01, retries=1)
+        with self.assertRaises(TorrentException):
+            client.announce(INFO_HASH, PEER_ID, 6881, 0, 0, 0)
+
+    def http_tracker(self, answer):
+        HTTPTrackerStandIn.answer = answer
+        server = HTTPServer(("127.0.0.1", 0), HTTPTrackerStandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        return Tracker.create_tracker(f"http://127.0.0.1:{server.server_port}/announce")
+
+    def test_http_announce(self):
+        client = self.http_tracker({
+            "interval": 30,
+            "peers": socket.inet_aton("10.0.0.1") + b"\x1a\xe1",
+            "peers6": socket.inet_pton(socket.AF_INET6, "::1") + b"\x1a\xe2",
+        })
+        peers, interval = client.announce(INFO_HASH, PEER_ID, 6881, 0, 100, 200)
+
+        self.assertEqual(peers, [{"ip": "10.0.0.1", "port": 6881}, {"ip": "::1", "port": 6882}])
+        self.assertEqual(interval, 30)
+
+        query = HTTPTrackerStandIn.queries[-1]
+        self.assertEqual((query["compact"], query["downloaded"], query["left"]), (["1"], ["100"], ["200"]))
+        self.assertNotIn("event", query)
+
+    def test_http_invalid_answer(self):
+        for answer in (b"<html>Not Found</html>", {"peers": b""}, b"i5e"):
+            with self.subTest(answer=answer), self.assertRaises(TorrentException):
+                self.http_tracker(answer).announce(INFO_HASH, PEER_ID, 6881, 0, 0, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()